@@ -0,0 +1,286 @@
+"""文字起こしAPIのバックエンド
+
+transcribe.py からのAPI呼び出し（ファイルのアップロード、コンテンツ生成）は
+すべてこのモジュールのバックエンドを経由します。
+
+- GeminiBackend: google.generativeai を使用する本番用のバックエンド
+- StubBackend: stub_server.py のローカルHTTPスタブに接続するバックエンド
+  （ネットワークやAPIクォータを使わずにスループットや並列処理を検証するため）
+"""
+import os
+import json
+import mimetypes
+import threading
+import http.client
+import urllib.parse
+
+# スタブサーバーのデフォルトURL
+DEFAULT_STUB_URL = "http://127.0.0.1:8765"
+
+# アップロード時にファイルオブジェクトから一度に読み込んで送信するサイズ（バイト）
+UPLOAD_BLOCK_SIZE = 1024 * 1024
+
+_environment_lock = threading.Lock()
+_environment_loaded = False
+
+def load_environment():
+    """.envファイルから環境変数を読み込みます（2回目以降の呼び出しでは何もしない）"""
+    global _environment_loaded
+    with _environment_lock:
+        if not _environment_loaded:
+            from dotenv import load_dotenv
+            load_dotenv()
+            _environment_loaded = True
+
+def import_genai():
+    """google.generativeai を読み込みます
+    読み込みに時間がかかるため、起動時ではなく最初にAPIを呼び出す時点まで遅らせます
+    """
+    import google.generativeai as genai
+    return genai
+
+class BackendError(Exception):
+    """バックエンド呼び出しが失敗したことを表す例外"""
+
+    def __init__(self, message, status=None, retry_after=None):
+        super().__init__(message)
+        self.status = status  # HTTPステータスコード（分かる場合）
+        self.retry_after = retry_after  # サーバーが指示した再試行までの秒数（分かる場合）
+
+class RateLimitError(BackendError):
+    """クォータ超過（HTTP 429）を表す例外"""
+
+class TranscriptionBackend:
+    """文字起こしバックエンドの共通インターフェース"""
+
+    name = "base"
+
+    def configure(self):
+        """API呼び出しの前に認証情報などを設定します"""
+        raise NotImplementedError
+
+    def upload_file(self, source, mime_type=None):
+        """音声ファイル（パスまたは uploads.UploadBuffer）をアップロードし、generate_content に渡せるハンドルを返します"""
+        raise NotImplementedError
+
+    def generate_content(self, model_name, contents):
+        """プロンプト（文字列またはアップロード済みハンドルとのリスト）から生成したテキストを返します"""
+        raise NotImplementedError
+
+    def get_file(self, name):
+        """アップロード済みファイルのハンドルを名前から取得します"""
+        raise NotImplementedError
+
+    def delete_file(self, handle):
+        """アップロード済みファイルをリモートから削除します"""
+        raise NotImplementedError
+
+class GeminiBackend(TranscriptionBackend):
+    """google.generativeai を使用するバックエンド
+
+    1つのインスタンスを複数のワーカースレッドで共有して使います。APIの設定（接続の作成）は
+    APIキーが変わったときだけ行い、モデルのインスタンスはモデル名ごとに作成済みのものを再利用します。
+    """
+
+    name = "gemini"
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.configured_api_key = None
+        self.models = {}  # モデル名 -> GenerativeModel
+
+    def configure(self):
+        # APIキーが設定されているか確認
+        load_environment()
+        api_key = os.getenv("GOOGLE_API_KEY")
+        if not api_key:
+            raise ValueError("GOOGLE_API_KEY が設定されていません。")
+        with self.lock:
+            if api_key != self.configured_api_key:
+                import_genai().configure(api_key=api_key)
+                self.configured_api_key = api_key
+                self.models.clear()
+
+    def get_model(self, model_name):
+        """モデル名に対応する GenerativeModel を返します（作成済みであれば再利用）"""
+        with self.lock:
+            model = self.models.get(model_name)
+            if model is None:
+                model = import_genai().GenerativeModel(model_name)
+                self.models[model_name] = model
+            return model
+
+    def upload_file(self, source, mime_type=None):
+        # File APIを使ってファイルをアップロード
+        if isinstance(source, (str, os.PathLike)):
+            return import_genai().upload_file(source, mime_type=mime_type)
+        # UploadBuffer はメモリ上のデータ・一時ファイルのファイルオブジェクトから直接送信する
+        # （ファイルオブジェクトの指定は google-generativeai 0.8.3 以降で対応）
+        return import_genai().upload_file(
+            source.open(), mime_type=mime_type or source.mime_type, display_name=source.name
+        )
+
+    def generate_content(self, model_name, contents):
+        response = self.get_model(model_name).generate_content(contents)
+        return response.text
+
+    def get_file(self, name):
+        return import_genai().get_file(name)
+
+    def delete_file(self, handle):
+        import_genai().delete_file(getattr(handle, "name", handle))
+
+class StubFile:
+    """スタブサーバーにアップロードされたファイルのハンドル"""
+
+    def __init__(self, name, size_bytes, mime_type, expires_at=None):
+        self.name = name
+        self.size_bytes = size_bytes
+        self.mime_type = mime_type
+        self.expires_at = expires_at  # 有効期限（UNIX時刻）
+
+    def __repr__(self):
+        return f"StubFile(name={self.name!r}, size_bytes={self.size_bytes})"
+
+class StubBackend(TranscriptionBackend):
+    """stub_server.py のローカルHTTPスタブに接続するバックエンド
+
+    APIキーは不要です。アップロードと生成のリクエスト形式は stub_server.py を参照してください。
+    HTTP接続はスレッドごとに保持し、Keep-Alive で使い回します。
+    """
+
+    name = "stub"
+
+    def __init__(self, base_url=DEFAULT_STUB_URL, timeout=600):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        parsed = urllib.parse.urlsplit(self.base_url)
+        self.host = parsed.hostname
+        self.port = parsed.port
+        self.path_prefix = parsed.path
+        self.local = threading.local()
+
+    def configure(self):
+        # スタブサーバーは認証不要
+        pass
+
+    def _get_connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is None:
+            connection = http.client.HTTPConnection(
+                self.host, self.port, timeout=self.timeout, blocksize=UPLOAD_BLOCK_SIZE
+            )
+            self.local.connection = connection
+        return connection
+
+    def _close_connection(self):
+        connection = getattr(self.local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self.local.connection = None
+
+    def _request(self, method, path, body=None, headers=None):
+        # 使い回した接続がサーバー側で閉じられていた場合は、新しい接続で1回だけ送り直す
+        for attempt in range(2):
+            if attempt and hasattr(body, "seek"):
+                body.seek(0)
+            connection = self._get_connection()
+            try:
+                connection.request(method, self.path_prefix + path, body=body, headers=headers or {})
+                response = connection.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+                self._close_connection()
+                if attempt == 0:
+                    continue
+                raise BackendError(f"スタブサーバーとの接続が切断されました ({self.base_url}): {str(e)}")
+            except OSError as e:
+                self._close_connection()
+                raise BackendError(f"スタブサーバーに接続できません ({self.base_url}): {str(e)}")
+            break
+
+        if response.will_close:
+            self._close_connection()
+        if response.status >= 400:
+            message = data.decode("utf-8", errors="replace")
+            retry_after = response.getheader("Retry-After")
+            retry_after = float(retry_after) if retry_after else None
+            error_class = RateLimitError if response.status == 429 else BackendError
+            raise error_class(f"スタブサーバーがエラーを返しました (HTTP {response.status}): {message}",
+                              status=response.status, retry_after=retry_after)
+        return json.loads(data.decode("utf-8"))
+
+    def upload_file(self, source, mime_type=None):
+        if isinstance(source, (str, os.PathLike)):
+            # ファイル全体をメモリに読み込まず、ファイルオブジェクトからそのまま送信する
+            with open(source, "rb") as f:
+                return self._upload(f, os.path.getsize(source), os.path.basename(source), mime_type)
+        # UploadBuffer はメモリ上のデータ・一時ファイルからそのまま送信する
+        return self._upload(source.open(), source.size, source.name, mime_type or source.mime_type)
+
+    def _upload(self, f, size_bytes, file_name, mime_type):
+        mime_type = mime_type or mimetypes.guess_type(file_name)[0] or "application/octet-stream"
+        result = self._request("POST", "/upload", f, {
+            "Content-Type": mime_type,
+            "Content-Length": str(size_bytes),
+            "X-File-Name": file_name,
+        })
+        return StubFile(result["name"], result["size_bytes"], mime_type, result.get("expires_at"))
+
+    def get_file(self, name):
+        result = self._request("GET", "/" + name)
+        return StubFile(result["name"], result["size_bytes"], result.get("mime_type"), result.get("expires_at"))
+
+    def delete_file(self, handle):
+        self._request("DELETE", "/" + getattr(handle, "name", handle))
+
+    def generate_content(self, model_name, contents):
+        if not isinstance(contents, (list, tuple)):
+            contents = [contents]
+        prompts = [part for part in contents if isinstance(part, str)]
+        files = [part.name for part in contents if isinstance(part, StubFile)]
+        payload = json.dumps({
+            "model": model_name,
+            "prompt": "\n".join(prompts),
+            "files": files,
+        }).encode("utf-8")
+        result = self._request("POST", "/generate", payload, {"Content-Type": "application/json"})
+        return result["text"]
+
+# 利用可能なバックエンド
+BACKENDS = {
+    "gemini": GeminiBackend,
+    "stub": StubBackend,
+}
+
+_default_backend = None
+_default_backend_lock = threading.Lock()
+
+def create_backend(name="gemini", **options):
+    """名前を指定してバックエンドを作成します"""
+    if name not in BACKENDS:
+        raise ValueError(f"不明なバックエンドです: {name}（利用可能: {', '.join(BACKENDS)}）")
+    return BACKENDS[name](**options)
+
+def get_default_backend():
+    """デフォルトのバックエンドを返します
+
+    環境変数 TRANSCRIBE_BACKEND=stub を設定すると、GUIなどからもスタブサーバー
+    （TRANSCRIBE_STUB_URL、未指定時は DEFAULT_STUB_URL）を使用できます。
+    """
+    global _default_backend
+    load_environment()
+    with _default_backend_lock:
+        if _default_backend is None:
+            name = os.getenv("TRANSCRIBE_BACKEND", "gemini")
+            if name == "stub":
+                _default_backend = create_backend(name, base_url=os.getenv("TRANSCRIBE_STUB_URL", DEFAULT_STUB_URL))
+            else:
+                _default_backend = create_backend(name)
+        return _default_backend
+
+def set_default_backend(backend):
+    """デフォルトのバックエンドを差し替えます"""
+    global _default_backend
+    with _default_backend_lock:
+        _default_backend = backend
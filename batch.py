@@ -0,0 +1,231 @@
+"""複数の音声ファイルをまとめて処理するバッチモード
+
+ディレクトリ・globパターン・ファイル一覧（マニフェスト）から処理対象を集め、
+ワーカープールで並列に処理します。出力が音声ファイルより新しいファイルはスキップし、
+ファイルごとの結果と処理時間をJSONL形式のログに記録します。
+
+1ファイルの処理内容（読み込み・文字起こし・保存）は呼び出し側が process_file として渡します。
+"""
+import os
+import glob
+import json
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from job_state import get_job_state_path
+
+# ディレクトリから集める音声ファイルの拡張子（GUIのファイル選択ダイアログと同じ）
+AUDIO_EXTENSIONS = (
+    ".wav", ".flac", ".mp3", ".ogg", ".webm", ".mp4", ".amr", ".3gp", ".m4a", ".opus", ".speex"
+)
+
+# ファイル一覧（1行に1ファイル、#以降はコメント）として扱う拡張子
+MANIFEST_EXTENSIONS = (".txt", ".lst")
+
+# 同時に処理するファイル数のデフォルト値
+DEFAULT_BATCH_WORKERS = 2
+
+# バッチログのデフォルトのファイル名
+DEFAULT_BATCH_LOG_NAME = "transcribe_batch.jsonl"
+
+def is_glob_pattern(spec):
+    return any(ch in spec for ch in "*?[")
+
+def is_manifest(path):
+    return os.path.isfile(path) and os.path.splitext(path)[1].lower() in MANIFEST_EXTENSIONS
+
+def is_batch_spec(spec):
+    """単一ファイルの処理ではなくバッチモードで扱う指定（ディレクトリ・glob・ファイル一覧）かを判定します"""
+    return os.path.isdir(spec) or is_glob_pattern(spec) or is_manifest(spec)
+
+def read_manifest(path):
+    """ファイル一覧を読み込みます（相対パスはファイル一覧のあるディレクトリから解決）"""
+    base_dir = os.path.dirname(os.path.abspath(path))
+    entries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.split("#", 1)[0].strip()
+            if line:
+                entries.append(os.path.join(base_dir, os.path.expanduser(line)))
+    return entries
+
+def collect_inputs(specs, recursive=False):
+    """ディレクトリ・globパターン・ファイル一覧・ファイルの指定から処理対象の音声ファイルを集めます
+
+    Returns:
+        (音声ファイルの絶対パスのリスト（重複なし・指定順）, 何も見つからなかった指定のリスト)
+    """
+    inputs = []
+    seen = set()
+    unmatched = []
+
+    def add(path):
+        path = os.path.abspath(path)
+        if path not in seen:
+            seen.add(path)
+            inputs.append(path)
+
+    for spec in specs:
+        found = []
+        if os.path.isdir(spec):
+            if recursive:
+                for root, dirs, files in os.walk(spec):
+                    dirs.sort()
+                    found.extend(os.path.join(root, name) for name in sorted(files))
+            else:
+                found = [os.path.join(spec, name) for name in sorted(os.listdir(spec))]
+            found = [path for path in found
+                     if os.path.isfile(path) and os.path.splitext(path)[1].lower() in AUDIO_EXTENSIONS]
+        elif is_manifest(spec):
+            found = read_manifest(spec)
+        elif is_glob_pattern(spec):
+            # ディレクトリと同じく音声ファイルだけを集める（出力した .txt やファイル一覧を含めないため）
+            found = [path for path in sorted(glob.glob(spec, recursive=True))
+                     if os.path.isfile(path) and os.path.splitext(path)[1].lower() in AUDIO_EXTENSIONS]
+        elif os.path.isfile(spec):
+            found = [spec]
+
+        if not found:
+            unmatched.append(spec)
+        for path in found:
+            add(path)
+
+    return inputs, unmatched
+
+def get_output_paths(audio_path, output_dir=None, with_minutes=False, output_extension=".txt"):
+    """音声ファイルに対応する出力ファイル（文字起こし結果・議事録）のパスを返します
+
+    出力先のディレクトリを指定しない場合は音声ファイルの隣に保存します（GUIの自動保存と同じ名前）。
+    """
+    directory = output_dir or os.path.dirname(audio_path)
+    stem = os.path.splitext(os.path.basename(audio_path))[0]
+    output_path = os.path.join(directory, stem + output_extension)
+    minutes_path = os.path.join(directory, stem + "_minutes.md") if with_minutes else None
+    return output_path, minutes_path
+
+def is_up_to_date(audio_path, output_paths):
+    """すべての出力ファイルが存在し、音声ファイルより新しければTrueを返します
+
+    途中で失敗したジョブの状態ファイルが残っている場合（出力は途中までの結果）は最新とみなしません。
+    """
+    if os.path.exists(get_job_state_path(output_paths[0], audio_path)):
+        return False
+    audio_mtime = os.path.getmtime(audio_path)
+    for path in output_paths:
+        if path is None:
+            continue
+        if not os.path.exists(path) or os.path.getmtime(path) < audio_mtime:
+            return False
+    return True
+
+class BatchLog:
+    """バッチの進捗・結果をJSONL形式で記録するログ（スレッドセーフ）"""
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self.file = open(path, "a", encoding="utf-8")
+
+    def write(self, event, **fields):
+        record = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "event": event}
+        record.update(fields)
+        with self.lock:
+            self.file.write(json.dumps(record, ensure_ascii=False) + "\n")
+            self.file.flush()
+
+    def close(self):
+        with self.lock:
+            self.file.close()
+
+def run_batch(inputs, process_file, output_dir=None, with_minutes=False, max_workers=DEFAULT_BATCH_WORKERS,
+              log_path=None, force=False, output_extension=".txt"):
+    """音声ファイルをワーカープールで並列に処理します
+
+    Args:
+        inputs: 音声ファイルのパスのリスト
+        process_file: process_file(audio_path, output_path, minutes_path) を呼び出すと1ファイルを処理し、
+            ログに追加する情報の辞書（または None）を返す関数。失敗時は例外を送出する
+        output_dir: 出力先のディレクトリ（Noneで音声ファイルの隣）
+        with_minutes: 議事録も出力するかどうか（スキップの判定に使用）
+        max_workers: 同時に処理するファイル数
+        log_path: JSONLログのパス（Noneで出力先のディレクトリまたはカレントディレクトリの DEFAULT_BATCH_LOG_NAME）
+        force: 出力が最新でも処理し直すかどうか
+        output_extension: 文字起こし結果のファイルの拡張子
+
+    Returns:
+        {"done": 件数, "skipped": 件数, "failed": 件数}
+    """
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+    log_path = log_path or os.path.join(output_dir or os.getcwd(), DEFAULT_BATCH_LOG_NAME)
+    log = BatchLog(log_path)
+    summary = {"done": 0, "skipped": 0, "failed": 0}
+
+    batch_started_at = time.time()
+    finished = 0
+    planned = []
+
+    def process(audio_path, output_path, minutes_path):
+        log.write("started", file=audio_path)
+        started_at = time.time()
+        try:
+            info = process_file(audio_path, output_path, minutes_path) or {}
+        except Exception as e:
+            elapsed = time.time() - started_at
+            log.write("failed", file=audio_path, output=output_path, elapsed_seconds=round(elapsed, 3), error=str(e))
+            raise
+        elapsed = time.time() - started_at
+        log.write("done", file=audio_path, output=output_path, minutes_output=minutes_path,
+                  elapsed_seconds=round(elapsed, 3), **info)
+        return elapsed
+
+    try:
+        # 処理対象の計画（存在しないファイル、出力先が重複するファイルと、出力が最新のファイルはここで除外）
+        output_owners = {}
+        for audio_path in inputs:
+            output_path, minutes_path = get_output_paths(audio_path, output_dir, with_minutes, output_extension)
+            if not os.path.isfile(audio_path):
+                # ファイル一覧に書かれたファイルが存在しない場合など
+                print(f"エラー: 音声ファイル '{audio_path}' が見つからないためスキップします")
+                log.write("failed", file=audio_path, output=output_path, error="音声ファイルが見つかりません")
+                summary["failed"] += 1
+                continue
+            owner = output_owners.setdefault(output_path, audio_path)
+            if owner != audio_path:
+                print(f"エラー: 出力先 '{output_path}' が '{owner}' と重複するため '{audio_path}' をスキップします")
+                log.write("failed", file=audio_path, output=output_path, error=f"出力先が {owner} と重複しています")
+                summary["failed"] += 1
+            elif not force and is_up_to_date(audio_path, [output_path, minutes_path]):
+                print(f"出力が最新のためスキップします: {audio_path}")
+                log.write("skipped", file=audio_path, output=output_path, minutes_output=minutes_path)
+                summary["skipped"] += 1
+            else:
+                planned.append((audio_path, output_path, minutes_path))
+
+        print(f"バッチ処理: {len(inputs)}個のファイルのうち{len(planned)}個を最大{max_workers}並列で処理します"
+              f"（ログ: {log_path}）")
+        log.write("batch_started", files=len(inputs), planned=len(planned), workers=max_workers)
+
+        if planned:
+            with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(planned)))) as executor:
+                futures = {executor.submit(process, *job): job[0] for job in planned}
+                for future in as_completed(futures):
+                    audio_path = futures[future]
+                    finished += 1
+                    try:
+                        elapsed = future.result()
+                    except Exception as e:
+                        summary["failed"] += 1
+                        print(f"エラー: '{audio_path}' の処理に失敗しました: {str(e)}")
+                        continue
+                    summary["done"] += 1
+                    print(f"'{audio_path}' の処理が完了しました（{elapsed:.1f}秒）。完了済み: {finished}/{len(planned)}")
+    finally:
+        log.write("batch_finished", elapsed_seconds=round(time.time() - batch_started_at, 3), **summary)
+        log.close()
+
+    print(f"バッチ処理が終了しました: 完了 {summary['done']}件、スキップ {summary['skipped']}件、失敗 {summary['failed']}件")
+    return summary
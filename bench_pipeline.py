@@ -0,0 +1,292 @@
+"""ローカルの音声処理パイプラインのベンチマーク
+
+合成した音声（長さ・チャンネル数・サンプルレートを指定）を使って、APIを呼び出さない
+ローカルの処理を段階ごとに計測し、結果をJSONで保存します。
+
+- load_audio_file: 音声ファイル全体の読み込み
+- preprocess: preprocess_segment（モノラル化・16kHzへの変換・音量の正規化）
+- split_silence / split_fixed: split_audio_segments（無音の位置で分割 / 一定間隔で分割）
+- set_sample_width: 各セグメントの16-bit PCMへの変換
+- wav_export / wav_export_disk: export_segment_for_upload によるWAVへのエンコード（メモリ上のバッファ /
+  spill_bytes=0 で常に一時ファイル）
+- tempfile_io: 各セグメントのPCMの一時ファイルへの書き込み・読み込み・削除
+- format_timestamp / rebase_timestamps: タイムスタンプの整形と付け替えを大量に行う場合
+
+各段階の所要時間（--repeat 回のうち最短）と、tracemalloc で計測したメモリ使用量のピークを記録します。
+--compare で以前の結果を指定すると、所要時間が --threshold を超えて増えた段階を表示し、
+終了コード1で終了します（コミット間の性能の劣化の検出に使用）。
+
+使い方:
+    python bench_pipeline.py --durations 10m,1h --channels 1,2 --rates 16000,44100
+    python bench_pipeline.py --output after.json --compare before.json
+"""
+import os
+import sys
+import json
+import time
+import wave
+import shutil
+import argparse
+import platform
+import tempfile
+import tracemalloc
+import subprocess
+import contextlib
+
+import numpy as np
+
+import transcribe
+from preprocess import PreprocessOptions, preprocess_segment
+from timestamps import format_timestamp, rebase_timestamps
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 合成音声の設定（発話に見立てた雑音の区間と無音の区間を繰り返す）
+SPEECH_SECONDS = 8.0
+PAUSE_SECONDS = 0.6
+SYNTH_CHUNK_SECONDS = 60
+
+# format_timestamp / rebase_timestamps の計測で扱うタイムスタンプの数
+TIMESTAMP_CALLS = 1_000_000
+REBASE_MARKERS = 200_000
+
+DEFAULT_OUTPUT = "bench_pipeline.json"
+
+def parse_duration(text):
+    """"90s"・"10m"・"1.5h" 形式の長さを秒数に変換します（単位なしは秒）"""
+    text = text.strip().lower()
+    units = {"s": 1, "m": 60, "h": 3600}
+    if text and text[-1] in units:
+        return float(text[:-1]) * units[text[-1]]
+    return float(text)
+
+def synthesize_wav(path, duration_seconds, frame_rate, channels, seed=0):
+    """発話と無音が交互に続く16-bitのWAVファイルを作成します（1分ずつ書き込み、全体をメモリに置かない）"""
+    rng = np.random.default_rng(seed)
+    cycle = SPEECH_SECONDS + PAUSE_SECONDS
+    total_frames = int(duration_seconds * frame_rate)
+    chunk_frames = SYNTH_CHUNK_SECONDS * frame_rate
+    with wave.open(path, "wb") as f:
+        f.setnchannels(channels)
+        f.setsampwidth(2)
+        f.setframerate(frame_rate)
+        for start in range(0, total_frames, chunk_frames):
+            count = min(chunk_frames, total_frames - start)
+            t = (start + np.arange(count)) / frame_rate
+            speaking = (t % cycle) < SPEECH_SECONDS
+            signal = rng.normal(0, 3000, count) * speaking + rng.normal(0, 30, count)
+            samples = np.clip(signal, -32768, 32767).astype(np.int16)
+            if channels > 1:
+                samples = np.repeat(samples[:, None], channels, axis=1)
+            f.writeframes(samples.tobytes())
+
+def measure(func, repeat, trace_memory=True):
+    """func を repeat 回実行した最短の所要時間と、1回分のメモリ使用量のピークを返します
+
+    Returns:
+        (最後の実行の戻り値, {"seconds": ..., "peak_bytes": ...})
+    """
+    timings = []
+    result = None
+    for _ in range(repeat):
+        result = None
+        started_at = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - started_at)
+    stats = {"seconds": round(min(timings), 6)}
+    if trace_memory:
+        result = None
+        tracemalloc.start()
+        try:
+            result = func()
+            stats["peak_bytes"] = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+    return result, stats
+
+@contextlib.contextmanager
+def quiet():
+    """計測中に処理が表示するログを捨てます"""
+    with open(os.devnull, "w", encoding="utf-8") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+def bench_audio(path, duration_seconds, frame_rate, channels, repeat, trace_memory):
+    """1つの合成音声について各段階を計測します"""
+    stages = {}
+
+    with quiet():
+        audio, stats = measure(lambda: transcribe.load_audio_file(path)[0], repeat, trace_memory)
+    stages["load_audio_file"] = stats
+
+    _, stats = measure(lambda: preprocess_segment(audio, PreprocessOptions())[0], repeat, trace_memory)
+    stages["preprocess"] = stats
+
+    with quiet():
+        segments, stats = measure(lambda: transcribe.split_audio_segments(audio, align_to_silence=True), repeat, trace_memory)
+    stages["split_silence"] = dict(stats, segments=len(segments))
+
+    with quiet():
+        _, stats = measure(lambda: transcribe.split_audio_segments(audio, align_to_silence=False), repeat, trace_memory)
+    stages["split_fixed"] = stats
+
+    pieces = [segment for segment, _, _ in segments]
+
+    _, stats = measure(lambda: [piece.set_sample_width(2) for piece in pieces], repeat, trace_memory)
+    stages["set_sample_width"] = stats
+
+    def export_all(spill_bytes):
+        exported_bytes = 0
+        for piece in pieces:
+            with transcribe.export_segment_for_upload(piece, "wav", spill_bytes) as buffer:
+                exported_bytes += buffer.size
+        return exported_bytes
+
+    # メモリ上のバッファは上限を設けずに計測する（一時ファイルとの比較のため）
+    with quiet():
+        exported_bytes, stats = measure(lambda: export_all(sys.maxsize), repeat, trace_memory)
+    stages["wav_export"] = dict(stats, bytes=exported_bytes)
+
+    with quiet():
+        exported_bytes, stats = measure(lambda: export_all(0), repeat, trace_memory)
+    stages["wav_export_disk"] = dict(stats, bytes=exported_bytes)
+
+    def tempfile_io():
+        total = 0
+        for piece in pieces:
+            data = piece.raw_data
+            with tempfile.NamedTemporaryFile(suffix=".pcm", delete=False) as f:
+                f.write(data)
+                temp_path = f.name
+            try:
+                with open(temp_path, "rb") as f:
+                    total += len(f.read())
+            finally:
+                os.unlink(temp_path)
+        return total
+
+    io_bytes, stats = measure(tempfile_io, repeat, trace_memory)
+    stages["tempfile_io"] = dict(stats, bytes=io_bytes)
+
+    return {
+        "config": {"duration_seconds": duration_seconds, "frame_rate": frame_rate, "channels": channels},
+        "stages": stages,
+    }
+
+def bench_timestamps(repeat, trace_memory):
+    """タイムスタンプの整形と付け替えを計測します"""
+    stages = {}
+    values = range(0, TIMESTAMP_CALLS * 997, 997)
+    _, stats = measure(lambda: [format_timestamp(ms) for ms in values], repeat, trace_memory)
+    stages["format_timestamp"] = dict(stats, calls=TIMESTAMP_CALLS)
+
+    text = "\n".join(f"[{format_timestamp(i * 7000)}] これは計測用の文です。" for i in range(REBASE_MARKERS))
+    _, stats = measure(lambda: rebase_timestamps(text, 25 * 60 * 1000), repeat, trace_memory)
+    stages["rebase_timestamps"] = dict(stats, markers=REBASE_MARKERS, chars=len(text))
+    return {"config": {"timestamps": True}, "stages": stages}
+
+def config_key(result):
+    return json.dumps(result["config"], sort_keys=True)
+
+def compare_results(results, baseline_path, threshold):
+    """以前の結果と比べて、所要時間が threshold（割合）を超えて増えた段階を返します"""
+    with open(baseline_path, "r", encoding="utf-8") as f:
+        baseline = {config_key(result): result for result in json.load(f)["results"]}
+
+    regressions = []
+    for result in results:
+        previous = baseline.get(config_key(result))
+        if previous is None:
+            continue
+        for name, stats in result["stages"].items():
+            before = previous["stages"].get(name, {}).get("seconds")
+            after = stats["seconds"]
+            if before and after > before * (1 + threshold):
+                regressions.append((result["config"], name, before, after))
+    return regressions
+
+def get_git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    parser = argparse.ArgumentParser(description="ローカルの音声処理パイプラインを段階ごとに計測します")
+    parser.add_argument("--durations", default="10m",
+                        help="合成する音声の長さ（カンマ区切り、例: 10m,1h,6h。デフォルト: 10m）")
+    parser.add_argument("--channels", default="1", help="チャンネル数（カンマ区切り、例: 1,2。デフォルト: 1）")
+    parser.add_argument("--rates", default="16000",
+                        help="サンプルレート（カンマ区切り、例: 16000,44100,48000。デフォルト: 16000）")
+    parser.add_argument("--repeat", type=int, default=3, help="各段階の計測回数（最短の時間を記録、デフォルト: 3）")
+    parser.add_argument("--no-memory", action="store_true", help="メモリ使用量を計測しない（計測時間を短縮）")
+    parser.add_argument("-o", "--output", default=DEFAULT_OUTPUT, help=f"結果のJSONファイル（デフォルト: {DEFAULT_OUTPUT}）")
+    parser.add_argument("--compare", help="比較する以前の結果のJSONファイル")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="劣化とみなす所要時間の増加の割合（デフォルト: 0.2 = 20%%）")
+    parser.add_argument("--work-dir", help="合成音声の保存先（デフォルト: 一時ディレクトリ）")
+    args = parser.parse_args()
+
+    if args.repeat < 1:
+        print("エラー: --repeat には1以上の値を指定してください。")
+        sys.exit(1)
+
+    durations = [parse_duration(value) for value in args.durations.split(",")]
+    channel_options = [int(value) for value in args.channels.split(",")]
+    rates = [int(value) for value in args.rates.split(",")]
+    trace_memory = not args.no_memory
+
+    work_dir = args.work_dir or tempfile.mkdtemp(prefix="bench_pipeline_")
+    os.makedirs(work_dir, exist_ok=True)
+    results = []
+    try:
+        for duration in durations:
+            for channels in channel_options:
+                for rate in rates:
+                    label = f"{format_timestamp(int(duration * 1000))} / {channels}ch / {rate}Hz"
+                    path = os.path.join(work_dir, f"synth_{int(duration)}s_{channels}ch_{rate}.wav")
+                    if not os.path.exists(path):
+                        print(f"合成音声を作成中: {label}")
+                        synthesize_wav(path, duration, rate, channels)
+                    print(f"計測中: {label}")
+                    result = bench_audio(path, duration, rate, channels, args.repeat, trace_memory)
+                    results.append(result)
+                    for name, stats in result["stages"].items():
+                        peak = f"、ピーク {stats['peak_bytes'] / (1024 * 1024):.1f}MB" if "peak_bytes" in stats else ""
+                        print(f"  {name:<18} {stats['seconds'] * 1000:10.1f}ms{peak}")
+        print("計測中: タイムスタンプ")
+        result = bench_timestamps(args.repeat, trace_memory)
+        results.append(result)
+        for name, stats in result["stages"].items():
+            print(f"  {name:<18} {stats['seconds'] * 1000:10.1f}ms")
+    finally:
+        if not args.work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    report = {
+        "meta": {
+            "commit": get_git_commit(),
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "repeat": args.repeat,
+        },
+        "results": results,
+    }
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"結果を '{args.output}' に保存しました")
+
+    if args.compare:
+        regressions = compare_results(results, args.compare, args.threshold)
+        for config, name, before, after in regressions:
+            print(f"劣化: {json.dumps(config, ensure_ascii=False)} {name}: "
+                  f"{before * 1000:.1f}ms → {after * 1000:.1f}ms（{(after / before - 1) * 100:+.0f}%）")
+        if regressions:
+            sys.exit(1)
+        print(f"'{args.compare}' と比べて劣化した段階はありません")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,140 @@
+"""起動時間の計測
+
+新しいプロセスを起動して、次の時間を計測します。
+
+- cli_help: transcribe.py --help の表示が終わるまで
+- gui_import: transcribe_gui のインポートが終わるまで
+- gui_window: transcribe_gui.main() のウィンドウが表示されるまで（表示できない環境ではスキップ）
+
+あわせて、起動時に読み込みに時間のかかるライブラリ（pydub・numpy・google.generativeai）が
+読み込まれていないかを確認します。PyInstallerでビルドした実行ファイルの起動時間を抑えるための
+目安として使ってください。
+
+使い方:
+    python bench_startup.py
+    python bench_startup.py --runs 10 --json
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import statistics
+import subprocess
+
+# 起動時に読み込まれていてはいけないライブラリ（最初の文字起こしまで読み込みを遅らせている）
+HEAVY_MODULES = ["numpy", "pydub", "google.generativeai"]
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# 子プロセスで実行するコード（読み込まれていたライブラリを最後の行にJSONで出力する）
+REPORT_MODULES = (
+    "import sys, json\n"
+    f"print('HEAVY_MODULES ' + json.dumps([m for m in {HEAVY_MODULES!r} if m in sys.modules]), flush=True)\n"
+)
+
+GUI_IMPORT_CODE = "import transcribe_gui\n" + REPORT_MODULES
+
+# mainloop を差し替え、ウィンドウを描画した時点で終了する
+GUI_WINDOW_CODE = (
+    "import tkinter as tk\n"
+    "def mainloop(self, n=0):\n"
+    "    self.update()\n"
+    "    print('WINDOW_READY', flush=True)\n"
+    + "".join("    " + line + "\n" for line in REPORT_MODULES.splitlines())
+    + "    self.destroy()\n"
+    "tk.Tk.mainloop = mainloop\n"
+    "import transcribe_gui\n"
+    "transcribe_gui.main()\n"
+)
+
+def run_once(command, ready_marker=None):
+    """コマンドを実行し、終了まで（ready_marker を指定した場合はその行が出力されるまで）の秒数を返します
+
+    Returns:
+        (秒数, 読み込まれていた重いライブラリのリストまたはNone)
+    """
+    env = dict(os.environ)
+    # APIキーの未設定ダイアログでウィンドウの表示が止まらないようにする
+    env.setdefault("GOOGLE_API_KEY", "bench-startup")
+    env["PYTHONIOENCODING"] = "utf-8"
+
+    started_at = time.perf_counter()
+    process = subprocess.Popen(
+        command, cwd=BASE_DIR, env=env, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        text=True, encoding="utf-8", errors="replace"
+    )
+    elapsed = None
+    heavy_modules = None
+    for line in process.stdout:
+        if ready_marker is not None and elapsed is None and line.strip() == ready_marker:
+            elapsed = time.perf_counter() - started_at
+        if line.startswith("HEAVY_MODULES "):
+            heavy_modules = json.loads(line[len("HEAVY_MODULES "):])
+    stderr = process.stderr.read()
+    process.wait()
+    if ready_marker is None:
+        elapsed = time.perf_counter() - started_at
+    if process.returncode != 0 or elapsed is None:
+        message = stderr.strip().splitlines()[-1] if stderr.strip() else f"終了コード {process.returncode}"
+        raise RuntimeError(message)
+    return elapsed, heavy_modules
+
+def measure(name, command, runs, ready_marker=None):
+    """コマンドを runs 回実行して計測結果の辞書を返します"""
+    timings = []
+    heavy_modules = None
+    try:
+        for _ in range(runs):
+            elapsed, loaded = run_once(command, ready_marker)
+            timings.append(elapsed)
+            if loaded is not None:
+                heavy_modules = loaded
+    except RuntimeError as e:
+        return {"name": name, "skipped": str(e)}
+    result = {
+        "name": name,
+        "runs": runs,
+        "median_ms": round(statistics.median(timings) * 1000, 1),
+        "min_ms": round(min(timings) * 1000, 1),
+        "max_ms": round(max(timings) * 1000, 1),
+    }
+    if heavy_modules is not None:
+        result["heavy_modules"] = heavy_modules
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description="transcribe.py と GUI の起動時間を計測します")
+    parser.add_argument("--runs", type=int, default=5, help="各項目の計測回数（デフォルト: 5）")
+    parser.add_argument("--python", default=sys.executable, help="計測に使うPythonインタープリター")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力する")
+    args = parser.parse_args()
+
+    if args.runs < 1:
+        print("エラー: --runs には1以上の値を指定してください。")
+        sys.exit(1)
+
+    results = [
+        measure("cli_help", [args.python, "transcribe.py", "--help"], args.runs),
+        measure("gui_import", [args.python, "-c", GUI_IMPORT_CODE], args.runs),
+        measure("gui_window", [args.python, "-c", GUI_WINDOW_CODE], args.runs, ready_marker="WINDOW_READY"),
+    ]
+
+    if args.json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    else:
+        for result in results:
+            if "skipped" in result:
+                print(f"{result['name']:<12} スキップ: {result['skipped']}")
+                continue
+            line = (f"{result['name']:<12} 中央値 {result['median_ms']:8.1f}ms"
+                    f"（最小 {result['min_ms']:.1f}ms / 最大 {result['max_ms']:.1f}ms、{result['runs']}回）")
+            if result.get("heavy_modules"):
+                line += f"  警告: 起動時に読み込まれています: {', '.join(result['heavy_modules'])}"
+            print(line)
+
+    if any(result.get("heavy_modules") for result in results):
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
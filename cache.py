@@ -0,0 +1,110 @@
+"""文字起こし結果と議事録の永続キャッシュ
+
+同じ音声・同じ設定でジョブを再実行した場合に、アップロードとAPI呼び出しを
+省略するためのキャッシュです。SQLiteに保存し、合計サイズが上限を超えた場合は
+最後に使われた日時が古いものから削除します（LRU）。
+"""
+import os
+import time
+import sqlite3
+import hashlib
+import threading
+
+# キャッシュファイルのデフォルトの保存先
+DEFAULT_CACHE_PATH = os.path.join(os.path.expanduser("~"), ".transcribe_cache", "cache.sqlite3")
+
+# キャッシュの合計サイズの上限（バイト）
+DEFAULT_CACHE_MAX_BYTES = 200 * 1024 * 1024
+
+def make_cache_key(*parts):
+    """キーの構成要素（bytes / str / 数値など）から SHA-256 のキャッシュキーを作成します"""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, (bytes, bytearray, memoryview)):
+            data = part  # memoryview（AudioSegmentView の生データなど）もコピーせずにハッシュする
+        else:
+            data = str(part).encode("utf-8")
+        # 構成要素の境界が曖昧にならないよう長さを前置する
+        size = data.nbytes if isinstance(data, memoryview) else len(data)
+        digest.update(size.to_bytes(8, "big"))
+        digest.update(data)
+    return digest.hexdigest()
+
+class ResultCache:
+    """SQLiteに保存するLRUキャッシュ（スレッドセーフ）"""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, max_bytes=DEFAULT_CACHE_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        with self.lock, self.connection:
+            self.connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                " key TEXT PRIMARY KEY,"
+                " kind TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            self.connection.execute(
+                "CREATE INDEX IF NOT EXISTS entries_last_access ON entries (last_access)"
+            )
+
+    def get(self, key):
+        """キーに対応する値を返します。無ければNoneを返します"""
+        with self.lock, self.connection:
+            row = self.connection.execute(
+                "SELECT value FROM entries WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None:
+                return None
+            self.connection.execute(
+                "UPDATE entries SET last_access = ? WHERE key = ?", (time.time(), key)
+            )
+            return row[0]
+
+    def put(self, key, value, kind="segment"):
+        """値を保存し、上限を超えた場合は古いものから削除します"""
+        size = len(value.encode("utf-8"))
+        with self.lock, self.connection:
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries (key, kind, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, kind, value, size, time.time())
+            )
+            self._evict()
+
+    def _evict(self):
+        """合計サイズが上限以下になるまで最終使用日時の古いエントリを削除します（ロック取得済みで呼び出す）"""
+        total = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        to_delete = []
+        for key, size in self.connection.execute("SELECT key, size FROM entries ORDER BY last_access"):
+            if total <= self.max_bytes:
+                break
+            to_delete.append((key,))
+            total -= size
+        self.connection.executemany("DELETE FROM entries WHERE key = ?", to_delete)
+
+    def stats(self):
+        """エントリ数と合計サイズを返します"""
+        with self.lock:
+            count, total = self.connection.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM entries"
+            ).fetchone()
+        return {"entries": count, "bytes": total}
+
+    def clear(self):
+        """すべてのエントリを削除します"""
+        with self.lock, self.connection:
+            self.connection.execute("DELETE FROM entries")
+
+    def close(self):
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,163 @@
+"""文字起こしの進捗イベント
+
+transcribe_audio(on_event=...) に渡した関数に、処理の進捗を型付きのイベントとして通知します。
+ログの文字列を解析しなくても、GUIやCLIがセグメントの進捗・アップロードしたバイト数・
+API呼び出しの所要時間などを受け取れます。
+
+イベントはセグメントを処理するワーカースレッドから呼び出されます。GUIで使う場合は
+root.after などでメインスレッドに受け渡してください。
+"""
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+@dataclass(frozen=True)
+class TranscriptionEvent:
+    """進捗イベントの基底クラス"""
+
+@dataclass(frozen=True)
+class AudioLoaded(TranscriptionEvent):
+    """音声ファイルを読み込んだ（streaming=True の場合は長さなどの情報だけを取得した）"""
+    duration_ms: int
+    size_bytes: int
+    elapsed_seconds: float
+    streaming: bool
+
+@dataclass(frozen=True)
+class SilenceSkipped(TranscriptionEvent):
+    """長い無音を取り除いた（kept_ranges は残した区間の元の音声でのミリ秒の範囲）"""
+    original_ms: int
+    condensed_ms: int
+    kept_ranges: Tuple[Tuple[int, int], ...]
+    elapsed_seconds: float
+
+@dataclass(frozen=True)
+class SegmentsPlanned(TranscriptionEvent):
+    """セグメントの分割計画が決まった（pending は今回処理するセグメント数、elapsed_seconds は分割にかかった秒数）"""
+    total: int
+    pending: int
+    ranges: Tuple[Tuple[int, int], ...]
+    elapsed_seconds: float = 0.0
+
+@dataclass(frozen=True)
+class SegmentStarted(TranscriptionEvent):
+    index: int
+    total: int
+    start_ms: int
+    end_ms: int
+
+@dataclass(frozen=True)
+class SegmentCacheHit(TranscriptionEvent):
+    """キャッシュに文字起こし結果があったため、APIを呼ばずに完了した"""
+    index: Optional[int]
+    start_ms: int
+    chars: int
+
+@dataclass(frozen=True)
+class AudioPreprocessed(TranscriptionEvent):
+    """音声に前処理（モノラル化・サンプルレートの変換・音量の正規化）を行った
+
+    index は前処理したセグメントの番号（分割前の音声全体を処理した場合はNone）。
+    """
+    index: Optional[int]
+    start_ms: int
+    input_bytes: int
+    output_bytes: int
+    gain_db: float
+    elapsed_seconds: float
+
+@dataclass(frozen=True)
+class SegmentPrepared(TranscriptionEvent):
+    """セグメントをアップロード用に準備した
+
+    decode_seconds はストリーミングモードでのデコード（それ以外はNone）、convert_seconds は
+    16-bit PCMへの変換、encode_seconds はアップロード形式へのエンコードにかかった秒数。
+    spilled=True はエンコード結果がメモリ上の上限を超え、一時ファイルに書き出したことを表す。
+    """
+    index: Optional[int]
+    start_ms: int
+    decode_seconds: Optional[float]
+    convert_seconds: float
+    encode_seconds: float
+    pcm_bytes: int
+    encoded_bytes: int
+    spilled: bool = False
+
+@dataclass(frozen=True)
+class UploadStarted(TranscriptionEvent):
+    index: Optional[int]
+    start_ms: int
+    size_bytes: int
+
+@dataclass(frozen=True)
+class UploadFinished(TranscriptionEvent):
+    """アップロードが完了した（reused=True はアップロード済みのハンドルを再利用した）"""
+    index: Optional[int]
+    start_ms: int
+    size_bytes: int
+    elapsed_seconds: float
+    reused: bool
+
+@dataclass(frozen=True)
+class GenerateFinished(TranscriptionEvent):
+    """文字起こしの生成リクエストが完了した（attempt は1から数えた試行回数）"""
+    index: Optional[int]
+    start_ms: int
+    attempt: int
+    chars: int
+    elapsed_seconds: float
+
+@dataclass(frozen=True)
+class SegmentRetry(TranscriptionEvent):
+    index: Optional[int]
+    start_ms: int
+    attempt: int
+    delay_seconds: float
+    reason: str
+
+@dataclass(frozen=True)
+class SegmentFinished(TranscriptionEvent):
+    """セグメントの文字起こしが完了した（completed は完了済みのセグメント数）"""
+    index: int
+    total: int
+    completed: int
+    chars: int
+
+@dataclass(frozen=True)
+class SegmentFailed(TranscriptionEvent):
+    index: int
+    total: int
+    error: str
+
+@dataclass(frozen=True)
+class TranscriptionFinished(TranscriptionEvent):
+    chars: int
+    failed: int
+
+@dataclass(frozen=True)
+class MinutesStarted(TranscriptionEvent):
+    """議事録の生成を開始した（transcription_chars は元の文字起こしの文字数）"""
+    transcription_chars: int
+
+@dataclass(frozen=True)
+class MinutesPartialFinished(TranscriptionEvent):
+    """議事録の2段階の生成で、文字起こしの一部から要点を抽出した（index は0始まり）"""
+    index: int
+    total: int
+    chars: int
+    elapsed_seconds: float
+    cached: bool
+
+@dataclass(frozen=True)
+class MinutesFinished(TranscriptionEvent):
+    chars: int
+    elapsed_seconds: float
+    cached: bool
+
+def emit(on_event, event):
+    """イベントを通知します（通知先で発生したエラーで文字起こしを止めないよう、警告の表示だけにとどめる）"""
+    if on_event is None:
+        return
+    try:
+        on_event(event)
+    except Exception as e:
+        print(f"警告: 進捗イベントの処理中にエラーが発生しました ({type(event).__name__}): {str(e)}")
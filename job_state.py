@@ -0,0 +1,139 @@
+"""ジョブの進捗状態ファイル（セグメント単位のチェックポイント）
+
+長い音声の文字起こしが途中で失敗しても、完了したセグメントの結果を失わずに
+未完了のセグメントだけを再処理できるよう、各セグメントの時間範囲・状態・結果を
+JSONファイルに記録します。
+"""
+import os
+import json
+import time
+import threading
+
+# 状態ファイルの形式のバージョン
+JOB_STATE_VERSION = 1
+
+# 状態ファイルの拡張子（出力ファイル名の後ろに付ける）
+JOB_STATE_SUFFIX = ".job.json"
+
+# 再開時に一致している必要がある設定
+JOB_SETTING_KEYS = ("model_name", "language", "with_timestamps", "skip_silence_seconds")
+
+def get_job_state_path(output_path=None, audio_path=None):
+    """状態ファイルのパスを返します（出力ファイルの隣、出力先が無い場合は音声ファイルの隣）"""
+    base_path = output_path or audio_path
+    if not base_path:
+        raise ValueError("状態ファイルの保存先を決められません（出力ファイルまたは音声ファイルが必要です）")
+    return os.path.abspath(base_path) + JOB_STATE_SUFFIX
+
+class JobStateError(Exception):
+    """状態ファイルが読み込めない、または現在のジョブと一致しないことを表す例外"""
+
+class JobState:
+    """ジョブの進捗状態（スレッドセーフ、更新のたびにファイルへ保存）"""
+
+    def __init__(self, path, data):
+        self.path = path
+        self.data = data
+        self.lock = threading.Lock()
+
+    @classmethod
+    def create(cls, path, audio_path=None, settings=None):
+        """新しいジョブの状態を作成します（既存の状態ファイルは上書きされます）"""
+        data = {
+            "version": JOB_STATE_VERSION,
+            "audio_file": os.path.abspath(audio_path) if audio_path else None,
+            "settings": dict(settings or {}),
+            "duration_ms": None,
+            "status": "running",
+            "segments": [],
+            "updated_at": None,
+        }
+        state = cls(path, data)
+        state.save()
+        return state
+
+    @classmethod
+    def load(cls, path):
+        """既存の状態ファイルを読み込みます"""
+        if not os.path.exists(path):
+            raise JobStateError(f"再開できるジョブの状態ファイルが見つかりません: {path}")
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            raise JobStateError(f"ジョブの状態ファイルを読み込めません: {path} ({str(e)})")
+        if data.get("version") != JOB_STATE_VERSION:
+            raise JobStateError(f"ジョブの状態ファイルの形式が異なります: {path}")
+        return cls(path, data)
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.exists(path)
+
+    def save(self):
+        """状態をファイルに書き込みます（書き込み途中で中断しても壊れないよう置き換えで保存）"""
+        with self.lock:
+            self.data["updated_at"] = time.strftime("%Y-%m-%dT%H:%M:%S")
+            temp_path = self.path + ".tmp"
+            with open(temp_path, "w", encoding="utf-8") as f:
+                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            os.replace(temp_path, self.path)
+
+    def delete(self):
+        """状態ファイルを削除します"""
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def check_compatible(self, duration_ms, settings):
+        """再開しようとしているジョブが状態ファイルと同じ音声・設定かを確認します"""
+        recorded_duration = self.data.get("duration_ms")
+        if recorded_duration is not None and recorded_duration != duration_ms:
+            raise JobStateError(
+                f"音声の長さが状態ファイルと異なります（状態ファイル: {recorded_duration}ms、現在: {duration_ms}ms）"
+            )
+        recorded_settings = self.data.get("settings", {})
+        for key in JOB_SETTING_KEYS:
+            if key in recorded_settings and key in settings and recorded_settings[key] != settings[key]:
+                raise JobStateError(
+                    f"設定 {key} が状態ファイルと異なります（状態ファイル: {recorded_settings[key]}、現在: {settings[key]}）"
+                )
+
+    @property
+    def segment_ranges(self):
+        """記録済みのセグメントの時間範囲 [(start_ms, end_ms), ...]"""
+        return [(seg["start_ms"], seg["end_ms"]) for seg in self.data["segments"]]
+
+    def set_segments(self, duration_ms, ranges):
+        """セグメントの分割計画を記録します"""
+        with self.lock:
+            self.data["duration_ms"] = duration_ms
+            self.data["segments"] = [
+                {"index": i, "start_ms": start_ms, "end_ms": end_ms,
+                 "status": "pending", "text": None, "error": None}
+                for i, (start_ms, end_ms) in enumerate(ranges)
+            ]
+        self.save()
+
+    def completed(self):
+        """完了済みのセグメントの結果 {セグメント番号: 文字起こし結果}"""
+        with self.lock:
+            return {seg["index"]: seg["text"] for seg in self.data["segments"] if seg["status"] == "done"}
+
+    def mark_done(self, index, text):
+        with self.lock:
+            segment = self.data["segments"][index]
+            segment.update(status="done", text=text, error=None)
+        self.save()
+
+    def mark_failed(self, index, error):
+        with self.lock:
+            segment = self.data["segments"][index]
+            segment.update(status="failed", error=str(error))
+        self.save()
+
+    def set_status(self, status):
+        with self.lock:
+            self.data["status"] = status
+        self.save()
@@ -0,0 +1,326 @@
+"""処理時間とデータ量の計測
+
+進捗イベント（events）を受け取り、段階（音声の読み込み・分割・デコード・前処理・16-bitへの変換・
+エンコード・アップロード・文字起こしの生成・議事録の生成）ごとの所要時間・データ量と、
+セグメントごとの所要時間・データ量・再試行回数を集計します。
+
+集計結果はJSON（write_json）と、node_exporter の textfile collector で読み込める
+Prometheus のテキスト形式（write_prometheus）で保存できます。
+
+    metrics = MetricsCollector()
+    transcribe_file(path, on_event=metrics.handler(forward=make_progress_printer()))
+    metrics.write_json("metrics.json")
+"""
+import os
+import json
+import time
+import threading
+
+import events
+from ratelimit import get_rate_limiter
+
+# 段階と表示名（表示・出力はこの順）
+STAGES = {
+    "load": "音声の読み込み",
+    "silence": "無音の検出",
+    "split": "セグメントへの分割",
+    "decode": "セグメントのデコード",
+    "preprocess": "前処理",
+    "convert": "16-bitへの変換",
+    "encode": "アップロード用のエンコード",
+    "upload": "アップロード",
+    "generate": "文字起こしの生成",
+    "minutes_partial": "議事録の要点の抽出",
+    "minutes": "議事録の生成",
+}
+
+# Prometheus のメトリクス名の接頭辞
+PROMETHEUS_PREFIX = "transcribe"
+
+def _new_segment(start_ms=None, end_ms=None):
+    return {
+        "start_ms": start_ms,
+        "end_ms": end_ms,
+        "status": "pending",
+        "cache_hit": False,
+        "decode_seconds": None,
+        "preprocess_seconds": None,
+        "gain_db": None,
+        "convert_seconds": None,
+        "encode_seconds": None,
+        "pcm_bytes": 0,
+        "encoded_bytes": 0,
+        "spilled": False,
+        "upload_seconds": 0.0,
+        "upload_bytes": 0,
+        "upload_reused": False,
+        "generate_seconds": 0.0,
+        "attempts": 0,
+        "retries": 0,
+        "chars": 0,
+        "error": None,
+    }
+
+def _write_atomic(path, text):
+    # 読み込み途中の不完全なファイルを node_exporter などに読ませないよう、書き終えてから置き換える
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(temp_path, path)
+
+def _format_bytes(size_bytes):
+    if size_bytes >= 1024 * 1024:
+        return f"{size_bytes / (1024 * 1024):.1f}MB"
+    return f"{size_bytes / 1024:.1f}KB"
+
+def _escape_label(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class MetricsCollector:
+    """進捗イベントから段階ごと・セグメントごとの計測値を集計する（スレッドセーフ）
+
+    handler() が返す関数を on_event に渡して使います。複数のファイルを処理する場合は
+    ファイルごとに label を変えた handler() を渡すと、セグメントの計測値をファイルごとに記録します。
+    """
+
+    def __init__(self, limiter=None):
+        self.lock = threading.Lock()
+        self.started_at = time.time()
+        self.limiter = limiter or get_rate_limiter()
+        self.limiter_stats_before = self.limiter.snapshot()
+        self.stages = {}  # 段階 -> {"count", "seconds", "max_seconds", "bytes"}
+        self.files = {}  # ラベル -> ファイルごとの計測値
+
+    def handler(self, label=None, forward=None):
+        """on_event に渡す関数を返します（forward を指定した場合はイベントをそのまま転送）"""
+        def on_event(event):
+            self.record(event, label)
+            if forward is not None:
+                forward(event)
+        return on_event
+
+    def add_stage(self, stage, seconds, size_bytes=0):
+        """段階の所要時間とデータ量を1回分加えます"""
+        with self.lock:
+            self._add_stage(stage, seconds, size_bytes)
+
+    def _add_stage(self, stage, seconds, size_bytes=0):
+        entry = self.stages.setdefault(stage, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "bytes": 0})
+        entry["count"] += 1
+        entry["seconds"] += seconds
+        entry["max_seconds"] = max(entry["max_seconds"], seconds)
+        entry["bytes"] += size_bytes
+
+    def _file(self, label):
+        return self.files.setdefault(label, {"audio_ms": None, "audio_bytes": None, "skipped_ms": 0, "segments": {}})
+
+    def _segment(self, label, index):
+        return self._file(label)["segments"].setdefault(index, _new_segment())
+
+    def record(self, event, label=None):
+        """進捗イベントを1つ集計します"""
+        with self.lock:
+            if isinstance(event, events.AudioLoaded):
+                self._add_stage("load", event.elapsed_seconds, 0 if event.streaming else event.size_bytes)
+                file_metrics = self._file(label)
+                file_metrics["audio_ms"] = event.duration_ms
+                file_metrics["audio_bytes"] = event.size_bytes
+            elif isinstance(event, events.SilenceSkipped):
+                self._add_stage("silence", event.elapsed_seconds)
+                self._file(label)["skipped_ms"] = event.original_ms - event.condensed_ms
+            elif isinstance(event, events.SegmentsPlanned):
+                self._add_stage("split", event.elapsed_seconds)
+                for index, (start_ms, end_ms) in enumerate(event.ranges):
+                    segment = self._segment(label, index)
+                    segment["start_ms"], segment["end_ms"] = start_ms, end_ms
+                # 再開時に完了済みのセグメントは今回の処理の対象外
+                if event.pending < event.total:
+                    for segment in self._file(label)["segments"].values():
+                        segment["status"] = "resumed"
+            elif isinstance(event, events.SegmentStarted):
+                self._segment(label, event.index)["status"] = "running"
+            elif isinstance(event, events.SegmentCacheHit):
+                if event.index is not None:
+                    segment = self._segment(label, event.index)
+                    segment["cache_hit"] = True
+                    segment["chars"] = event.chars
+            elif isinstance(event, events.AudioPreprocessed):
+                self._add_stage("preprocess", event.elapsed_seconds, event.input_bytes)
+                if event.index is not None:
+                    segment = self._segment(label, event.index)
+                    segment["preprocess_seconds"] = event.elapsed_seconds
+                    segment["gain_db"] = event.gain_db
+            elif isinstance(event, events.SegmentPrepared):
+                if event.decode_seconds is not None:
+                    self._add_stage("decode", event.decode_seconds, event.pcm_bytes)
+                self._add_stage("convert", event.convert_seconds, event.pcm_bytes)
+                self._add_stage("encode", event.encode_seconds, event.encoded_bytes)
+                if event.index is not None:
+                    segment = self._segment(label, event.index)
+                    segment["decode_seconds"] = event.decode_seconds
+                    segment["convert_seconds"] = event.convert_seconds
+                    segment["encode_seconds"] = event.encode_seconds
+                    segment["pcm_bytes"] = event.pcm_bytes
+                    segment["encoded_bytes"] = event.encoded_bytes
+                    segment["spilled"] = event.spilled
+            elif isinstance(event, events.UploadFinished):
+                # アップロード済みのハンドルを再利用した場合は転送していない
+                if not event.reused:
+                    self._add_stage("upload", event.elapsed_seconds, event.size_bytes)
+                if event.index is not None:
+                    segment = self._segment(label, event.index)
+                    if event.reused:
+                        segment["upload_reused"] = True
+                    else:
+                        segment["upload_seconds"] += event.elapsed_seconds
+                        segment["upload_bytes"] += event.size_bytes
+            elif isinstance(event, events.GenerateFinished):
+                self._add_stage("generate", event.elapsed_seconds)
+                if event.index is not None:
+                    segment = self._segment(label, event.index)
+                    segment["generate_seconds"] += event.elapsed_seconds
+                    segment["attempts"] = event.attempt
+                    segment["chars"] = event.chars
+            elif isinstance(event, events.SegmentRetry):
+                if event.index is not None:
+                    self._segment(label, event.index)["retries"] += 1
+            elif isinstance(event, events.SegmentFinished):
+                segment = self._segment(label, event.index)
+                segment["status"] = "done"
+                segment["chars"] = event.chars
+            elif isinstance(event, events.SegmentFailed):
+                segment = self._segment(label, event.index)
+                segment["status"] = "failed"
+                segment["error"] = event.error
+            elif isinstance(event, events.MinutesPartialFinished):
+                if not event.cached:
+                    self._add_stage("minutes_partial", event.elapsed_seconds)
+            elif isinstance(event, events.MinutesFinished):
+                if not event.cached:
+                    self._add_stage("minutes", event.elapsed_seconds)
+
+    def to_dict(self):
+        """集計結果を辞書で返します"""
+        limiter_stats = self.limiter.snapshot()
+        with self.lock:
+            stages = {}
+            for stage in list(STAGES) + [stage for stage in self.stages if stage not in STAGES]:
+                if stage in self.stages:
+                    entry = self.stages[stage]
+                    stages[stage] = {
+                        "count": entry["count"],
+                        "seconds": round(entry["seconds"], 6),
+                        "max_seconds": round(entry["max_seconds"], 6),
+                        "bytes": entry["bytes"],
+                    }
+            files = []
+            for label, file_metrics in self.files.items():
+                segments = []
+                for index in sorted(file_metrics["segments"]):
+                    segment = dict(file_metrics["segments"][index], index=index)
+                    for key, value in segment.items():
+                        if isinstance(value, float):
+                            segment[key] = round(value, 6)
+                    segments.append(segment)
+                files.append({
+                    "label": label,
+                    "audio_ms": file_metrics["audio_ms"],
+                    "audio_bytes": file_metrics["audio_bytes"],
+                    "skipped_ms": file_metrics["skipped_ms"],
+                    "segments": segments,
+                })
+        segments = [segment for file_metrics in files for segment in file_metrics["segments"]]
+        return {
+            "started_at": round(self.started_at, 3),
+            "wall_seconds": round(time.time() - self.started_at, 6),
+            "stages": stages,
+            "segments": {
+                "total": len(segments),
+                "done": sum(1 for segment in segments if segment["status"] == "done"),
+                "failed": sum(1 for segment in segments if segment["status"] == "failed"),
+                "cache_hits": sum(1 for segment in segments if segment["cache_hit"]),
+                "retries": sum(segment["retries"] for segment in segments),
+                "spilled": sum(1 for segment in segments if segment["spilled"]),
+            },
+            "rate_limit": {
+                "requests": limiter_stats["requests"] - self.limiter_stats_before["requests"],
+                "rate_limited": limiter_stats["rate_limited"] - self.limiter_stats_before["rate_limited"],
+                "throttled_seconds": round(
+                    limiter_stats["throttled_seconds"] - self.limiter_stats_before["throttled_seconds"], 6
+                ),
+            },
+            "files": files,
+        }
+
+    def summary_lines(self):
+        """段階ごとの集計を表示用の行のリストで返します"""
+        data = self.to_dict()
+        lines = []
+        for stage, entry in data["stages"].items():
+            line = (f"{STAGES.get(stage, stage)}: {entry['count']}回、合計{entry['seconds']:.2f}秒"
+                    f"（最大{entry['max_seconds']:.2f}秒）")
+            if entry["bytes"]:
+                line += f"、{_format_bytes(entry['bytes'])}"
+            lines.append(line)
+        segments = data["segments"]
+        rate_limit = data["rate_limit"]
+        skipped_ms = sum(file_metrics["skipped_ms"] for file_metrics in data["files"])
+        if skipped_ms:
+            lines.append(f"スキップした無音: 合計{skipped_ms / 1000:.1f}秒")
+        lines.append(f"セグメント: 完了{segments['done']}個、失敗{segments['failed']}個、"
+                     f"キャッシュ{segments['cache_hits']}個、再試行{segments['retries']}回")
+        if segments["spilled"]:
+            lines.append(f"一時ファイルに書き出したセグメント: {segments['spilled']}個（メモリ上の上限を超えたもの）")
+        lines.append(f"APIリクエスト: {rate_limit['requests']}回、クォータ超過{rate_limit['rate_limited']}回"
+                     f"（レート制限による待機 合計{rate_limit['throttled_seconds']:.1f}秒）")
+        lines.append(f"経過時間: {data['wall_seconds']:.1f}秒（並列に処理した段階は合計が経過時間を超えます）")
+        return lines
+
+    def write_json(self, path):
+        """集計結果をJSONで保存します"""
+        _write_atomic(path, json.dumps(self.to_dict(), ensure_ascii=False, indent=2) + "\n")
+
+    def to_prometheus(self):
+        """集計結果を Prometheus のテキスト形式で返します"""
+        data = self.to_dict()
+        metrics = [
+            ("stage_seconds", "段階ごとの所要時間の合計（秒）", "seconds"),
+            ("stage_max_seconds", "段階ごとの1回あたりの最大の所要時間（秒）", "max_seconds"),
+            ("stage_count", "段階ごとの実行回数", "count"),
+            ("stage_bytes", "段階ごとに処理したデータ量（バイト）", "bytes"),
+        ]
+        lines = []
+        for name, help_text, key in metrics:
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+            for stage, entry in data["stages"].items():
+                lines.append(f'{PROMETHEUS_PREFIX}_{name}{{stage="{_escape_label(stage)}"}} {entry[key]}')
+
+        segments = data["segments"]
+        lines.append(f"# HELP {PROMETHEUS_PREFIX}_segments 状態ごとのセグメント数")
+        lines.append(f"# TYPE {PROMETHEUS_PREFIX}_segments gauge")
+        for status in ("done", "failed", "cache_hits"):
+            lines.append(f'{PROMETHEUS_PREFIX}_segments{{status="{status}"}} {segments[status]}')
+
+        audio_seconds = sum((file_metrics["audio_ms"] or 0) for file_metrics in data["files"]) / 1000
+        gauges = [
+            ("segment_retries", "セグメントの再試行回数", segments["retries"]),
+            ("spilled_segments", "エンコード結果を一時ファイルに書き出したセグメント数", segments["spilled"]),
+            ("api_requests", "APIリクエスト数", data["rate_limit"]["requests"]),
+            ("rate_limited", "クォータ超過の回数", data["rate_limit"]["rate_limited"]),
+            ("throttled_seconds", "レート制限による待機時間の合計（秒）", data["rate_limit"]["throttled_seconds"]),
+            ("audio_seconds", "処理した音声の長さ（秒）", audio_seconds),
+            ("skipped_silence_seconds", "スキップした無音の長さ（秒）",
+             sum(file_metrics["skipped_ms"] for file_metrics in data["files"]) / 1000),
+            ("wall_seconds", "処理の経過時間（秒）", data["wall_seconds"]),
+            ("last_run_timestamp_seconds", "処理を開始した時刻（UNIX時刻）", data["started_at"]),
+        ]
+        for name, help_text, value in gauges:
+            lines.append(f"# HELP {PROMETHEUS_PREFIX}_{name} {help_text}")
+            lines.append(f"# TYPE {PROMETHEUS_PREFIX}_{name} gauge")
+            lines.append(f"{PROMETHEUS_PREFIX}_{name} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_prometheus(self, path):
+        """集計結果を Prometheus のテキスト形式で保存します（node_exporter の textfile collector 用）"""
+        _write_atomic(path, self.to_prometheus())
@@ -0,0 +1,204 @@
+"""アップロード前の音声の前処理
+
+デコードした音声のサンプルをNumPyで直接処理し、次の処理を行います（それぞれ個別に有効・無効を切り替え可能）。
+
+- downmix: モノラルへの変換（チャンネルの平均）
+- resample: 指定したサンプルレートへの変換（ダウンサンプリング時は折り返し防止のローパスフィルタをかける）
+- normalize: 音量の正規化（無音を除いた区間の平均の音量を target_dbfs に合わせ、ピークが peak_dbfs を超えないようにする）
+
+小さな声の録音で文字起こし結果が短くなり再試行が繰り返されるのを防ぎ、ステレオや高いサンプルレートの
+音声のアップロード量を減らします。長い音声でもメモリの使用量が増えすぎないよう、
+BLOCK_SECONDS 秒ずつに分けて処理します。
+"""
+import time
+from dataclasses import dataclass
+from typing import Optional
+
+# 前処理の手順（--preprocess で指定する名前）
+PREPROCESS_STEPS = ("downmix", "resample", "normalize")
+
+# resample のデフォルトの変換先のサンプルレート（音声認識には16kHzで十分）
+DEFAULT_SAMPLE_RATE = 16000
+
+# normalize の目標の音量（dBFS）と、ピークの上限（dBFS）
+DEFAULT_TARGET_DBFS = -20.0
+DEFAULT_PEAK_DBFS = -1.0
+
+# 雑音だけの音声を極端に増幅しないよう、音量の正規化で上げる量の上限（dB）
+MAX_GAIN_DB = 30.0
+
+# 音量の計測に使う区間の長さ（ミリ秒）と、無音とみなす区間の音量（dBFS）
+LOUDNESS_WINDOW_MS = 400
+LOUDNESS_ABSOLUTE_GATE_DBFS = -60.0
+# 平均の音量からこの値（dB）以上小さい区間も計測から除く（話していない区間の雑音を除くため）
+LOUDNESS_RELATIVE_GATE_DB = 15.0
+
+# 一度に処理する長さ（秒）
+BLOCK_SECONDS = 30
+
+# ダウンサンプリング時のローパスフィルタのタップ数の上限
+MAX_FILTER_TAPS = 255
+
+@dataclass(frozen=True)
+class PreprocessOptions:
+    """前処理の設定（sample_rate がNoneの場合はサンプルレートを変換しない）"""
+    downmix: bool = True
+    sample_rate: Optional[int] = DEFAULT_SAMPLE_RATE
+    normalize: bool = True
+    target_dbfs: float = DEFAULT_TARGET_DBFS
+    peak_dbfs: float = DEFAULT_PEAK_DBFS
+
+    @property
+    def enabled(self):
+        return self.downmix or self.sample_rate is not None or self.normalize
+
+def parse_preprocess_steps(text, sample_rate=DEFAULT_SAMPLE_RATE, target_dbfs=DEFAULT_TARGET_DBFS):
+    """"downmix,normalize" や "all" のような手順の指定から PreprocessOptions を作成します
+
+    Raises:
+        ValueError: 不明な手順が含まれている場合
+    """
+    steps = {step.strip().lower() for step in text.split(",") if step.strip()}
+    if "all" in steps:
+        steps = set(PREPROCESS_STEPS)
+    unknown = steps - set(PREPROCESS_STEPS)
+    if unknown:
+        raise ValueError(f"不明な前処理です: {', '.join(sorted(unknown))}（利用可能: all, {', '.join(PREPROCESS_STEPS)}）")
+    return PreprocessOptions(
+        downmix="downmix" in steps,
+        sample_rate=sample_rate if "resample" in steps else None,
+        normalize="normalize" in steps,
+        target_dbfs=target_dbfs,
+    )
+
+def sample_frames(segment):
+    """AudioSegment の生データを (フレーム数, チャンネル数) の整数配列と、フルスケールの値を返します（コピーしない）"""
+    import numpy as np
+    dtypes = {1: np.int8, 2: np.int16, 4: np.int32}
+    samples = np.frombuffer(segment.raw_data, dtype=dtypes[segment.sample_width])
+    return samples.reshape(-1, segment.channels), float(2 ** (8 * segment.sample_width - 1))
+
+def _to_float(frames, scale, downmix):
+    import numpy as np
+    block = frames.astype(np.float32) / scale
+    if downmix and block.shape[1] > 1:
+        block = block.mean(axis=1, keepdims=True)
+    return block
+
+def measure_loudness(segment, downmix=True):
+    """無音の区間を除いた平均の音量（dBFS、すべて無音の場合はNone）とピーク（dBFS）を返します"""
+    import numpy as np
+    frames, scale = sample_frames(segment)
+    window = max(1, int(segment.frame_rate * LOUDNESS_WINDOW_MS / 1000))
+    block_frames = max(window, BLOCK_SECONDS * segment.frame_rate // window * window)
+
+    powers = []
+    peak = 0.0
+    for start in range(0, len(frames), block_frames):
+        block = _to_float(frames[start:start + block_frames], scale, downmix)
+        peak = max(peak, float(np.abs(block).max(initial=0.0)))
+        usable = len(block) // window * window
+        if usable:
+            squares = np.square(block[:usable], dtype=np.float32).reshape(-1, window * block.shape[1])
+            powers.append(squares.mean(axis=1, dtype=np.float64))
+
+    peak_dbfs = 20 * np.log10(peak) if peak > 0 else float("-inf")
+    if not powers:
+        return None, peak_dbfs
+    powers = np.concatenate(powers)
+
+    # 無音の区間と、平均より大きく小さい区間（話していない区間の雑音）を除いて平均する
+    gated = powers[powers > 10 ** (LOUDNESS_ABSOLUTE_GATE_DBFS / 10)]
+    if len(gated) == 0:
+        return None, peak_dbfs
+    threshold = gated.mean() * 10 ** (-LOUDNESS_RELATIVE_GATE_DB / 10)
+    gated = gated[gated > threshold]
+    return 10 * float(np.log10(gated.mean())), peak_dbfs
+
+def _lowpass_taps(source_rate, target_rate):
+    """ダウンサンプリング用のローパスフィルタ（窓関数法のFIR）を返します（アップサンプリングではNone）"""
+    import numpy as np
+    if target_rate >= source_rate:
+        return None
+    ratio = target_rate / source_rate
+    cutoff = 0.45 * ratio  # 変換後のナイキスト周波数の少し手前（元のサンプルレートに対する比）
+    num_taps = min(MAX_FILTER_TAPS, int(8 / ratio) | 1)
+    n = np.arange(num_taps) - (num_taps - 1) / 2
+    taps = 2 * cutoff * np.sinc(2 * cutoff * n) * np.hamming(num_taps)
+    return (taps / taps.sum()).astype(np.float32)
+
+def preprocess_segment(segment, options):
+    """AudioSegment に前処理を行い、16-bit PCMの AudioSegment を返します
+
+    Returns:
+        (処理後の AudioSegment, 処理内容の説明のリスト, 音量の調整量（dB）)
+    """
+    import numpy as np
+    frames, scale = sample_frames(segment)
+    source_rate = segment.frame_rate
+    target_rate = options.sample_rate or source_rate
+    downmix = options.downmix and segment.channels > 1
+    out_channels = 1 if downmix else segment.channels
+
+    notes = []
+    if downmix:
+        notes.append(f"{segment.channels}ch→1ch")
+    if target_rate != source_rate:
+        notes.append(f"{source_rate}Hz→{target_rate}Hz")
+
+    gain_db = 0.0
+    if options.normalize:
+        loudness_dbfs, peak_dbfs = measure_loudness(segment, downmix)
+        if loudness_dbfs is not None:
+            gain_db = min(options.target_dbfs - loudness_dbfs, options.peak_dbfs - peak_dbfs, MAX_GAIN_DB)
+            notes.append(f"音量 {loudness_dbfs:.1f}dBFS（{gain_db:+.1f}dB）")
+
+    if not notes:
+        return segment.set_sample_width(2), notes, gain_db
+    if not downmix and target_rate == source_rate and abs(gain_db) < 0.1 and segment.sample_width == 2:
+        return segment, notes, 0.0
+
+    gain = np.float32(10 ** (gain_db / 20) * 32767)
+    num_out = len(frames) if target_rate == source_rate else len(frames) * target_rate // source_rate
+    out = np.empty((num_out, out_channels), dtype=np.int16)
+    step = source_rate / target_rate
+    taps = _lowpass_taps(source_rate, target_rate)
+    margin = len(taps) // 2 + 1 if taps is not None else 1
+    block_out = BLOCK_SECONDS * target_rate
+
+    for k0 in range(0, num_out, block_out):
+        k1 = min(num_out, k0 + block_out)
+        if target_rate == source_rate:
+            block = _to_float(frames[k0:k1], scale, downmix)
+        else:
+            # 出力の区間に必要な入力の区間（フィルタの分の前後の余白を含む）を取り出して補間する
+            positions = np.arange(k0, k1) * step
+            start = max(0, int(positions[0]) - margin)
+            end = min(len(frames), int(positions[-1]) + 1 + margin)
+            source = _to_float(frames[start:end], scale, downmix)
+            grid = np.arange(start, end)
+            block = np.empty((k1 - k0, out_channels), dtype=np.float32)
+            for channel in range(out_channels):
+                samples = source[:, channel]
+                if taps is not None and len(samples) >= len(taps):
+                    samples = np.convolve(samples, taps, mode="same")
+                block[:, channel] = np.interp(positions, grid, samples)
+        block *= gain
+        np.clip(block, -32768, 32767, out=block)
+        out[k0:k1] = block
+
+    processed = type(segment)(data=out.tobytes(), sample_width=2, frame_rate=target_rate, channels=out_channels)
+    return processed, notes, gain_db
+
+def preprocess_audio(segment, options, label="音声全体"):
+    """preprocess_segment で前処理を行い、処理内容を表示します
+
+    Returns:
+        (処理後の AudioSegment, 所要時間（秒）, 音量の調整量（dB）)
+    """
+    started_at = time.time()
+    processed, notes, gain_db = preprocess_segment(segment, options)
+    elapsed = time.time() - started_at
+    if notes:
+        print(f"前処理 ({label}): {'、'.join(notes)}（{elapsed:.1f}秒）")
+    return processed, elapsed, gain_db
@@ -0,0 +1,210 @@
+"""API呼び出しのレート制限
+
+文字起こし・アップロード・議事録生成のすべてのAPI呼び出しが共有する、
+プロセス全体のレート制限です。
+
+- 1分あたりのリクエスト数（トークンバケット）と同時リクエスト数を制限します
+- クォータ超過（HTTP 429 / RESOURCE_EXHAUSTED）を検出すると、すべての呼び出しを
+  ジッター付きの指数バックオフで一時停止し、設定したリクエスト数を一時的に下げます
+  （成功が続くと元に戻します）。サーバーが再試行までの時間を示した場合はそれに従います
+- 制限によって待機した時間を集計します
+"""
+import re
+import time
+import random
+import threading
+
+# クォータ超過時に同じ呼び出しを再試行する回数
+DEFAULT_MAX_RATE_LIMIT_RETRIES = 8
+
+# 指数バックオフの初期値と上限（秒）
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+# トークンバケットに貯められるリクエスト数（1分あたりのリクエスト数に対する秒数）
+BURST_SECONDS = 5
+
+# 一時停止の解除時に各呼び出しに加える待機時間のばらつき（秒）
+# （一時停止が明けた瞬間に全ワーカーが一斉に再開しないようにする）
+RESUME_JITTER_SECONDS = 1.0
+
+# クォータ超過を表すエラーメッセージの手がかり（ステータスコードが分からない例外の場合だけ使う）
+# 429 はバイト数やファイル名の数字と区別するため、HTTP・status・code に続く場合だけ一致させる
+RATE_LIMIT_MESSAGE_PATTERN = re.compile(
+    r"\b(?:http|status|code)\W{0,3}429\b|quota|resource[_ ]exhausted|rate limit|too many requests", re.IGNORECASE
+)
+
+# エラーメッセージに含まれる再試行までの時間（Gemini APIの RetryInfo など）
+RETRY_AFTER_PATTERNS = [
+    re.compile(r"retry_delay\s*\{\s*seconds:\s*(\d+)"),
+    re.compile(r"retry in (\d+(?:\.\d+)?)\s*s", re.IGNORECASE),
+]
+
+def is_rate_limit_error(error):
+    """クォータ超過（レート制限）によるエラーかを判定します"""
+    if type(error).__name__ in ("RateLimitError", "ResourceExhausted", "TooManyRequests"):
+        return True
+    statuses = [getattr(error, "status", None), getattr(error, "code", None)]
+    if 429 in statuses:
+        return True
+    # ステータスコードが分かる場合はそれに従い、メッセージでの判定は分からない場合だけ行う
+    if any(isinstance(status, int) for status in statuses):
+        return False
+    return bool(RATE_LIMIT_MESSAGE_PATTERN.search(str(error)))
+
+def get_retry_after(error):
+    """エラーが示す再試行までの秒数を返します。分からなければNoneを返します"""
+    retry_after = getattr(error, "retry_after", None)
+    if retry_after is not None:
+        return float(retry_after)
+    message = str(error)
+    for pattern in RETRY_AFTER_PATTERNS:
+        match = pattern.search(message)
+        if match:
+            return float(match.group(1))
+    return None
+
+def backoff_delay(attempt, retry_after=None, base=BACKOFF_BASE_SECONDS, cap=BACKOFF_MAX_SECONDS):
+    """attempt 回目（0から）の再試行までの待機時間をジッター付きの指数バックオフで求めます
+
+    待機時間は base * 2**attempt（上限 cap）の半分から全体までの一様乱数です。
+    retry_after が指定された場合はそれより短くしません。
+    """
+    limit = min(cap, base * (2 ** attempt))
+    delay = limit / 2 + random.uniform(0, limit / 2)
+    if retry_after is not None:
+        delay = max(delay, retry_after + random.uniform(0, RESUME_JITTER_SECONDS))
+    return delay
+
+class RateLimiter:
+    """プロセス全体で共有するレート制限（スレッドセーフ）
+
+    requests_per_minute, max_concurrent は 0 で無制限です。
+    """
+
+    def __init__(self, requests_per_minute=0, max_concurrent=0, max_rate_limit_retries=DEFAULT_MAX_RATE_LIMIT_RETRIES):
+        self.requests_per_minute = requests_per_minute
+        self.max_concurrent = max_concurrent
+        self.max_rate_limit_retries = max_rate_limit_retries
+        self.lock = threading.Lock()
+        self.semaphore = threading.BoundedSemaphore(max_concurrent) if max_concurrent > 0 else None
+
+        # トークンバケット（クォータ超過時は current_rpm を下げる）
+        self.current_rpm = float(requests_per_minute)
+        self.capacity = max(1.0, requests_per_minute * BURST_SECONDS / 60.0)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+
+        # クォータ超過時の一時停止
+        self.pause_until = 0.0
+        self.consecutive_rate_limits = 0
+
+        self.stats = {"requests": 0, "rate_limited": 0, "throttled_seconds": 0.0}
+
+    def _refill(self, now):
+        """経過時間に応じてトークンを補充します（ロック取得済みで呼び出す）"""
+        elapsed = now - self.updated_at
+        self.updated_at = now
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.current_rpm / 60.0)
+
+    def acquire(self):
+        """リクエストを送ってよくなるまで待機します（完了後に release() を呼び出してください）"""
+        started_at = time.monotonic()
+        if self.semaphore is not None:
+            self.semaphore.acquire()
+
+        resume_jitter = None
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                wait = self.pause_until - now
+                if wait > 0:
+                    if resume_jitter is None:
+                        resume_jitter = random.uniform(0, RESUME_JITTER_SECONDS)
+                    wait += resume_jitter
+                elif self.requests_per_minute > 0:
+                    self._refill(now)
+                    if self.tokens >= 1:
+                        self.tokens -= 1
+                        break
+                    wait = (1 - self.tokens) * 60.0 / self.current_rpm
+                else:
+                    break
+            time.sleep(wait)
+
+        throttled = time.monotonic() - started_at
+        with self.lock:
+            self.stats["requests"] += 1
+            self.stats["throttled_seconds"] += throttled
+
+    def release(self):
+        if self.semaphore is not None:
+            self.semaphore.release()
+
+    def on_success(self):
+        """リクエストが成功したことを記録し、下げていたリクエスト数を少しずつ戻します"""
+        with self.lock:
+            self.consecutive_rate_limits = 0
+            if self.requests_per_minute > 0 and self.current_rpm < self.requests_per_minute:
+                self.current_rpm = min(float(self.requests_per_minute),
+                                       self.current_rpm + self.requests_per_minute / 10.0)
+
+    def on_rate_limited(self, retry_after=None):
+        """クォータ超過を記録し、すべての呼び出しを一時停止します
+
+        Returns:
+            一時停止する秒数
+        """
+        with self.lock:
+            delay = backoff_delay(self.consecutive_rate_limits, retry_after)
+            self.consecutive_rate_limits += 1
+            self.stats["rate_limited"] += 1
+            self.pause_until = max(self.pause_until, time.monotonic() + delay)
+            if self.requests_per_minute > 0:
+                self.current_rpm = max(1.0, self.current_rpm / 2)
+            return delay
+
+    def call(self, func, *args, **kwargs):
+        """レート制限に従って func を呼び出します
+
+        クォータ超過の場合は一時停止してから最大 max_rate_limit_retries 回まで再試行し、
+        それ以外のエラーはそのまま送出します。
+        """
+        attempt = 0
+        while True:
+            self.acquire()
+            try:
+                result = func(*args, **kwargs)
+            except Exception as e:
+                if not is_rate_limit_error(e):
+                    raise
+                delay = self.on_rate_limited(get_retry_after(e))
+                if attempt >= self.max_rate_limit_retries:
+                    raise
+                attempt += 1
+                print(f"クォータ超過のため{delay:.1f}秒待機してから再試行します ({attempt}/{self.max_rate_limit_retries})")
+                continue
+            finally:
+                self.release()
+            self.on_success()
+            return result
+
+    def snapshot(self):
+        """統計のコピーを返します"""
+        with self.lock:
+            return dict(self.stats, current_rpm=self.current_rpm)
+
+_rate_limiter = RateLimiter()
+_rate_limiter_lock = threading.Lock()
+
+def get_rate_limiter():
+    """プロセス全体で共有するレート制限を返します"""
+    with _rate_limiter_lock:
+        return _rate_limiter
+
+def configure_rate_limiter(requests_per_minute=0, max_concurrent=0, max_rate_limit_retries=DEFAULT_MAX_RATE_LIMIT_RETRIES):
+    """プロセス全体で共有するレート制限の設定を変更します"""
+    global _rate_limiter
+    with _rate_limiter_lock:
+        _rate_limiter = RateLimiter(requests_per_minute, max_concurrent, max_rate_limit_retries)
+        return _rate_limiter
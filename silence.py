@@ -0,0 +1,172 @@
+"""長い無音のスキップ
+
+会議の録音に含まれる休憩・開始待ち・録音の止め忘れなどの長い無音を、アップロードの前に取り除きます。
+取り除いた後の音声（詰めた時間軸）の時刻を元の音声の時刻に戻すため、残した区間ごとに
+詰めた時間軸と元の時間軸の開始位置の対応（TimelineMap）を記録し、文字起こし結果の
+タイムスタンプを元の音声の時刻に付け替えます（remap_timestamps）。
+
+無音の判定は ENERGY_FRAME_MS ごとの音量で行い、閾値は録音の雑音の大きさに合わせて決めます。
+"""
+import bisect
+import time
+
+from preprocess import sample_frames
+from timestamps import TIMESTAMP_PATTERN, format_timestamp, timestamp_to_ms
+
+# 無音を判定するフレームの長さ（ミリ秒）
+ENERGY_FRAME_MS = 20
+
+# 一度に読み込んで判定する長さ（ミリ秒）。長い音声でもメモリの使用量が増えすぎないようにする
+DETECTION_BLOCK_MS = 60 * 1000
+
+# 雑音の大きさとみなすフレームの音量の下位の割合（%）と、それより何dB大きければ音声とみなすか
+NOISE_FLOOR_PERCENTILE = 10
+SPEECH_MARGIN_DB = 12.0
+
+# 無音と判定する閾値の範囲（dBFS）。雑音が大きい録音でも話し声を無音と判定しないよう上限を設ける
+MIN_THRESHOLD_DBFS = -60.0
+MAX_THRESHOLD_DBFS = -35.0
+
+# 取り除く無音の前後に残す長さ（ミリ秒）。話し始め・話し終わりが切れないようにする
+SILENCE_PADDING_MS = 500
+
+# GUIで長い無音のスキップを有効にした場合に取り除く無音の長さ（秒）
+DEFAULT_SKIP_SILENCE_SECONDS = 5
+
+class TimelineMap:
+    """無音を取り除いた音声（詰めた時間軸）と元の音声の時刻の対応
+
+    残した区間ごとに (詰めた時間軸での開始ミリ秒, 元の時間軸での開始ミリ秒, 長さ) を保持します。
+    """
+
+    def __init__(self, original_ranges):
+        self.entries = []
+        condensed_ms = 0
+        for start_ms, end_ms in original_ranges:
+            self.entries.append((condensed_ms, start_ms, end_ms - start_ms))
+            condensed_ms += end_ms - start_ms
+        self.condensed_starts = [entry[0] for entry in self.entries]
+        self.condensed_ms = condensed_ms
+
+    def to_original(self, ms, end=False):
+        """詰めた時間軸の時刻を元の音声の時刻に変換します
+
+        区間の境目の時刻は、end=False では次の区間の開始位置、end=True では前の区間の終了位置に変換します。
+        """
+        if not self.entries:
+            return ms
+        if end:
+            index = max(0, bisect.bisect_left(self.condensed_starts, ms) - 1)
+        else:
+            index = max(0, bisect.bisect_right(self.condensed_starts, ms) - 1)
+        condensed_start, original_start, length = self.entries[index]
+        return original_start + min(max(0, ms - condensed_start), length)
+
+    def to_list(self):
+        return [list(entry) for entry in self.entries]
+
+def remap_timestamps(text, timeline):
+    """テキスト中の詰めた時間軸のタイムスタンプを元の音声の時刻に付け替えます（1回の走査で置換）"""
+    return TIMESTAMP_PATTERN.sub(lambda m: f"[{format_timestamp(timeline.to_original(timestamp_to_ms(m)))}]", text)
+
+def frame_levels(audio_data):
+    """ENERGY_FRAME_MS ごとのフレームの音量（dBFS）の配列と、フレームの長さ（ミリ秒）を返します
+
+    DETECTION_BLOCK_MS ずつ処理するため、長い音声でも音声全体の浮動小数点の配列は作りません。
+    """
+    import numpy as np
+    frames, full_scale = sample_frames(audio_data)
+    frame_length = max(1, int(audio_data.frame_rate * ENERGY_FRAME_MS / 1000))
+    frame_ms = frame_length * 1000 / audio_data.frame_rate
+    block_frames = max(1, DETECTION_BLOCK_MS // ENERGY_FRAME_MS) * frame_length
+
+    levels = []
+    for block_start in range(0, len(frames), block_frames):
+        block = frames[block_start:block_start + block_frames]
+        usable = len(block) // frame_length * frame_length
+        if usable == 0:
+            break
+        mono = block[:usable].astype(np.float32).mean(axis=1) / full_scale
+        power = np.square(mono).reshape(-1, frame_length).mean(axis=1)
+        levels.append(10 * np.log10(np.maximum(power, 1e-20)))
+    return (np.concatenate(levels) if levels else np.zeros(0)), frame_ms
+
+def detect_speech_ranges(audio_data, min_silence_ms, threshold_dbfs=None):
+    """min_silence_ms 以上続く無音を除いた、残す区間（元の時間軸のミリ秒）のリストを返します
+
+    threshold_dbfs を省略した場合は、雑音の大きさ（音量の下位 NOISE_FLOOR_PERCENTILE% のフレーム）から閾値を決めます。
+
+    Returns:
+        (残す区間のリスト, 使用した閾値（dBFS）)
+    """
+    import numpy as np
+    audio_length_ms = len(audio_data)
+    levels, frame_ms = frame_levels(audio_data)
+    if threshold_dbfs is None and len(levels):
+        noise_floor = float(np.percentile(levels, NOISE_FLOOR_PERCENTILE))
+        threshold_dbfs = min(MAX_THRESHOLD_DBFS, max(MIN_THRESHOLD_DBFS, noise_floor + SPEECH_MARGIN_DB))
+    if len(levels) == 0:
+        return [(0, audio_length_ms)], threshold_dbfs if threshold_dbfs is not None else MIN_THRESHOLD_DBFS
+
+    # 無音のフレームが続く区間の開始・終了位置を差分から求める（末尾の端数は音声とみなす）
+    silent = np.concatenate(([False], levels < threshold_dbfs, [False]))
+    changes = np.flatnonzero(np.diff(silent.astype(np.int8)))
+    run_starts, run_ends = changes[::2], changes[1::2]
+
+    ranges = []
+    position_ms = 0
+    for run_start, run_end in zip(run_starts, run_ends):
+        silence_start_ms = int(run_start * frame_ms)
+        silence_end_ms = min(audio_length_ms, int(run_end * frame_ms))
+        if silence_end_ms - silence_start_ms < min_silence_ms:
+            continue
+        # 前後に話し声がある側だけ SILENCE_PADDING_MS を残す
+        cut_start_ms = silence_start_ms + (SILENCE_PADDING_MS if silence_start_ms > 0 else 0)
+        cut_end_ms = silence_end_ms - (SILENCE_PADDING_MS if silence_end_ms < audio_length_ms else 0)
+        if cut_end_ms <= cut_start_ms:
+            continue
+        if cut_start_ms > position_ms:
+            ranges.append((position_ms, cut_start_ms))
+        position_ms = cut_end_ms
+    if position_ms < audio_length_ms:
+        ranges.append((position_ms, audio_length_ms))
+    return ranges, threshold_dbfs
+
+def condense_audio(audio_data, ranges):
+    """残す区間だけをつなげた音声を返します（元の音声の生データから直接つなげる）"""
+    if len(ranges) == 1 and ranges[0] == (0, len(audio_data)):
+        return audio_data
+    frame_width = audio_data.sample_width * audio_data.channels
+    with memoryview(audio_data.raw_data) as raw:
+        data = b"".join(
+            raw[start_ms * audio_data.frame_rate // 1000 * frame_width:end_ms * audio_data.frame_rate // 1000 * frame_width]
+            for start_ms, end_ms in ranges
+        )
+    return type(audio_data)(
+        data=data, sample_width=audio_data.sample_width, frame_rate=audio_data.frame_rate, channels=audio_data.channels
+    )
+
+def skip_silence(audio_data, min_silence_ms, threshold_dbfs=None):
+    """長い無音を取り除いた音声と TimelineMap を返し、スキップした長さを表示します
+
+    Returns:
+        (無音を取り除いた音声, TimelineMap, 所要時間（秒）)
+    """
+    started_at = time.time()
+    ranges, threshold_dbfs = detect_speech_ranges(audio_data, min_silence_ms, threshold_dbfs)
+    if not ranges:
+        # すべて無音の場合も、文字起こしできるよう先頭の min_silence_ms だけは残す
+        ranges = [(0, min(len(audio_data), min_silence_ms))]
+    condensed = condense_audio(audio_data, ranges)
+    timeline = TimelineMap(ranges)
+    elapsed = time.time() - started_at
+
+    original_ms = len(audio_data)
+    skipped_ms = original_ms - timeline.condensed_ms
+    removed = len(ranges) - 1 + (ranges[0][0] > 0) + (ranges[-1][1] < original_ms)
+    if skipped_ms > 0:
+        print(f"無音をスキップしました: {format_timestamp(skipped_ms)}（{skipped_ms / original_ms * 100:.1f}%、{removed}箇所、"
+              f"閾値 {threshold_dbfs:.1f}dBFS）→ 送信する音声の長さ {format_timestamp(timeline.condensed_ms)}（{elapsed:.1f}秒）")
+    else:
+        print(f"{min_silence_ms / 1000:.0f}秒以上の無音はありませんでした（閾値 {threshold_dbfs:.1f}dBFS、{elapsed:.1f}秒）")
+    return condensed, timeline, elapsed
@@ -0,0 +1,374 @@
+"""Gemini APIを模したローカルHTTPスタブサーバー
+
+ネットワークに接続せず、APIクォータも消費せずに文字起こしパイプライン全体の
+スループット計測や回帰テストを行うためのサーバーです。
+backends.StubBackend から接続します。
+
+エンドポイント:
+    POST /upload    音声ファイル本体を受け取り {"name", "size_bytes"} を返す
+    POST /generate  {"model", "prompt", "files"} を受け取り {"text"} を返す
+    GET  /files/<id>     アップロード済みファイルの情報を返す
+    DELETE /files/<id>   アップロード済みファイルを削除する
+    GET  /stats     リクエスト数やエラー数などの統計を返す
+
+使用例:
+    python stub_server.py --port 8765 --latency 2.0 --error-rate 0.05 --rate-limit-rate 0.1
+    python transcribe.py input.mp3 --backend stub
+"""
+import io
+import json
+import time
+import uuid
+import wave
+import random
+import argparse
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# 読み捨てるアップロード本体のうち、ヘッダー解析用に保持するバイト数
+HEADER_BYTES = 64 * 1024
+
+class StubConfig:
+    """スタブサーバーの挙動の設定"""
+
+    def __init__(self, latency=1.0, latency_jitter=0.0, upload_latency_per_mb=0.0,
+                 error_rate=0.0, rate_limit_rate=0.0, rpm_limit=0, retry_after=5,
+                 chars_per_second=3.0, response_chars=3000, file_ttl=48 * 60 * 60, seed=None):
+        self.latency = latency  # /generate の平均応答時間（秒）
+        self.latency_jitter = latency_jitter  # 応答時間のばらつき（秒、一様分布）
+        self.upload_latency_per_mb = upload_latency_per_mb  # アップロード1MBあたりの追加遅延（秒）
+        self.error_rate = error_rate  # HTTP 500 を返す確率
+        self.rate_limit_rate = rate_limit_rate  # HTTP 429 を返す確率
+        self.rpm_limit = rpm_limit  # 1分あたりのリクエスト上限（0で無制限）。超過時は429
+        self.retry_after = retry_after  # 429 応答の Retry-After ヘッダー（秒）
+        self.chars_per_second = chars_per_second  # 音声1秒あたりに返す文字数
+        self.response_chars = response_chars  # 音声の長さが分からない場合に返す文字数
+        self.file_ttl = file_ttl  # アップロードしたファイルの有効期間（秒）
+        self.random = random.Random(seed)
+
+class StubState:
+    """アップロード済みファイルと統計（スレッドセーフ）"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.files = {}  # name -> {"size_bytes", "mime_type", "duration_sec", "expires_at"}
+        self.request_times = []
+        self.stats = {
+            "uploads": 0,
+            "upload_bytes": 0,
+            "deletes": 0,
+            "files_stored": 0,
+            "generates": 0,
+            "rate_limited": 0,
+            "errors": 0,
+            "connections": 0,
+        }
+
+    def count(self, key, amount=1):
+        with self.lock:
+            self.stats[key] += amount
+
+    def get_file(self, name):
+        """有効期限内のファイルの情報を返します。無ければNoneを返します"""
+        with self.lock:
+            info = self.files.get(name)
+            if info is not None and info["expires_at"] <= time.time():
+                del self.files[name]
+                self.stats["files_stored"] = len(self.files)
+                info = None
+            return info
+
+    def over_rpm_limit(self, rpm_limit):
+        """直近60秒のリクエスト数が上限を超えていればTrueを返します"""
+        if rpm_limit <= 0:
+            return False
+        now = time.monotonic()
+        with self.lock:
+            self.request_times = [t for t in self.request_times if now - t < 60]
+            if len(self.request_times) >= rpm_limit:
+                return True
+            self.request_times.append(now)
+            return False
+
+def audio_duration_seconds(header):
+    """WAV/FLACのヘッダーから音声の長さ（秒）を求めます。分からなければNoneを返します"""
+    if header[:4] == b"fLaC" and len(header) >= 42:
+        # STREAMINFO: サンプルレート20bit、チャンネル数3bit、ビット深度5bit、総サンプル数36bit
+        info = int.from_bytes(header[18:26], "big")
+        sample_rate = info >> 44
+        total_samples = info & ((1 << 36) - 1)
+        return total_samples / float(sample_rate) if sample_rate and total_samples else None
+    try:
+        with wave.open(io.BytesIO(header)) as wav:
+            return wav.getnframes() / float(wav.getframerate())
+    except Exception:
+        return None
+
+def build_transcript(duration_sec, config, with_timestamps):
+    """ダミーの文字起こし結果を作成します"""
+    if duration_sec:
+        target_chars = int(duration_sec * config.chars_per_second)
+    else:
+        target_chars = config.response_chars
+
+    lines = []
+    total = 0
+    line_no = 0
+    while total < target_chars:
+        sentence = f"これはスタブサーバーが返すダミーの文字起こし結果です（{line_no + 1}文目）。"
+        if with_timestamps:
+            # 1行あたりの文字数から音声上の位置を概算する
+            position = int(total / config.chars_per_second) if config.chars_per_second else 0
+            sentence = f"[{position // 60:02d}:{position % 60:02d}] {sentence}"
+        lines.append(sentence)
+        total += len(sentence)
+        line_no += 1
+    return "\n".join(lines)
+
+def build_minutes():
+    """ダミーの議事録を作成します"""
+    return (
+        "# 議事録\n\n"
+        "## 1. 会議情報\n- 日時: 情報なし\n- 場所: 情報なし\n- 参加者: 情報なし\n- 議題: スタブ\n\n"
+        "## 2. 議事内容\n### 2.1. 議題1: スタブ\n- 背景・目的: 負荷試験\n- 主要論点: なし\n"
+        "- 決定事項: なし\n- 課題/次のステップ: なし\n\n"
+        "## 3. アクションアイテム\n- 担当者: 情報なし\n- 内容: 情報なし\n- 期限: 情報なし\n\n"
+        "## 4. 次回会議\n- 日時: 情報なし\n- 場所: 情報なし\n- 予定議題: 情報なし\n\n"
+        "## 5. その他・備考\nスタブサーバーが生成した議事録です。\n"
+    )
+
+class StubRequestHandler(BaseHTTPRequestHandler):
+    """スタブサーバーのリクエストハンドラ"""
+
+    server_version = "TranscribeStub/1.0"
+    # Keep-Alive で接続を使い回せるようにする（応答には常に Content-Length を付ける）
+    protocol_version = "HTTP/1.1"
+
+    def setup(self):
+        super().setup()
+        self.server.state.count("connections")
+
+    def log_message(self, format, *args):
+        if self.server.verbose:
+            super().log_message(format, *args)
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_body(self, keep_bytes=None):
+        """リクエスト本体を読み込みます。keep_bytes を指定した場合は先頭のみ保持して残りは読み捨てます"""
+        length = int(self.headers.get("Content-Length", 0))
+        if keep_bytes is None:
+            return self.rfile.read(length), length
+
+        kept = bytearray()
+        remaining = length
+        while remaining > 0:
+            chunk = self.rfile.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            if len(kept) < keep_bytes:
+                kept.extend(chunk[:keep_bytes - len(kept)])
+        return bytes(kept), length
+
+    def _inject_failure(self):
+        """設定に従って429または500を返します。返した場合はTrue"""
+        config = self.server.config
+        state = self.server.state
+
+        if state.over_rpm_limit(config.rpm_limit) or config.random.random() < config.rate_limit_rate:
+            state.count("rate_limited")
+            self._send_json(429, {"error": "RESOURCE_EXHAUSTED: quota exceeded (stub)"},
+                            {"Retry-After": str(config.retry_after)})
+            return True
+
+        if config.random.random() < config.error_rate:
+            state.count("errors")
+            self._send_json(500, {"error": "INTERNAL: injected error (stub)"})
+            return True
+
+        return False
+
+    def do_GET(self):
+        if self.path == "/stats":
+            with self.server.state.lock:
+                stats = dict(self.server.state.stats)
+            self._send_json(200, stats)
+        elif self.path.startswith("/files/"):
+            name = self.path[1:]
+            info = self.server.state.get_file(name)
+            if info is None:
+                self._send_json(404, {"error": f"file not found: {name}"})
+            else:
+                self._send_json(200, dict(info, name=name))
+        else:
+            self._send_json(404, {"error": f"not found: {self.path}"})
+
+    def do_DELETE(self):
+        if self.path.startswith("/files/"):
+            name = self.path[1:]
+            state = self.server.state
+            with state.lock:
+                info = state.files.pop(name, None)
+                if info is not None:
+                    state.stats["deletes"] += 1
+                    state.stats["files_stored"] = len(state.files)
+            if info is None:
+                self._send_json(404, {"error": f"file not found: {name}"})
+            else:
+                self._send_json(200, {})
+        else:
+            self._send_json(404, {"error": f"not found: {self.path}"})
+
+    def do_POST(self):
+        if self.path == "/upload":
+            self._handle_upload()
+        elif self.path == "/generate":
+            self._handle_generate()
+        else:
+            # 接続を使い回せるよう、本体を読み捨ててから応答する
+            self._read_body(keep_bytes=0)
+            self._send_json(404, {"error": f"not found: {self.path}"})
+
+    def _handle_upload(self):
+        config = self.server.config
+        state = self.server.state
+        header, size_bytes = self._read_body(keep_bytes=HEADER_BYTES)
+
+        if config.upload_latency_per_mb:
+            time.sleep(config.upload_latency_per_mb * size_bytes / (1024 * 1024))
+
+        if self._inject_failure():
+            return
+
+        name = f"files/{uuid.uuid4().hex}"
+        expires_at = time.time() + config.file_ttl
+        with state.lock:
+            state.files[name] = {
+                "size_bytes": size_bytes,
+                "mime_type": self.headers.get("Content-Type"),
+                "duration_sec": audio_duration_seconds(header),
+                "expires_at": expires_at,
+            }
+            state.stats["uploads"] += 1
+            state.stats["upload_bytes"] += size_bytes
+            state.stats["files_stored"] = len(state.files)
+
+        self._send_json(200, {"name": name, "size_bytes": size_bytes, "expires_at": expires_at})
+
+    def _handle_generate(self):
+        config = self.server.config
+        state = self.server.state
+        body, _ = self._read_body()
+
+        try:
+            request = json.loads(body.decode("utf-8"))
+        except ValueError:
+            self._send_json(400, {"error": "invalid JSON"})
+            return
+
+        latency = config.latency + config.random.uniform(0, config.latency_jitter)
+        if latency > 0:
+            time.sleep(latency)
+
+        if self._inject_failure():
+            return
+
+        prompt = request.get("prompt", "")
+        files = request.get("files", [])
+        file_info = [state.get_file(name) for name in files]
+        missing = [name for name, info in zip(files, file_info) if info is None]
+        if missing:
+            self._send_json(400, {"error": f"file not found: {', '.join(missing)}"})
+            return
+
+        if file_info:
+            durations = [info["duration_sec"] for info in file_info]
+            duration_sec = sum(durations) if all(durations) else None
+            text = build_transcript(duration_sec, config, with_timestamps="[MM:SS]" in prompt)
+        else:
+            text = build_minutes()
+
+        state.count("generates")
+        self._send_json(200, {"text": text})
+
+class StubServer(ThreadingHTTPServer):
+    """設定と状態を保持するスタブサーバー"""
+
+    daemon_threads = True
+
+    def __init__(self, address, config=None, verbose=False):
+        super().__init__(address, StubRequestHandler)
+        self.config = config or StubConfig()
+        self.state = StubState()
+        self.verbose = verbose
+
+    @property
+    def url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+def start_stub_server(host="127.0.0.1", port=0, config=None, verbose=False):
+    """スタブサーバーをバックグラウンドスレッドで起動します（port=0で空きポートを使用）
+
+    Returns:
+        起動したStubServer。終了時は shutdown() と server_close() を呼び出してください
+    """
+    server = StubServer((host, port), config, verbose)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server
+
+def main():
+    parser = argparse.ArgumentParser(description="Gemini APIを模したローカルスタブサーバーを起動します")
+    parser.add_argument("--host", default="127.0.0.1", help="待ち受けるホスト")
+    parser.add_argument("--port", type=int, default=8765, help="待ち受けるポート")
+    parser.add_argument("--latency", type=float, default=1.0, help="生成リクエストの応答時間（秒）")
+    parser.add_argument("--latency-jitter", type=float, default=0.0, help="応答時間のばらつき（秒）")
+    parser.add_argument("--upload-latency-per-mb", type=float, default=0.0,
+                      help="アップロード1MBあたりの追加遅延（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="HTTP 500 を返す確率（0〜1）")
+    parser.add_argument("--rate-limit-rate", type=float, default=0.0, help="HTTP 429 を返す確率（0〜1）")
+    parser.add_argument("--rpm-limit", type=int, default=0, help="1分あたりのリクエスト上限（0で無制限）")
+    parser.add_argument("--retry-after", type=int, default=5, help="429 応答の Retry-After（秒）")
+    parser.add_argument("--chars-per-second", type=float, default=3.0, help="音声1秒あたりに返す文字数")
+    parser.add_argument("--file-ttl", type=float, default=48 * 60 * 60,
+                      help="アップロードしたファイルの有効期間（秒）")
+    parser.add_argument("--seed", type=int, help="エラー注入の乱数シード")
+    parser.add_argument("-v", "--verbose", action="store_true", help="リクエストログを表示する")
+
+    args = parser.parse_args()
+
+    config = StubConfig(
+        latency=args.latency,
+        latency_jitter=args.latency_jitter,
+        upload_latency_per_mb=args.upload_latency_per_mb,
+        error_rate=args.error_rate,
+        rate_limit_rate=args.rate_limit_rate,
+        rpm_limit=args.rpm_limit,
+        retry_after=args.retry_after,
+        chars_per_second=args.chars_per_second,
+        file_ttl=args.file_ttl,
+        seed=args.seed,
+    )
+    server = StubServer((args.host, args.port), config, args.verbose)
+    print(f"スタブサーバーを起動しました: {server.url}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        with server.state.lock:
+            print(f"統計: {json.dumps(server.state.stats, ensure_ascii=False)}")
+
+if __name__ == "__main__":
+    main()
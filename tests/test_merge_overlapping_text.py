@@ -0,0 +1,55 @@
+import unittest
+
+from transcribe import merge_overlapping_text
+
+
+class MergeOverlappingTextTest(unittest.TestCase):
+    def test_exact_overlap(self):
+        # 重複部分が文の切れ目で始まり、前のセグメントの末尾まで一致する
+        self.assertEqual(
+            merge_overlapping_text("今日は晴れです。明日の予定を確認します。", "明日の予定を確認します。午後は会議です。", 60),
+            ("今日は晴れです。明日の予定を確認します。", "午後は会議です。"),
+        )
+
+    def test_partial_overlap_at_segment_boundary(self):
+        # 前のセグメントの末尾は分割位置で途切れ、次のセグメントの先頭は単語の途中から始まる
+        expected = ("会議を始めます。まず売上の報告です。", "前年より増えました。次に費用です。")
+        self.assertEqual(
+            merge_overlapping_text("会議を始めます。まず売上の報告です。前年より増えまし", "売上の報告です。前年より増えました。次に費用です。", 60),
+            expected,
+        )
+        self.assertEqual(
+            merge_overlapping_text("会議を始めます。まず売上の報告です。前年より増えまし", "り上げの報告です。前年より増えました。次に費用です。", 60),
+            expected,
+        )
+
+    def test_overlap_without_sentence_end_cuts_before_match(self):
+        # 文末の句読点が無ければ、前のセグメントを一致部分の直前で切る
+        self.assertEqual(
+            merge_overlapping_text("We start the meeting. The sales report is next and it gre", "sales report is next and it grew this year. Costs follow.", 60),
+            ("We start the meeting. The", "sales report is next and it grew this year. Costs follow."),
+        )
+
+    def test_repetitive_text_does_not_split_brackets(self):
+        text = "これはテスト音声の文字起こし結果です（1文目）。これはテスト音声の文字起こし結果です（2文目）。"
+        self.assertEqual(merge_overlapping_text(text, text, 60), (text, ""))
+        # 一致部分の直後が開き括弧の場合は、括弧の前で切らずに一致部分の直前でつなぐ
+        self.assertEqual(
+            merge_overlapping_text(text, "これはテスト音声の文字起こし結果です（3文目）。", 60),
+            ("これはテスト音声の文字起こし結果です（1文目）。", "これはテスト音声の文字起こし結果です（3文目）。"),
+        )
+        self.assertEqual(
+            merge_overlapping_text("はい。はい。はい。そうですね。はい。はい。", "はい。はい。そうですね。はい。はい。次の議題です。", 60),
+            ("はい。はい。はい。そうですね。はい。はい。", "次の議題です。"),
+        )
+
+    def test_no_match(self):
+        self.assertEqual(
+            merge_overlapping_text("会議を始めます。", "全く関係のない内容です。", 60),
+            ("会議を始めます。", "全く関係のない内容です。"),
+        )
+        self.assertEqual(merge_overlapping_text("", "次の議題です。", 60), ("", "次の議題です。"))
+
+
+if __name__ == "__main__":
+    unittest.main()
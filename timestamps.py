@@ -0,0 +1,132 @@
+"""文字起こし結果のタイムスタンプの処理
+
+セグメントごとの文字起こしは、そのセグメントの先頭を [00:00] とした相対時刻のタイムスタンプで
+返ってきます。ここではそれを音声全体の時刻に付け替え（rebase_timestamps）、タイムスタンプごとに
+区切った区間のリスト（(開始ミリ秒, 終了ミリ秒, テキスト) のタプル）に変換して、
+SRT・WebVTT・JSON 形式で出力します。
+"""
+import re
+import json
+
+# [MM:SS] または [HH:MM:SS] 形式のタイムスタンプ
+TIMESTAMP_PATTERN = re.compile(r"\[(?:(\d{1,2}):)?(\d{1,2}):(\d{2})\]")
+
+# 文字起こし結果の出力形式（text は従来どおりのテキスト）
+OUTPUT_FORMATS = ("text", "srt", "vtt", "json")
+
+# 出力形式ごとのファイルの拡張子
+OUTPUT_EXTENSIONS = {"text": ".txt", "srt": ".srt", "vtt": ".vtt", "json": ".json"}
+
+def format_timestamp(ms):
+    """ミリ秒をHH:MM:SS形式に変換します"""
+    total_seconds = ms // 1000
+    hours = total_seconds // 3600
+    minutes = (total_seconds % 3600) // 60
+    seconds = total_seconds % 60
+
+    if hours > 0:
+        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+    else:
+        return f"{minutes:02d}:{seconds:02d}"
+
+def timestamp_to_ms(match):
+    """TIMESTAMP_PATTERN の一致をミリ秒に変換します"""
+    hours, minutes, seconds = match.groups()
+    return ((int(hours or 0) * 60 + int(minutes)) * 60 + int(seconds)) * 1000
+
+def rebase_timestamps(text, offset_ms):
+    """テキスト中のすべてのタイムスタンプに offset_ms を加えます（1回の走査で置換）"""
+    if not offset_ms:
+        return text
+    return TIMESTAMP_PATTERN.sub(lambda m: f"[{format_timestamp(timestamp_to_ms(m) + offset_ms)}]", text)
+
+def _clean_cue_text(text):
+    # 空行は字幕の区切りと解釈されるため取り除く
+    return "\n".join(line.strip() for line in text.splitlines() if line.strip())
+
+def parse_timed_segments(text, start_ms=0, end_ms=None):
+    """タイムスタンプ付きのテキストを区間のリストに変換します
+
+    各タイムスタンプから次のタイムスタンプまで（最後は end_ms まで）を1つの区間とします。
+    タイムスタンプが無い場合はテキスト全体を start_ms から end_ms までの1つの区間とします。
+    区間の開始時刻は直前の区間より前にならず、end_ms を超えないように補正します。
+
+    Returns:
+        [(開始ミリ秒, 終了ミリ秒, テキスト), ...]
+    """
+    matches = list(TIMESTAMP_PATTERN.finditer(text))
+    if end_ms is None:
+        end_ms = max([start_ms] + [timestamp_to_ms(m) for m in matches])
+
+    cues = []
+    position = 0
+    cue_start = start_ms
+    for match in matches:
+        body = _clean_cue_text(text[position:match.start()])
+        marker_ms = min(max(timestamp_to_ms(match), cue_start), end_ms)
+        if body:
+            cues.append((cue_start, marker_ms, body))
+        cue_start = marker_ms
+        position = match.end()
+
+    body = _clean_cue_text(text[position:])
+    if body:
+        cues.append((cue_start, max(cue_start, end_ms), body))
+    return cues
+
+def build_timed_segments(chunks):
+    """iter_transcribe_audio の SegmentTranscript のリストから、音声全体の区間のリストを作成します
+
+    失敗したセグメントは除きます。セグメントの重なりで区間の時刻が前後した場合は、
+    前の区間の途中から始まる区間は前の区間をそこで打ち切り、前の区間より前から始まる区間は
+    前の区間の終了時刻から始めます。
+    """
+    cues = []
+    for chunk in chunks:
+        if chunk.error is not None or not chunk.text:
+            continue
+        for start, end, body in parse_timed_segments(chunk.text, chunk.start_ms, chunk.end_ms):
+            if cues:
+                previous_start, previous_end, previous_body = cues[-1]
+                if start < previous_start:
+                    start = previous_end
+                    end = max(start, end)
+                elif start < previous_end:
+                    cues[-1] = (previous_start, start, previous_body)
+            cues.append((start, end, body))
+    return cues
+
+def _format_cue_time(ms, separator):
+    hours, remainder = divmod(int(ms), 3600 * 1000)
+    minutes, remainder = divmod(remainder, 60 * 1000)
+    seconds, milliseconds = divmod(remainder, 1000)
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}{separator}{milliseconds:03d}"
+
+def to_srt(cues):
+    """区間のリストをSRT形式の文字列に変換します"""
+    blocks = []
+    for number, (start, end, body) in enumerate(cues, 1):
+        blocks.append(f"{number}\n{_format_cue_time(start, ',')} --> {_format_cue_time(end, ',')}\n{body}\n")
+    return "\n".join(blocks)
+
+def to_vtt(cues):
+    """区間のリストをWebVTT形式の文字列に変換します"""
+    blocks = ["WEBVTT\n"]
+    for start, end, body in cues:
+        blocks.append(f"{_format_cue_time(start, '.')} --> {_format_cue_time(end, '.')}\n{body}\n")
+    return "\n".join(blocks)
+
+def to_json(cues):
+    """区間のリストをJSON形式の文字列に変換します"""
+    segments = [{"start_ms": start, "end_ms": end, "text": body} for start, end, body in cues]
+    return json.dumps({"segments": segments}, ensure_ascii=False, indent=2) + "\n"
+
+def format_transcript(cues, output_format):
+    """区間のリストを output_format（srt / vtt / json）の文字列に変換します"""
+    if output_format == "srt":
+        return to_srt(cues)
+    if output_format == "vtt":
+        return to_vtt(cues)
+    if output_format == "json":
+        return to_json(cues)
+    raise ValueError(f"不明な出力形式です: {output_format}（利用可能: {', '.join(OUTPUT_FORMATS)}）")
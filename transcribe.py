@@ -2,17 +2,35 @@ import os
 import argparse
 import base64
 from pathlib import Path
-from dotenv import load_dotenv
-import google.generativeai as genai
-from pydub import AudioSegment
-import numpy as np
-import tempfile
-import math
 import time
 import sys
+import re
+import json
+import subprocess
+import threading
+import wave
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from backends import BACKENDS, DEFAULT_STUB_URL, create_backend, get_default_backend, load_environment
+from cache import ResultCache, make_cache_key, DEFAULT_CACHE_PATH, DEFAULT_CACHE_MAX_BYTES
+from job_state import JobState, get_job_state_path
+from uploads import DEFAULT_SPILL_BYTES, UploadBuffer, UploadManager, is_missing_file_error
+import events
+from events import emit
+from batch import DEFAULT_BATCH_WORKERS, collect_inputs, is_batch_spec, run_batch
+from ratelimit import get_rate_limiter, configure_rate_limiter, is_rate_limit_error, backoff_delay
+from metrics import MetricsCollector
+from silence import DEFAULT_SKIP_SILENCE_SECONDS, skip_silence, remap_timestamps
+from preprocess import PREPROCESS_STEPS, DEFAULT_SAMPLE_RATE, DEFAULT_TARGET_DBFS, parse_preprocess_steps, preprocess_audio
+from timestamps import (
+    TIMESTAMP_PATTERN, OUTPUT_FORMATS, OUTPUT_EXTENSIONS, format_timestamp, rebase_timestamps, build_timed_segments, format_transcript
+)
+
+# pydub・numpy・google.generativeai は読み込みに時間がかかるため、モジュールの先頭では
+# インポートせず、最初に必要になった時点で読み込みます（GUIのウィンドウや --help をすぐに表示するため）
 
 # FFmpegのパスを設定
 def setup_ffmpeg():
+    from pydub import AudioSegment
     try:
         # 実行ファイルのディレクトリを取得
         if getattr(sys, 'frozen', False):
@@ -41,20 +59,20 @@ def setup_ffmpeg():
         print(f"FFmpegのパス設定中にエラーが発生しました: {str(e)}")
         raise
 
-# FFmpegのパスを設定
-setup_ffmpeg()
-
-# 環境変数をロード
-load_dotenv()
+_ffmpeg_lock = threading.Lock()
+_ffmpeg_ready = False
 
-# Google API キーを設定
-api_key = os.getenv("GOOGLE_API_KEY")
-if not api_key:
-    print("警告: GOOGLE_API_KEY が設定されていません。GUIから設定してください。")
-
-# APIキーが存在する場合のみ設定
-if api_key:
-    genai.configure(api_key=api_key)
+def get_audio_segment_class():
+    """pydub の AudioSegment を返します
+    最初の呼び出しで pydub を読み込み、setup_ffmpeg でFFmpegのパスを設定します
+    """
+    global _ffmpeg_ready
+    with _ffmpeg_lock:
+        if not _ffmpeg_ready:
+            setup_ffmpeg()
+            _ffmpeg_ready = True
+    from pydub import AudioSegment
+    return AudioSegment
 
 # サポートされている音声フォーマット
 SUPPORTED_FORMATS = [
@@ -65,6 +83,48 @@ SUPPORTED_FORMATS = [
 # Geminiが処理できる最大音声長（分）
 MAX_AUDIO_DURATION_MINUTES = 25
 
+# 無音の位置で分割する際に、目標の分割位置より前を探索する範囲（秒）
+SILENCE_SEARCH_WINDOW_SECONDS = 60
+
+# 無音検出に使うエネルギー計算のフレーム長（ミリ秒）と、平滑化する長さ（ミリ秒）
+ENERGY_FRAME_MS = 20
+ENERGY_SMOOTHING_MS = 400
+
+# 重複部分の照合で一致とみなす最小の文字数（句読点・空白・タイムスタンプを除く）
+MIN_OVERLAP_MATCH_CHARS = 6
+
+# 重複部分の照合で、次のセグメントの先頭から読み飛ばせる文字数
+# （重複部分の先頭は単語の途中から始まり、正しく書き起こされないことがあるため）
+MAX_OVERLAP_HEAD_SKIP_CHARS = 8
+
+# 重複部分でつなぐ位置の、前のセグメント側に残す句読点（閉じ括弧と区切りの記号）と文末の句読点
+OVERLAP_TRAILING_PUNCTUATION = "。、．，！？!?,.)）」』】"
+SENTENCE_END_PUNCTUATION = "。．！？!?."
+
+# 重複部分の照合に使う、音声1秒あたりの最大文字数の目安
+OVERLAP_CHARS_PER_SECOND = 30
+
+# セグメントを並列に文字起こしする際のデフォルトの同時実行数
+DEFAULT_MAX_WORKERS = 3
+
+# アップロード時のエンコード設定
+# wav は従来どおり元のサンプルレート・チャンネル数の16-bit PCM、
+# flac/opus はFFmpegでモノラル・16kHz（channels / frame_rate）に変換してから圧縮します
+UPLOAD_PROFILES = {
+    "wav": {"format": "wav", "suffix": ".wav", "mime_type": "audio/wav", "channels": None, "frame_rate": None, "codec": None, "bitrate": None},
+    "flac": {"format": "flac", "suffix": ".flac", "mime_type": "audio/flac", "channels": 1, "frame_rate": 16000, "codec": "flac", "bitrate": None},
+    "opus": {"format": "ogg", "suffix": ".ogg", "mime_type": "audio/ogg", "channels": 1, "frame_rate": 16000, "codec": "libopus", "bitrate": "32k"},
+}
+DEFAULT_UPLOAD_PROFILE = "flac"
+
+# エンコード時にFFmpegとの間で一度に受け渡すサイズ（バイト）
+ENCODE_CHUNK_BYTES = 1024 * 1024
+
+# プロンプトのバージョン（キャッシュキーに含める）
+# 文字起こし・議事録のプロンプトを変更した場合は値を上げて古いキャッシュを使わないようにする
+PROMPT_VERSION = 2
+MINUTES_PROMPT_VERSION = 1
+
 # 議事録の雛形
 MINUTES_TEMPLATE = """
 # 議事録
@@ -96,8 +156,226 @@ MINUTES_TEMPLATE = """
 
 """
 
-def load_audio_file(file_path):
-    """音声ファイルを読み込む"""
+# 文字起こしがこの文字数を超える場合は、部分ごとに要点を抽出してから統合する
+# 2段階（map-reduce）の方式で議事録を生成する
+MINUTES_MAP_REDUCE_THRESHOLD_CHARS = 40000
+
+# 2段階の方式で1回の要点抽出に渡す文字起こしの文字数の目安
+MINUTES_CHUNK_CHARS = 15000
+
+class SegmentTranscriptionError(Exception):
+    """一部のセグメントの文字起こしに失敗したことを表す例外
+
+    完了したセグメントの結果は失われず、partial_transcription に
+    セグメント順で連結された状態で保持されます。
+    """
+
+    def __init__(self, message, partial_transcription, completed, failed):
+        super().__init__(message)
+        self.partial_transcription = partial_transcription
+        self.completed = completed  # {セグメント番号(0始まり): 文字起こし結果}
+        self.failed = failed  # {セグメント番号(0始まり): 例外}
+
+def get_ffmpeg_command(name="ffmpeg"):
+    """FFmpeg/FFprobeの実行ファイルのパスを返します
+    setup_ffmpeg で設定した同梱版が存在しない場合は PATH 上のコマンドを使用します
+    """
+    AudioSegment = get_audio_segment_class()
+    configured = AudioSegment.ffprobe if name == "ffprobe" else AudioSegment.converter
+    if configured and os.path.exists(configured):
+        return configured
+    return name
+
+def probe_audio_info(file_path):
+    """音声ファイルをデコードせずに長さ・サンプルレート・チャンネル数を取得します
+
+    Returns:
+        {"duration_ms", "frame_rate", "channels"} の辞書
+    """
+    try:
+        result = subprocess.run(
+            [get_ffmpeg_command("ffprobe"), "-v", "error", "-select_streams", "a:0",
+             "-show_entries", "format=duration:stream=sample_rate,channels",
+             "-of", "json", file_path],
+            capture_output=True, check=True
+        )
+        info = json.loads(result.stdout.decode("utf-8"))
+        stream = info["streams"][0]
+        return {
+            "duration_ms": int(float(info["format"]["duration"]) * 1000),
+            "frame_rate": int(stream["sample_rate"]),
+            "channels": int(stream["channels"]),
+        }
+    except FileNotFoundError:
+        # FFprobeが無い環境では ffmpeg -i の出力から読み取る
+        result = subprocess.run(
+            [get_ffmpeg_command("ffmpeg"), "-hide_banner", "-i", file_path],
+            capture_output=True
+        )
+        output = result.stderr.decode("utf-8", errors="replace")
+        duration = re.search(r"Duration: (\d+):(\d+):(\d+(?:\.\d+)?)", output)
+        stream = re.search(r"Audio: .*?(\d+) Hz, (mono|stereo|(\d+) channels)", output)
+        if not duration or not stream:
+            raise ValueError(f"音声ファイルの情報を取得できませんでした: {file_path}")
+        hours, minutes, seconds = duration.groups()
+        channels = {"mono": 1, "stereo": 2}.get(stream.group(2)) or int(stream.group(3))
+        return {
+            "duration_ms": int((int(hours) * 3600 + int(minutes) * 60 + float(seconds)) * 1000),
+            "frame_rate": int(stream.group(1)),
+            "channels": channels,
+        }
+
+class StreamingAudioSource:
+    """音声ファイル全体をデコードせず、必要な時間範囲だけをFFmpegで読み込む音声ソース
+
+    len() で長さ（ミリ秒）を返し、source[start_ms:end_ms] で StreamingSegment を返すため、
+    AudioSegment と同様に split_audio_segments や transcribe_audio に渡せます。
+    """
+
+    def __init__(self, file_path, duration_ms, frame_rate, channels):
+        self.file_path = file_path
+        self.duration_ms = duration_ms
+        self.frame_rate = frame_rate
+        self.channels = channels
+
+    def __len__(self):
+        return self.duration_ms
+
+    def __getitem__(self, key):
+        if not isinstance(key, slice):
+            raise TypeError("StreamingAudioSource はスライスのみ対応しています")
+        start_ms = max(0, key.start or 0)
+        end_ms = self.duration_ms if key.stop is None else min(key.stop, self.duration_ms)
+        return StreamingSegment(self, start_ms, end_ms)
+
+    def extract(self, start_ms, end_ms):
+        """指定した時間範囲だけをデコードしてAudioSegmentとして返します"""
+        command = [
+            get_ffmpeg_command("ffmpeg"), "-v", "error",
+            "-ss", f"{start_ms / 1000:.3f}", "-t", f"{(end_ms - start_ms) / 1000:.3f}",
+            "-i", self.file_path, "-vn",
+            "-f", "s16le", "-acodec", "pcm_s16le",
+            "-ar", str(self.frame_rate), "-ac", str(self.channels),
+            "pipe:1"
+        ]
+        # 出力サイズは長さから分かるため、バッファを一度だけ確保して直接読み込む
+        # （capture_output では読み込み後の連結でセグメント2つ分のメモリを使うため）
+        frame_width = 2 * self.channels
+        expected_bytes = int((end_ms - start_ms) / 1000 * self.frame_rate + self.frame_rate) * frame_width
+        buffer = bytearray(expected_bytes)
+        size = 0
+        
+        process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        with memoryview(buffer) as view:
+            while True:
+                if size == len(buffer):
+                    break
+                read = process.stdout.readinto(view[size:])
+                if not read:
+                    break
+                size += read
+        # 想定より長い出力が残っている場合は追加で読み込む
+        remaining = process.stdout.read()
+        stderr = process.stderr.read()
+        process.wait()
+        
+        if process.returncode != 0:
+            raise ValueError(
+                f"音声の切り出しに失敗しました ({format_timestamp(start_ms)} - {format_timestamp(end_ms)}): "
+                f"{stderr.decode('utf-8', errors='replace').strip()}"
+            )
+        
+        del buffer[size:]
+        buffer += remaining
+        del buffer[len(buffer) - len(buffer) % frame_width:]
+        AudioSegment = get_audio_segment_class()
+        return AudioSegment(
+            data=buffer, sample_width=2, frame_rate=self.frame_rate, channels=self.channels
+        )
+
+    def load(self):
+        """音声全体をデコードします"""
+        return self.extract(0, self.duration_ms)
+
+class StreamingSegment:
+    """StreamingAudioSource の一部の時間範囲
+    アップロード直前に load() を呼ぶまでデコードしません
+    """
+
+    def __init__(self, source, start_ms, end_ms):
+        self.source = source
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+
+    def __len__(self):
+        return self.end_ms - self.start_ms
+
+    def load(self):
+        return self.source.extract(self.start_ms, self.end_ms)
+
+class AudioSegmentView:
+    """メモリ上の音声（AudioSegment）の一部の時間範囲を、生データをコピーせずに参照するビュー
+
+    raw_data は元の音声の生データの memoryview を返し、AudioSegment と同じ属性（frame_rate、channels、
+    sample_width、frame_count、set_sample_width）を持つため、そのままキャッシュのキーの作成や
+    アップロード用のエンコードに使えます。分割したセグメントをすべて保持しても、メモリの使用量は
+    元の音声の分しか増えません。16-bit以外の音声の set_sample_width と load() では、その時点で
+    セグメントの分だけコピーした AudioSegment を作成します。
+    """
+
+    def __init__(self, source, start_ms, end_ms):
+        self.source = source
+        self.frame_rate = source.frame_rate
+        self.channels = source.channels
+        self.sample_width = source.sample_width
+        self.frame_width = source.frame_width
+        # 位置の計算は AudioSegment のスライスと同じ（音声の長さで切り詰め、ミリ秒からフレーム数へ切り捨て）。
+        # ただしスライスと違い、長さの丸めで末尾が足りない場合も無音で埋めない
+        length_ms = len(source)
+        self.start_frame = int(source.frame_count(ms=min(start_ms, length_ms)))
+        end_frame = min(int(source.frame_count(ms=min(end_ms, length_ms))), int(source.frame_count()))
+        self.end_frame = max(self.start_frame, end_frame)
+
+    @property
+    def raw_data(self):
+        with memoryview(self.source.raw_data) as data:
+            return data[self.start_frame * self.frame_width:self.end_frame * self.frame_width]
+
+    def frame_count(self, ms=None):
+        if ms is not None:
+            return ms * (self.frame_rate / 1000.0)
+        return float(self.end_frame - self.start_frame)
+
+    def __len__(self):
+        return round(1000 * (self.end_frame - self.start_frame) / self.frame_rate)
+
+    def set_sample_width(self, sample_width):
+        if sample_width == self.sample_width:
+            return self
+        return self.load().set_sample_width(sample_width)
+
+    def load(self):
+        """この範囲の生データをコピーした AudioSegment を返します"""
+        return type(self.source)(
+            data=bytes(self.raw_data), sample_width=self.sample_width, frame_rate=self.frame_rate, channels=self.channels
+        )
+
+def slice_audio(audio_data, start_ms, end_ms):
+    """音声の start_ms から end_ms までのセグメントを、生データをコピーせずに返します
+
+    StreamingAudioSource では StreamingSegment を、AudioSegment では AudioSegmentView を返します。
+    """
+    if isinstance(audio_data, StreamingAudioSource):
+        return audio_data[start_ms:end_ms]
+    return AudioSegmentView(audio_data, start_ms, end_ms)
+
+def load_audio_file(file_path, streaming=False, on_event=None):
+    """音声ファイルを読み込む
+
+    streaming=True の場合は長さなどの情報だけを取得し、音声本体は
+    セグメントごとに必要になった時点でデコードする StreamingAudioSource を返します。
+    on_event を指定した場合は、読み込みの所要時間を events.AudioLoaded として通知します。
+    """
     try:
         print(f"\n=== 音声ファイル読み込み開始 ===")
         print(f"1. 入力情報:")
@@ -138,13 +416,26 @@ def load_audio_file(file_path):
             print(error_msg)
             raise FileNotFoundError(error_msg)
         
+        started_at = time.time()
+        if streaming:
+            print(f"\n4. 音声ファイル情報の取得（ストリーミングモード）:")
+            info = probe_audio_info(file_path)
+            audio = StreamingAudioSource(file_path, info["duration_ms"], info["frame_rate"], info["channels"])
+            print(f"- 取得成功（音声本体はセグメントごとに読み込みます）")
+            print(f"- 音声の長さ: {len(audio)}ms")
+            print(f"- チャンネル数: {audio.channels}")
+            print(f"- サンプルレート: {audio.frame_rate}Hz")
+            emit(on_event, events.AudioLoaded(len(audio), os.path.getsize(file_path), time.time() - started_at, True))
+            return audio, file_ext
+        
         print(f"\n4. 音声ファイル読み込み:")
         print(f"- ファイルを読み込み中...")
-        audio = AudioSegment.from_file(file_path)
+        audio = get_audio_segment_class().from_file(file_path)
         print(f"- 読み込み成功")
         print(f"- 音声の長さ: {len(audio)}ms")
         print(f"- チャンネル数: {audio.channels}")
         print(f"- サンプルレート: {audio.frame_rate}Hz")
+        emit(on_event, events.AudioLoaded(len(audio), os.path.getsize(file_path), time.time() - started_at, False))
         
         return audio, file_ext
         
@@ -166,92 +457,322 @@ def get_audio_segment_duration_minutes(audio_segment):
     """音声セグメントの長さを分で返します"""
     return len(audio_segment) / (1000 * 60)  # ミリ秒から分に変換
 
-def split_audio_segments(audio_data, max_duration_minutes=MAX_AUDIO_DURATION_MINUTES):
-    """長い音声ファイルを指定された長さに分割します"""
+def audio_to_mono_array(segment):
+    """AudioSegment の生データをモノラルの float32 NumPy 配列に変換します"""
+    import numpy as np
+    dtypes = {1: np.int8, 2: np.int16, 4: np.int32}
+    samples = np.frombuffer(segment.raw_data, dtype=dtypes[segment.sample_width])
+    if segment.channels > 1:
+        samples = samples.reshape(-1, segment.channels).mean(axis=1, dtype=np.float32)
+    return samples.astype(np.float32, copy=False)
+
+def frame_rms(samples, frame_length):
+    """サンプル配列を frame_length サンプルごとのフレームに区切り、各フレームのRMSを返します
+    （末尾の端数のフレームは切り捨て）"""
+    import numpy as np
+    num_frames = len(samples) // frame_length
+    if num_frames == 0:
+        return np.zeros(0, dtype=np.float32)
+    frames = samples[:num_frames * frame_length].reshape(num_frames, frame_length)
+    return np.sqrt(np.einsum("ij,ij->i", frames, frames) / frame_length)
+
+def find_silence_cut(audio_data, target_ms, window_ms, min_ms=0):
+    """target_ms より前 window_ms の範囲で最も静かな位置（ミリ秒）を返します
+
+    フレームごとのRMSを ENERGY_SMOOTHING_MS で平滑化し、その最小の位置を選ぶため、
+    単語中の短い途切れではなく文の間などのまとまった無音で分割されます。
+    計算量は探索範囲のサンプル数に対して線形です。
+    """
+    import numpy as np
+    window_start_ms = max(min_ms, target_ms - window_ms)
+    if target_ms - window_start_ms < ENERGY_FRAME_MS:
+        return target_ms
+    
+    window = audio_data[window_start_ms:target_ms]
+    if isinstance(window, StreamingSegment):
+        window = window.load()
+    
+    samples = audio_to_mono_array(window)
+    frame_length = max(1, int(window.frame_rate * ENERGY_FRAME_MS / 1000))
+    frame_ms = frame_length * 1000 / window.frame_rate
+    rms = frame_rms(samples, frame_length)
+    if len(rms) == 0:
+        return target_ms
+    
+    # 累積和による移動平均（フレーム数に対して線形）
+    smoothing = max(1, min(len(rms), int(ENERGY_SMOOTHING_MS / frame_ms)))
+    cumulative = np.concatenate(([0.0], np.cumsum(rms, dtype=np.float64)))
+    smoothed = (cumulative[smoothing:] - cumulative[:-smoothing]) / smoothing
+    
+    quietest = int(np.argmin(smoothed)) + smoothing // 2
+    return window_start_ms + int(quietest * frame_ms + frame_ms / 2)
+
+def split_audio_segments(audio_data, max_duration_minutes=MAX_AUDIO_DURATION_MINUTES, align_to_silence=False, overlap_ms=0):
+    """長い音声ファイルを指定された長さに分割します
+
+    align_to_silence=True の場合は、各分割位置を最大長の手前 SILENCE_SEARCH_WINDOW_SECONDS 秒の
+    範囲で最も静かな位置に合わせ、単語の途中で切れにくくします（セグメントは最大長を超えません）。
+    overlap_ms を指定した場合は、2つ目以降のセグメントの開始位置を分割位置より overlap_ms だけ
+    前にずらし、隣り合うセグメントが重なるようにします（重複は結合時に取り除きます）。
+    """
     audio_length_ms = len(audio_data)
     segment_length_ms = int(max_duration_minutes * 60 * 1000)
+    window_ms = min(SILENCE_SEARCH_WINDOW_SECONDS * 1000, segment_length_ms // 2)
+    
+    # 分割位置を決める
+    overlap_ms = max(0, min(int(overlap_ms), segment_length_ms // 4))
+    boundaries = [0]
+    while True:
+        # 重なりの分だけ前から始まっても最大長を超えないように目標位置を決める
+        segment_start_ms = boundaries[-1] - (overlap_ms if len(boundaries) > 1 else 0)
+        if audio_length_ms - segment_start_ms <= segment_length_ms:
+            break
+        target_ms = segment_start_ms + segment_length_ms
+        if align_to_silence:
+            cut_ms = find_silence_cut(audio_data, target_ms, window_ms, min_ms=boundaries[-1] + 1000)
+            print(f"分割位置を無音部分に調整しました: {format_timestamp(target_ms)} → {format_timestamp(cut_ms)}")
+        else:
+            cut_ms = target_ms
+        boundaries.append(cut_ms)
+    boundaries.append(audio_length_ms)
     
-    # 分割数を計算
-    num_segments = math.ceil(audio_length_ms / segment_length_ms)
+    num_segments = len(boundaries) - 1
     
     # ログに音声全体の長さと分割数を出力
     print(f"音声全体の長さ: {format_timestamp(audio_length_ms)} ({audio_length_ms}ms)")
     print(f"分割数: {num_segments}、各セグメントの最大長: {max_duration_minutes}分 ({segment_length_ms}ms)")
+    if overlap_ms:
+        print(f"隣り合うセグメントを{overlap_ms / 1000:.1f}秒ずつ重ねて分割します")
     
     segments = []
     for i in range(num_segments):
-        start_ms = i * segment_length_ms
-        end_ms = min((i + 1) * segment_length_ms, audio_length_ms)
-        segment = audio_data[start_ms:end_ms]
+        start_ms = max(0, boundaries[i] - overlap_ms) if i > 0 else 0
+        end_ms = boundaries[i + 1]
+        segment = slice_audio(audio_data, start_ms, end_ms)
         segments.append((segment, start_ms, end_ms))
         print(f"セグメント {i+1} 作成: {format_timestamp(start_ms)} - {format_timestamp(end_ms)} (長さ: {format_timestamp(end_ms-start_ms)})")
     
     return segments
 
-def format_timestamp(ms):
-    """ミリ秒をHH:MM:SS形式に変換します"""
-    total_seconds = ms // 1000
-    hours = total_seconds // 3600
-    minutes = (total_seconds % 3600) // 60
-    seconds = total_seconds % 60
+def _set_flac_total_samples(output, total_samples):
+    """FLACのSTREAMINFOに総サンプル数を書き込みます
+
+    FFmpegは標準出力に書き出したFLACのヘッダーを書き換えられず、総サンプル数（音声の長さ）が
+    不明のままになるため、エンコード後にバッファ上で書き込みます。
+    """
+    header = output.read_at(0, 26)
+    if len(header) < 26 or header[:4] != b"fLaC" or header[4] & 0x7F != 0:
+        return
+    # サンプルレート(20bit)・チャンネル数(3bit)・ビット数(5bit)に続く36bitが総サンプル数
+    packed = int.from_bytes(header[18:26], "big")
+    mask = (1 << 36) - 1
+    packed = (packed & ~mask) | (total_samples & mask)
+    output.patch(18, packed.to_bytes(8, "big"))
+
+def encode_segment(segment, profile, output):
+    """16-bit PCMの音声セグメントを profile の形式にエンコードして output（UploadBuffer）に書き込みます
+
+    一時ファイルは使わず、FFmpegにはPCMを標準入力から渡し、エンコード結果を標準出力から受け取ります。
+    """
+    if profile["format"] == "wav" and profile["channels"] is None and profile["frame_rate"] is None:
+        with wave.open(output, "wb") as wav_file:
+            wav_file.setnchannels(segment.channels)
+            wav_file.setsampwidth(segment.sample_width)
+            wav_file.setframerate(segment.frame_rate)
+            wav_file.setnframes(int(segment.frame_count()))
+            wav_file.writeframesraw(segment.raw_data)
+        return
     
-    if hours > 0:
-        return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
-    else:
-        return f"{minutes:02d}:{seconds:02d}"
+    command = [
+        get_ffmpeg_command("ffmpeg"), "-v", "error",
+        "-f", "s16le", "-ar", str(segment.frame_rate), "-ac", str(segment.channels), "-i", "pipe:0",
+    ]
+    total_samples = int(segment.frame_count())
+    if profile["channels"] is not None:
+        command += ["-ac", str(profile["channels"])]
+    if profile["frame_rate"] is not None:
+        # 変換後のサンプル数を長さから決まる値にそろえる（FLACのヘッダーに書き込むため）
+        total_samples = round(total_samples * profile["frame_rate"] / segment.frame_rate)
+        command += ["-af", f"aresample={profile['frame_rate']},apad=whole_len={total_samples},atrim=end_sample={total_samples}"]
+    if profile["codec"]:
+        command += ["-acodec", profile["codec"]]
+    if profile["bitrate"]:
+        command += ["-b:a", profile["bitrate"]]
+    command += ["-f", profile["format"], "pipe:1"]
+    process = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    
+    # 標準入力への書き込みは別スレッドで行い、標準出力を読みながら渡す（パイプが詰まらないように）
+    def feed():
+        try:
+            with memoryview(segment.raw_data) as pcm:
+                for offset in range(0, len(pcm), ENCODE_CHUNK_BYTES):
+                    process.stdin.write(pcm[offset:offset + ENCODE_CHUNK_BYTES])
+        except OSError:
+            pass  # FFmpegが途中で終了した場合は、終了コードとエラー出力で報告する
+        finally:
+            try:
+                process.stdin.close()
+            except OSError:
+                pass
+    
+    writer = threading.Thread(target=feed, daemon=True)
+    writer.start()
+    for chunk in iter(lambda: process.stdout.read(ENCODE_CHUNK_BYTES), b""):
+        output.write(chunk)
+    stderr = process.stderr.read()
+    writer.join()
+    process.wait()
+    
+    if process.returncode != 0:
+        raise ValueError(
+            f"アップロード用のエンコードに失敗しました ({profile['format']}): {stderr.decode('utf-8', errors='replace').strip()}"
+        )
+    if profile["format"] == "flac":
+        _set_flac_total_samples(output, total_samples)
+
+def export_segment_for_upload(segment, upload_format=DEFAULT_UPLOAD_PROFILE, spill_bytes=DEFAULT_SPILL_BYTES):
+    """音声セグメントをアップロード用にエンコードして UploadBuffer に書き込みます
+
+    エンコード結果が spill_bytes 以下であればメモリ上に保持し、超えた場合は一時ファイルに書き出します。
+
+    Returns:
+        UploadBuffer（MIMEタイプを含む）。呼び出し側で close() してください
+    """
+    if upload_format not in UPLOAD_PROFILES:
+        raise ValueError(f"不明なアップロード形式です: {upload_format}（利用可能: {', '.join(UPLOAD_PROFILES)}）")
+    profile = UPLOAD_PROFILES[upload_format]
+    
+    # エンコード前のサイズは16-bit PCM（従来のWAVアップロードと同じ）で数える
+    segment = segment.set_sample_width(2)
+    pcm_bytes = len(segment.raw_data)
+    
+    buffer = UploadBuffer("segment" + profile["suffix"], profile["mime_type"], spill_bytes)
+    try:
+        encode_segment(segment, profile, buffer)
+    except Exception:
+        buffer.close()
+        raise
+    
+    encoded_bytes = buffer.size
+    print(f"アップロード用にエンコードしました ({upload_format}、{'一時ファイル' if buffer.spilled else 'メモリ上'}): "
+          f"{pcm_bytes:,} bytes → {encoded_bytes:,} bytes ({encoded_bytes / pcm_bytes * 100 if pcm_bytes else 0:.1f}%)")
+    return buffer
 
-def transcribe_audio_segment(segment, start_ms=0, model_name="gemini-2.0-flash", language="japanese", with_timestamps=False, max_retries=3):
-    """音声セグメントを文字起こしします"""
-    # APIキーが設定されているか確認
-    if not os.getenv("GOOGLE_API_KEY"):
-        raise ValueError("GOOGLE_API_KEY が設定されていません。")
+def transcribe_audio_segment(segment, start_ms=0, model_name="gemini-2.0-flash", language="japanese", with_timestamps=False, max_retries=3, backend=None, upload_format=DEFAULT_UPLOAD_PROFILE, cache=None, uploads=None, on_event=None, segment_index=None, preprocess=None, spill_bytes=DEFAULT_SPILL_BYTES):
+    """音声セグメントを文字起こしします
+
+    cache（ResultCache）を指定した場合は、同じ音声・設定の結果があればAPIを呼ばずに返します。
+    アップロードはセグメントごとに1回だけ行い、生成だけが失敗した場合は同じハンドルで再試行します。
+    uploads（UploadManager）を指定した場合はジョブ全体でハンドルを共有し、アップロードしたファイルの
+    削除は呼び出し側が cleanup() で行います。省略した場合はこの関数の終了時に削除します。
+    on_event を指定した場合は、アップロード・生成・再試行の進捗を events のイベントとして通知します
+    （segment_index はイベントに含めるセグメント番号）。
+    preprocess（PreprocessOptions）を指定した場合は、デコードしたセグメントに前処理を行ってから送信します。
+    エンコードした音声は spill_bytes を超えるまではメモリ上に保持し、一時ファイルを経由せずにアップロードします。
+    """
+    # バックエンドを設定（APIキーの確認を含む）
+    backend = backend or get_default_backend()
+    backend.configure()
+    
+    # ストリーミングモードの場合は、この時点で必要な時間範囲だけをデコード
+    decode_seconds = None
+    if isinstance(segment, (StreamingAudioSource, StreamingSegment)):
+        print(f"音声セグメントをデコード中... (セグメント開始位置: {format_timestamp(start_ms)}, 長さ: {format_timestamp(len(segment))})")
+        decode_started_at = time.time()
+        segment = segment.load()
+        decode_seconds = time.time() - decode_started_at
+    
+    # 前処理（モノラル化・サンプルレートの変換・音量の正規化）
+    if preprocess is not None and preprocess.enabled:
+        if isinstance(segment, AudioSegmentView):
+            segment = segment.load()
+        input_bytes = len(segment.raw_data)
+        segment, elapsed, gain_db = preprocess_audio(segment, preprocess, f"セグメント開始位置: {format_timestamp(start_ms)}")
+        emit(on_event, events.AudioPreprocessed(segment_index, start_ms, input_bytes, len(segment.raw_data), gain_db, elapsed))
+    
+    # 16-bit PCMに変換（キャッシュのキーとアップロード用のエンコードの両方で使う）
+    # 元の音声が16-bitであれば、AudioSegmentView は生データをコピーせずにそのまま使う
+    convert_started_at = time.time()
+    segment = segment.set_sample_width(2)
+    convert_seconds = time.time() - convert_started_at
     
-    # APIキーを設定
-    current_api_key = os.getenv("GOOGLE_API_KEY")
-    genai.configure(api_key=current_api_key)
+    # モデルにはセグメントの先頭からの相対時刻でタイムスタンプを付けてもらい、
+    # 音声全体の時刻への付け替えは結果を受け取ってから行う
+    def to_absolute(text):
+        return rebase_timestamps(text, start_ms) if with_timestamps else text
     
-    # 一時ファイルを作成して音声データを保存
-    with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as temp_file:
-        # 16-bit PCM WAVに変換して保存
-        segment = segment.set_sample_width(2)
-        segment.export(temp_file.name, format="wav")
-        temp_file_path = temp_file.name
+    # キャッシュを確認（キーは音声のPCMと、プロンプトに影響する設定から作成）
+    # プロンプトはセグメントの開始位置によらないため、同じ音声であれば位置が違っても結果を再利用できる
+    cache_key = None
+    if cache is not None:
+        cache_key = make_cache_key(
+            "segment", segment.raw_data, model_name, language.lower(), with_timestamps,
+            upload_format, PROMPT_VERSION
+        )
+        cached_text = cache.get(cache_key)
+        if cached_text is not None:
+            print(f"キャッシュから文字起こし結果を取得しました: {format_timestamp(start_ms)} ({len(cached_text)}文字)")
+            emit(on_event, events.SegmentCacheHit(segment_index, start_ms, len(cached_text)))
+            return to_absolute(cached_text)
+    
+    # 言語とタイムスタンプの有無に応じて指示を設定
+    if language.lower() == "english":
+        if with_timestamps:
+            prompt = "Transcribe this audio in English with timestamps. Add a timestamp at the beginning of each sentence or after a significant pause. Timestamps are the elapsed time from the beginning of this audio file, starting at [00:00]. Format timestamps as [MM:SS] or [HH:MM:SS] for longer audio. Please transcribe without omitting any words. Make sure to transcribe the ENTIRE audio file completely, from beginning to end."
+        else:
+            prompt = "Transcribe this audio in English. Please transcribe without omitting every word, word for word. Make sure to transcribe the ENTIRE audio file completely, from beginning to end."
+    else:  # デフォルトは日本語
+        if with_timestamps:
+            prompt = "この音声を日本語で文字起こししてください。各文の始まりや、意味のある間の後にタイムスタンプを追加してください。タイムスタンプはこの音声ファイルの先頭を[00:00]とした経過時間で、[MM:SS]または長い音声の場合は[HH:MM:SS]の形式で追加してください。全ての言葉を省略せず、一言一句漏らさず文字起こしして下さい。必ず音声ファイル全体を最初から最後まで完全に書き起こしてください。"
+        else:
+            prompt = "この音声を日本語で文字起こししてください。全ての言葉を省略せず、一言一句漏らさず文字起こしして下さい。必ず音声ファイル全体を最初から最後まで完全に書き起こしてください。"
+    
+    # アップロード用にエンコード（spill_bytes を超えた場合だけ一時ファイルに書き出す）
+    encode_started_at = time.time()
+    upload_buffer = export_segment_for_upload(segment, upload_format, spill_bytes)
+    encode_seconds = time.time() - encode_started_at
+    content_hash = upload_buffer.sha256()
+    upload_bytes = upload_buffer.size
+    emit(on_event, events.SegmentPrepared(
+        segment_index, start_ms, decode_seconds, convert_seconds, encode_seconds, len(segment.raw_data), upload_bytes,
+        upload_buffer.spilled
+    ))
+    
+    # API呼び出しはプロセス全体で共有するレート制限を経由する（クォータ超過時の待機と再試行を含む）
+    limiter = get_rate_limiter()
+    owns_uploads = uploads is None
+    if owns_uploads:
+        uploads = UploadManager(backend, limiter)
     
     retries = 0
     last_error = None
+    uploaded_file = None
     
     try:
         while retries <= max_retries:
             try:
-                # File APIを使ってファイルをアップロード
-                print(f"音声セグメントをアップロード中... (セグメント開始位置: {format_timestamp(start_ms)})")
-                uploaded_file = genai.upload_file(temp_file_path)
-                
-                # Geminiモデルを設定
-                model = genai.GenerativeModel(model_name)
-                
-                # 言語とタイムスタンプの有無に応じて指示を設定
-                offset_info = f"このセグメントは全体の {format_timestamp(start_ms)} から始まります。" if start_ms > 0 else ""
-                
-                if language.lower() == "english":
-                    if with_timestamps:
-                        prompt = f"Transcribe this audio in English with timestamps. Add a timestamp at the beginning of each sentence or after a significant pause. Format timestamps as [MM:SS] or [HH:MM:SS] for longer audio. Please transcribe without omitting any words. Make sure to transcribe the ENTIRE audio file completely, from beginning to end. {offset_info if offset_info else ''}"
-                    else:
-                        prompt = f"Transcribe this audio in English. Please transcribe without omitting every word, word for word. Make sure to transcribe the ENTIRE audio file completely, from beginning to end. {offset_info if offset_info else ''}"
-                else:  # デフォルトは日本語
-                    if with_timestamps:
-                        prompt = f"この音声を日本語で文字起こししてください。各文の始まりや、意味のある間の後にタイムスタンプを追加してください。タイムスタンプは[MM:SS]または長い音声の場合は[HH:MM:SS]の形式で追加してください。全ての言葉を省略せず、一言一句漏らさず文字起こしして下さい。必ず音声ファイル全体を最初から最後まで完全に書き起こしてください。{offset_info if offset_info else ''}"
-                    else:
-                        prompt = f"この音声を日本語で文字起こししてください。全ての言葉を省略せず、一言一句漏らさず文字起こしして下さい。必ず音声ファイル全体を最初から最後まで完全に書き起こしてください。{offset_info if offset_info else ''}"
+                # File APIを使ってファイルをアップロード（アップロード済みのハンドルがあれば再利用）
+                if uploaded_file is None:
+                    reused = uploads.has_handle(content_hash)
+                    if not reused:
+                        print(f"音声セグメントをアップロード中... (セグメント開始位置: {format_timestamp(start_ms)})")
+                        emit(on_event, events.UploadStarted(segment_index, start_ms, upload_bytes))
+                    upload_started_at = time.time()
+                    uploaded_file = uploads.upload(upload_buffer, mime_type=upload_buffer.mime_type, content_hash=content_hash)
+                    emit(on_event, events.UploadFinished(
+                        segment_index, start_ms, upload_bytes, time.time() - upload_started_at, reused
+                    ))
                 
                 # 音声ファイルのアップロード結果を使ってコンテンツを生成
                 print(f"文字起こし処理中... セグメント開始位置: {format_timestamp(start_ms)} (試行: {retries+1}/{max_retries+1})")
-                response = model.generate_content([
+                generate_started_at = time.time()
+                result_text = limiter.call(backend.generate_content, model_name, [
                     prompt,
                     uploaded_file
                 ])
-                
-                result_text = response.text
+                emit(on_event, events.GenerateFinished(
+                    segment_index, start_ms, retries + 1, len(result_text), time.time() - generate_started_at
+                ))
                 
                 # 結果が短すぎる場合は警告を表示
                 segment_length_sec = len(segment) / 1000
@@ -260,47 +781,217 @@ def transcribe_audio_segment(segment, start_ms=0, model_name="gemini-2.0-flash",
                 if len(result_text) < expected_min_chars and retries < max_retries:
                     print(f"警告: 文字起こし結果が予想よりも短いです（{len(result_text)}文字、予想: {int(expected_min_chars)}文字以上）。再試行します...")
                     retries += 1
+                    emit(on_event, events.SegmentRetry(segment_index, start_ms, retries + 1, 0.0, "文字起こし結果が短すぎます"))
                     continue
                 
                 print(f"文字起こし完了: {format_timestamp(start_ms)} から {len(result_text)} 文字を取得しました")
-                return result_text
+                if cache is not None:
+                    cache.put(cache_key, result_text, kind="segment")
+                return to_absolute(result_text)
                 
             except Exception as e:
                 last_error = e
                 print(f"エラーが発生しました (試行 {retries+1}/{max_retries+1}): {str(e)}")
                 
+                # アップロード済みのファイルが期限切れなどで使えない場合だけアップロードし直す
+                if uploaded_file is not None and is_missing_file_error(e):
+                    print("アップロード済みのファイルが使用できないため、再試行時にアップロードし直します")
+                    uploads.invalidate(content_hash)
+                    uploaded_file = None
+                
+                # クォータ超過はレート制限側で待機・再試行済みのため、ここでは再試行しない
+                if is_rate_limit_error(e):
+                    raise Exception(f"クォータ超過が続いたため処理を中止しました。最後のエラー: {str(last_error)}")
+                
                 if retries < max_retries:
+                    delay = backoff_delay(retries)  # ジッター付きの指数バックオフ
                     retries += 1
-                    print(f"{retries}秒後に再試行します...")
-                    time.sleep(retries)  # 指数バックオフ
+                    print(f"{delay:.1f}秒後に再試行します...")
+                    emit(on_event, events.SegmentRetry(segment_index, start_ms, retries + 1, delay, str(e)))
+                    time.sleep(delay)
                 else:
                     raise Exception(f"最大再試行回数に達しました。最後のエラー: {str(last_error)}")
     
     finally:
-        # 一時ファイルを削除
-        try:
-            os.unlink(temp_file_path)
-        except:
-            pass
+        # エンコードした音声（メモリ・一時ファイル）を解放
+        upload_buffer.close()
+        # このセグメントのためにアップロードしたファイルをリモートから削除
+        if owns_uploads:
+            uploads.cleanup()
+
+def split_transcription_for_minutes(transcription, max_chars=MINUTES_CHUNK_CHARS):
+    """議事録の要点抽出のために、文字起こしを max_chars 文字程度の部分に分割します
+
+    段落（空行）の区切りで分割し、1つの段落が長すぎる場合は行、それでも長い場合は文字数で分割します。
+    """
+    pieces = []
+    for paragraph in transcription.split("\n\n"):
+        if len(paragraph) <= max_chars:
+            pieces.append(paragraph)
+            continue
+        for line in paragraph.split("\n"):
+            pieces.extend(line[i:i + max_chars] for i in range(0, max(len(line), 1), max_chars))
+    
+    chunks = []
+    current = ""
+    for piece in pieces:
+        if not piece.strip():
+            continue
+        if current and len(current) + 2 + len(piece) > max_chars:
+            chunks.append(current)
+            current = piece
+        else:
+            current = current + "\n\n" + piece if current else piece
+    if current:
+        chunks.append(current)
+    return chunks
 
-def generate_minutes(transcription, model_name="gemini-2.0-flash"):
-    """文字起こしから議事録を生成します"""
-    # APIキーが設定されているか確認
-    if not os.getenv("GOOGLE_API_KEY"):
-        raise ValueError("GOOGLE_API_KEY が設定されていません。")
+def extract_partial_minutes(text, index, total, model_name="gemini-2.0-flash", backend=None, cache=None, on_event=None):
+    """文字起こしの一部から議事録の材料となる要点（話題・決定事項・アクションアイテムなど）を抽出します
+    
+    index, total は部分の番号（0始まり）と部分の数で、プロンプトに含めます。
+    完了すると MinutesPartialFinished イベントを通知します。失敗した場合は例外を送出します。
+    """
+    backend = backend or get_default_backend()
+    started_at = time.time()
+    
+    def finished(partial, cached):
+        emit(on_event, events.MinutesPartialFinished(index, total, len(partial), time.time() - started_at, cached))
+        print(f"議事録の要点を抽出しました: {index + 1}/{total}（{len(partial)}文字）")
+        return partial
     
-    # APIキーを設定
-    current_api_key = os.getenv("GOOGLE_API_KEY")
-    genai.configure(api_key=current_api_key)
+    cache_key = None
+    if cache is not None:
+        cache_key = make_cache_key("minutes_partial", text, index, total, model_name, MINUTES_PROMPT_VERSION)
+        cached_partial = cache.get(cache_key)
+        if cached_partial is not None:
+            return finished(cached_partial, True)
+    
+    prompt = f"""
+以下は会議の文字起こしの一部（全{total}部分のうち{index + 1}番目）です。
+この部分から議事録の材料となる要点を抽出し、マークダウン形式の箇条書きで出力してください。
+
+文字起こし:
+```
+{text}
+```
+
+以下の見出しごとに記入してください（該当する内容がない見出しは「なし」と記入）：
+
+## 会議情報
+- 日時・場所・参加者など、この部分から分かる情報
+
+## 話題
+- 議論された話題ごとに、背景・目的と主要論点
+
+## 決定事項
+- 決定された内容
+
+## アクションアイテム
+- 担当者・内容・期限（分かる範囲で）
+
+## 次回会議・その他
+- 次回会議についての言及や、その他の重要事項
+
+文字起こしにない内容は推測で補わず、固有名詞や数値は文字起こしのとおりに記載してください。
+"""
+    partial = get_rate_limiter().call(backend.generate_content, model_name, prompt)
+    if cache is not None:
+        cache.put(cache_key, partial, kind="minutes")
+    return finished(partial, False)
+
+def merge_partial_minutes(partials, model_name="gemini-2.0-flash", backend=None, cache=None):
+    """部分ごとに抽出した要点を統合して、MINUTES_TEMPLATE の形式の議事録を作成します"""
+    backend = backend or get_default_backend()
+    
+    cache_key = None
+    if cache is not None:
+        cache_key = make_cache_key("minutes_merge", *partials, model_name, MINUTES_PROMPT_VERSION)
+        cached_minutes = cache.get(cache_key)
+        if cached_minutes is not None:
+            return cached_minutes
+    
+    sections = "\n\n".join(
+        f"### 部分 {i + 1}/{len(partials)}\n{partial.strip()}" for i, partial in enumerate(partials)
+    )
+    prompt = f"""
+以下は長い会議の文字起こしを{len(partials)}個の部分に分け、部分ごとに要点を抽出したものです（時系列順）。
+これらを統合して1つの議事録を作成してください。マークダウン形式で出力してください。
+
+部分ごとの要点:
+```
+{sections}
+```
+
+議事録は以下の雛形の形式で作成してください：
+{MINUTES_TEMPLATE}
+複数の部分にまたがる同じ話題は1つの議題にまとめ、議題の項目は必要に応じて追加してください。
+重複する決定事項やアクションアイテムはまとめ、重要な決定事項や次のステップを確実に含めてください。
+情報が特定できない項目は空欄にするか「情報なし」と記入してください。
+"""
+    minutes = get_rate_limiter().call(backend.generate_content, model_name, prompt)
+    if cache is not None:
+        cache.put(cache_key, minutes, kind="minutes")
+    return minutes
+
+def generate_minutes_map_reduce(transcription, model_name="gemini-2.0-flash", backend=None, cache=None,
+                                max_workers=DEFAULT_MAX_WORKERS, chunk_chars=MINUTES_CHUNK_CHARS, on_event=None):
+    """文字起こしを分割して部分ごとの要点を並列に抽出し、それらを統合して議事録を作成します"""
+    chunks = split_transcription_for_minutes(transcription, chunk_chars)
+    total = len(chunks)
+    print(f"文字起こしを{total}個の部分に分けて議事録の要点を抽出します（最大{max_workers}並列）")
+    
+    def extract(index):
+        return extract_partial_minutes(chunks[index], index, total, model_name, backend, cache, on_event)
+    
+    with ThreadPoolExecutor(max_workers=max(1, min(max_workers, total))) as executor:
+        partials = list(executor.map(extract, range(total)))
+    
+    print("部分ごとの要点を統合して議事録を作成中...")
+    return merge_partial_minutes(partials, model_name, backend, cache)
+
+def generate_minutes(transcription, model_name="gemini-2.0-flash", backend=None, cache=None, on_event=None,
+                     map_reduce=None, max_workers=DEFAULT_MAX_WORKERS, partials=None):
+    """文字起こしから議事録を生成します
+
+    cache（ResultCache）を指定した場合は、同じ文字起こしから生成済みの議事録があれば再利用します。
+    on_event を指定した場合は、開始と完了を events のイベントとして通知します。
+    map_reduce が None の場合、文字起こしが MINUTES_MAP_REDUCE_THRESHOLD_CHARS 文字を超えると
+    generate_minutes_map_reduce の2段階の方式に切り替えます（True/False で指定も可能）。
+    partials に抽出済みの部分ごとの要点（MinutesPipeline の結果）を渡した場合は、統合だけを行います。
+    """
+    # バックエンドを設定（APIキーの確認を含む）
+    backend = backend or get_default_backend()
+    backend.configure()
+    
+    emit(on_event, events.MinutesStarted(len(transcription)))
+    started_at = time.time()
+    
+    cache_key = None
+    if cache is not None:
+        cache_key = make_cache_key("minutes", transcription, model_name, MINUTES_PROMPT_VERSION)
+        cached_minutes = cache.get(cache_key)
+        if cached_minutes is not None:
+            print(f"キャッシュから議事録を取得しました: {len(cached_minutes)}文字")
+            emit(on_event, events.MinutesFinished(len(cached_minutes), time.time() - started_at, True))
+            return cached_minutes
+    
+    if map_reduce is None:
+        map_reduce = len(transcription) > MINUTES_MAP_REDUCE_THRESHOLD_CHARS
     
     print("議事録を生成中...")
     
     try:
-        # Geminiモデルを設定
-        model = genai.GenerativeModel(model_name)
-        
-        # 議事録生成のためのプロンプト
-        prompt = f"""
+        if partials is not None:
+            print("セグメントごとの要点を統合して議事録を作成中...")
+            minutes = merge_partial_minutes(partials, model_name, backend, cache)
+        elif map_reduce:
+            minutes = generate_minutes_map_reduce(
+                transcription, model_name, backend, cache, max_workers=max_workers, on_event=on_event
+            )
+        else:
+            # 議事録生成のためのプロンプト
+            prompt = f"""
 以下の会議の文字起こしから議事録を作成してください。マークダウン形式で出力してください。
 
 会議の文字起こし:
@@ -349,155 +1040,888 @@ def generate_minutes(transcription, model_name="gemini-2.0-flash"):
 議事録は簡潔かつ明確に作成し、重要な決定事項や次のステップを確実に含めてください。
 文字起こしから情報が特定できない場合は、その項目は空欄にするか「情報なし」と記入してください。
 """
-        
-        # 文字起こし結果から議事録を生成
-        response = model.generate_content(prompt)
-        minutes = response.text
+            
+            # 文字起こし結果から議事録を生成
+            minutes = get_rate_limiter().call(backend.generate_content, model_name, prompt)
         
         print(f"議事録生成完了: {len(minutes)}文字")
+        if cache is not None:
+            cache.put(cache_key, minutes, kind="minutes")
+        emit(on_event, events.MinutesFinished(len(minutes), time.time() - started_at, False))
         return minutes
         
     except Exception as e:
         error_message = f"議事録の生成中にエラーが発生しました: {str(e)}"
         print(error_message)
+        emit(on_event, events.MinutesFinished(0, time.time() - started_at, False))
         return f"# 議事録生成エラー\n\n{error_message}\n\n## 元の文字起こし\n\n{transcription}"
 
-def transcribe_audio(audio_data, model_name="gemini-2.0-flash", language="japanese", with_timestamps=False, generate_minutes_flag=False):
+class MinutesPipeline:
+    """文字起こしと並行して議事録の要点を抽出するパイプライン
+
+    iter_transcribe_audio が返したセグメントを add() に渡すと、そのセグメントの要点の抽出を
+    すぐに開始します（残りのセグメントの文字起こしと並行して実行）。すべてのセグメントが
+    そろったら finish() で要点を統合するだけで議事録ができるため、議事録の生成にかかる時間が
+    文字起こしの後にほとんど上乗せされません。
+
+    セグメントが1つだけの場合は従来どおり finish() で文字起こし全体から議事録を生成します。
+    """
+
+    def __init__(self, model_name="gemini-2.0-flash", backend=None, cache=None,
+                 max_workers=DEFAULT_MAX_WORKERS, on_event=None):
+        self.model_name = model_name
+        self.backend = backend or get_default_backend()
+        self.cache = cache
+        self.max_workers = max_workers
+        self.on_event = on_event
+        self.executor = None
+        self.futures = {}  # セグメント番号 -> 要点の抽出の Future
+        self.failed = False
+
+    def add(self, chunk):
+        """文字起こしが完了したセグメント（SegmentTranscript）の要点の抽出を開始します"""
+        if chunk.total <= 1:
+            return
+        if chunk.error is not None:
+            self.failed = True
+            return
+        if self.executor is None:
+            self.backend.configure()
+            self.executor = ThreadPoolExecutor(max_workers=max(1, self.max_workers))
+        self.futures[chunk.index] = self.executor.submit(
+            extract_partial_minutes, chunk.text, chunk.index, chunk.total,
+            self.model_name, self.backend, self.cache, self.on_event
+        )
+
+    def finish(self, transcription):
+        """抽出した要点を統合して議事録を返します
+
+        要点の抽出に失敗したセグメントがあった場合は、文字起こし全体から generate_minutes で生成します。
+        """
+        partials = None
+        if self.futures and not self.failed:
+            try:
+                partials = [self.futures[index].result() for index in sorted(self.futures)]
+            except Exception as e:
+                print(f"警告: セグメントの要点の抽出に失敗したため、文字起こし全体から議事録を生成します: {str(e)}")
+        try:
+            return generate_minutes(transcription, self.model_name, self.backend, self.cache, self.on_event,
+                                    max_workers=self.max_workers, partials=partials)
+        finally:
+            self.close()
+
+    def close(self):
+        """実行中でない要点の抽出を取り消します"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
+def _normalize_for_overlap(text):
+    """重複部分の照合用に、文字と数字だけを残した文字列と元の位置の対応を返します"""
+    text_without_markers = TIMESTAMP_PATTERN.sub(lambda m: " " * len(m.group(0)), text)
+    chars = []
+    positions = []
+    for position, ch in enumerate(text_without_markers):
+        if ch.isalnum():
+            chars.append(ch.lower())
+            positions.append(position)
+    return "".join(chars), positions
+
+def _prefix_function(text):
+    """KMP法の接頭辞関数（各位置で終わる、先頭と一致する最長の部分文字列の長さ）"""
+    pi = [0] * len(text)
+    k = 0
+    for i in range(1, len(text)):
+        while k > 0 and text[i] != text[k]:
+            k = pi[k - 1]
+        if text[i] == text[k]:
+            k += 1
+        pi[i] = k
+    return pi
+
+def merge_overlapping_text(previous_text, next_text, max_overlap_chars):
+    """重なった音声から書き起こされた、前のセグメントの末尾と次のセグメントの先頭の重複を取り除きます
+
+    前のセグメントの末尾と次のセグメントの先頭（句読点・空白・タイムスタンプを除く）の
+    最長の一致をKMP法で線形時間で探します。境界で途切れた単語に対応するため、
+    次のセグメントの先頭の数文字の読み飛ばしと、前のセグメントの末尾の数文字の不一致を許容します。
+    一致部分の中に文末の句読点（。！？など）の後の区切りがあれば最後の区切りで、
+    無ければ一致部分の直前でつなぎます。一致が見つからない場合はそのまま返します。
+
+    Returns:
+        (前のセグメントのテキスト, 重複を除いた次のセグメントのテキスト)
+    """
+    window_chars = max_overlap_chars * 3
+    tail_offset = max(0, len(previous_text) - window_chars)
+    tail, tail_positions = _normalize_for_overlap(previous_text[tail_offset:])
+    head, head_positions = _normalize_for_overlap(next_text[:window_chars])
+    tail_start = max(0, len(tail) - max_overlap_chars)
+    tail = tail[tail_start:]
+    tail_positions = [tail_offset + position for position in tail_positions[tail_start:]]
+    head = head[:max_overlap_chars + MAX_OVERLAP_HEAD_SKIP_CHARS]
+    
+    best = None  # (一致した文字数, 次のセグメントで読み飛ばした文字数, 前のセグメントで一致が終わる位置)
+    for skip in range(min(MAX_OVERLAP_HEAD_SKIP_CHARS, len(head)) + 1):
+        pattern = head[skip:]
+        if len(pattern) < MIN_OVERLAP_MATCH_CHARS:
+            break
+        pi = _prefix_function(pattern + "\0" + tail)
+        # 前のセグメントの末尾の不完全な単語を許容するため、最後の数文字の位置も調べる
+        for end in range(len(tail) - 1, max(-1, len(tail) - 1 - MAX_OVERLAP_HEAD_SKIP_CHARS), -1):
+            length = pi[len(pattern) + 1 + end]
+            if length >= MIN_OVERLAP_MATCH_CHARS and (best is None or length > best[0]):
+                best = (length, skip, end)
+    
+    if best is None:
+        return previous_text, next_text
+    
+    length, skip, end = best
+    match_start = end - length + 1
+    
+    # 一致部分の中で、前のセグメントで文末の句読点の後にある最後の区切りを探す
+    # （開き括弧などで区切ると括弧が閉じられずに残るため、文の切れ目でだけつなぐ）
+    for k in range(length - 1, -1, -1):
+        if match_start + k + 1 < len(tail_positions):
+            gap_end = tail_positions[match_start + k + 1]
+        else:
+            gap_end = len(previous_text)
+        gap = previous_text[tail_positions[match_start + k] + 1:gap_end]
+        punctuation = re.match(f"[{re.escape(OVERLAP_TRAILING_PUNCTUATION)}]*", gap).group(0)
+        if any(char in SENTENCE_END_PUNCTUATION for char in punctuation):
+            previous_part = previous_text[:tail_positions[match_start + k] + 1] + punctuation
+            next_part = next_text[head_positions[skip + k] + 1:]
+            next_part = re.sub(f"^[{re.escape(OVERLAP_TRAILING_PUNCTUATION)}]*\\s*", "", next_part)
+            return previous_part, next_part
+    
+    # 区切りが無い場合は、前のセグメントを一致部分の直前で切る
+    # （前のセグメントの末尾は分割位置で途切れているため、次のセグメントの書き起こしを優先）
+    return previous_text[:tail_positions[match_start]].rstrip(), next_text[head_positions[skip]:]
+
+class SegmentTranscript:
+    """iter_transcribe_audio が返す、1セグメント分の文字起こし結果
+
+    text は隣のセグメントとの重複を取り除いた文字起こし結果（失敗した場合はNone）、
+    output は出力用に整形した文字列（タイムスタンプありの場合の見出しや、失敗時の注記を含む）です。
+    output をセグメント順に "\\n\\n" で連結すると transcribe_audio の結果と同じになります。
+    """
+
+    def __init__(self, index, total, start_ms, end_ms, text, output, error=None):
+        self.index = index
+        self.total = total
+        self.start_ms = start_ms
+        self.end_ms = end_ms
+        self.text = text
+        self.output = output
+        self.error = error
+
+    def __repr__(self):
+        status = "failed" if self.error is not None else f"{len(self.text)} chars"
+        return f"SegmentTranscript({self.index + 1}/{self.total}, {format_timestamp(self.start_ms)}-{format_timestamp(self.end_ms)}, {status})"
+
+class SegmentAssembler:
+    """完了順に届くセグメントの結果を、出力できるようになったものからセグメント順に返します
+
+    隣り合うセグメントの時間範囲が重なっている場合は、次のセグメントの結果が届いてから
+    merge_overlapping_text で重複部分を取り除いて返します。
+    """
+
+    def __init__(self, segment_ranges, with_timestamps=False):
+        self.ranges = list(segment_ranges)
+        self.with_timestamps = with_timestamps
+        self.texts = {}
+        self.errors = {}
+        self.next_index = 0
+
+    def add(self, index, text=None, error=None):
+        if error is not None:
+            self.errors[index] = error
+        else:
+            self.texts[index] = text
+
+    def _is_finished(self, index):
+        return index in self.texts or index in self.errors
+
+    def _overlap_ms(self, index):
+        """index 番目と次のセグメントが重なっている時間（ミリ秒）"""
+        if index + 1 >= len(self.ranges):
+            return 0
+        return self.ranges[index][1] - self.ranges[index + 1][0]
+
+    def ready(self):
+        """出力できるようになったセグメントの SegmentTranscript のリストを返します"""
+        chunks = []
+        total = len(self.ranges)
+        while self.next_index < total and self._is_finished(self.next_index):
+            i = self.next_index
+            overlap_ms = self._overlap_ms(i)
+            if i in self.texts and overlap_ms > 0:
+                # 重なっている次のセグメントの結果を待ってから重複部分を取り除く
+                if not self._is_finished(i + 1):
+                    break
+                if i + 1 in self.texts:
+                    max_overlap_chars = max(50, int(overlap_ms / 1000 * OVERLAP_CHARS_PER_SECOND))
+                    self.texts[i], self.texts[i + 1] = merge_overlapping_text(
+                        self.texts[i], self.texts[i + 1], max_overlap_chars
+                    )
+            
+            start_ms, end_ms = self.ranges[i]
+            text = self.texts.get(i)
+            if text is not None:
+                output = text
+            else:
+                output = f"[セグメント {i+1}/{total} の文字起こしに失敗しました: {str(self.errors[i])}]"
+            
+            # セグメント情報を追加（複数のセグメントでタイムスタンプありの場合は先頭にセグメント情報を追加）
+            if self.with_timestamps and total > 1:
+                segment_header = f"[{format_timestamp(start_ms)}] セグメント {i+1}/{total} の文字起こし結果:\n"
+                output = segment_header + output
+            
+            chunks.append(SegmentTranscript(i, total, start_ms, end_ms, text, output, self.errors.get(i)))
+            self.next_index += 1
+        return chunks
+
+def iter_transcribe_audio(audio_data, model_name="gemini-2.0-flash", language="japanese", with_timestamps=False, max_workers=DEFAULT_MAX_WORKERS, backend=None, upload_format=DEFAULT_UPLOAD_PROFILE, cache=None, job_state=None, align_to_silence=True, overlap_seconds=0, on_event=None, preprocess=None, skip_silence_seconds=0, spill_bytes=DEFAULT_SPILL_BYTES):
+    """音声を文字起こしし、セグメントの結果を SegmentTranscript として順に返すジェネレーター
+
+    セグメントは並列に処理し、完了したものから（前のセグメントがすべて完了していれば）
+    セグメント順に返します。重なりのあるセグメントは、重複部分を取り除くために
+    次のセグメントの完了を待ってから返します。
+    失敗したセグメントは例外を送出せず、error を設定した SegmentTranscript として返します。
+    途中で反復をやめた場合は、まだ開始していないセグメントの処理を取り消します。
+    
+    引数は transcribe_audio と同じです（generate_minutes_flag を除く）。
+    """
+    # バックエンドを設定（APIキーの確認を含む）
+    backend = backend or get_default_backend()
+    backend.configure()
+    
+    audio_length_ms = len(audio_data)
+    duration_minutes = get_audio_segment_duration_minutes(audio_data)
+    
+    # 前処理は、メモリ上の音声では分割前に全体に一度だけ行い（音量の調整量がセグメント間でそろう）、
+    # ストリーミングモードではセグメントをデコードするたびに行う
+    segment_preprocess = None
+    if preprocess is not None and preprocess.enabled:
+        if isinstance(audio_data, StreamingAudioSource):
+            segment_preprocess = preprocess
+        else:
+            input_bytes = len(audio_data.raw_data)
+            audio_data, elapsed, gain_db = preprocess_audio(audio_data, preprocess)
+            emit(on_event, events.AudioPreprocessed(None, 0, input_bytes, len(audio_data.raw_data), gain_db, elapsed))
+    
+    # 長い無音を取り除く（以降の分割・状態ファイルは無音を詰めた時間軸で扱い、
+    # 返すセグメントの時間範囲とタイムスタンプだけを元の音声の時刻に戻す）
+    timeline = None
+    if skip_silence_seconds > 0:
+        if isinstance(audio_data, StreamingAudioSource):
+            print("警告: ストリーミングモードでは無音のスキップは使用できません（音声全体を読み込む必要があります）")
+        else:
+            original_length_ms = audio_length_ms
+            audio_data, timeline, elapsed = skip_silence(audio_data, int(skip_silence_seconds * 1000))
+            audio_length_ms = len(audio_data)
+            duration_minutes = get_audio_segment_duration_minutes(audio_data)
+            emit(on_event, events.SilenceSkipped(
+                original_length_ms, audio_length_ms,
+                tuple((original_start, original_start + length) for _, original_start, length in timeline.entries),
+                elapsed
+            ))
+    
+    def to_original(chunks):
+        if timeline is None:
+            return chunks
+        restored = []
+        for chunk in chunks:
+            text, output = chunk.text, chunk.output
+            if with_timestamps:
+                text = remap_timestamps(text, timeline) if text is not None else None
+                output = remap_timestamps(output, timeline)
+            restored.append(SegmentTranscript(
+                chunk.index, chunk.total, timeline.to_original(chunk.start_ms),
+                timeline.to_original(chunk.end_ms, end=True), text, output, chunk.error
+            ))
+        return restored
+    
+    # セグメントの分割計画（再開時は状態ファイルに記録された時間範囲を使う）
+    split_started_at = time.time()
+    if job_state is not None and job_state.segment_ranges:
+        job_state.check_compatible(audio_length_ms, {
+            "model_name": model_name, "language": language.lower(), "with_timestamps": with_timestamps,
+            "skip_silence_seconds": skip_silence_seconds
+        })
+        print(f"状態ファイルからジョブを再開します: {job_state.path}")
+        segments = [(slice_audio(audio_data, start_ms, end_ms), start_ms, end_ms) for start_ms, end_ms in job_state.segment_ranges]
+    elif duration_minutes <= MAX_AUDIO_DURATION_MINUTES:
+        # 音声の長さがMAX_AUDIO_DURATION_MINUTESより短い場合は分割せずに処理
+        segments = [(audio_data, 0, audio_length_ms)]
+    else:
+        # 長い音声の場合は分割して処理
+        print(f"音声の長さが{duration_minutes:.1f}分のため、{MAX_AUDIO_DURATION_MINUTES}分ごとに分割して処理します")
+        segments = split_audio_segments(audio_data, MAX_AUDIO_DURATION_MINUTES, align_to_silence, int(overlap_seconds * 1000))
+    split_seconds = time.time() - split_started_at
+    
+    if job_state is not None and not job_state.segment_ranges:
+        job_state.set_segments(audio_length_ms, [(start_ms, end_ms) for _, start_ms, end_ms in segments])
+    
+    # 完了済みのセグメント（再開時）は再処理しない
+    assembler = SegmentAssembler([(start_ms, end_ms) for _, start_ms, end_ms in segments], with_timestamps)
+    results = job_state.completed() if job_state is not None else {}
+    for i, text in results.items():
+        assembler.add(i, text)
+    errors = {}
+    pending = [i for i in range(len(segments)) if i not in results]
+    if results:
+        print(f"完了済みの{len(results)}個のセグメントを再利用し、残り{len(pending)}個のセグメントを処理します")
+    planned_ranges = tuple((start_ms, end_ms) for _, start_ms, end_ms in segments)
+    if timeline is not None:
+        planned_ranges = tuple((timeline.to_original(start_ms), timeline.to_original(end_ms, end=True))
+                               for start_ms, end_ms in planned_ranges)
+    emit(on_event, events.SegmentsPlanned(len(segments), len(pending), planned_ranges, split_seconds))
+    
+    def process_segment(i, segment, start_ms, end_ms):
+        print(f"セグメント {i+1}/{len(segments)} を処理中 ({format_timestamp(start_ms)} - {format_timestamp(end_ms)})")
+        emit(on_event, events.SegmentStarted(i, len(segments), start_ms, end_ms))
+        return transcribe_audio_segment(segment, start_ms, model_name, language, with_timestamps, backend=backend, upload_format=upload_format, cache=cache, uploads=uploads, on_event=on_event, segment_index=i, preprocess=segment_preprocess, spill_bytes=spill_bytes)
+    
+    # アップロードしたファイルはジョブ全体で管理し、すべてのセグメントの処理後にまとめて削除する
+    limiter = get_rate_limiter()
+    limiter_stats_before = limiter.snapshot()
+    uploads = UploadManager(backend, limiter)
+    
+    # 再開時に完了済みのセグメントは最初に返す
+    yield from to_original(assembler.ready())
+    
+    if pending:
+        num_workers = max(1, min(int(max_workers), len(pending)))
+        if len(segments) > 1:
+            print(f"{len(pending)}個のセグメントを最大{num_workers}並列で処理します")
+        
+        executor = ThreadPoolExecutor(max_workers=num_workers)
+        try:
+            futures = {
+                executor.submit(process_segment, i, *segments[i]): i
+                for i in pending
+            }
+            
+            # 完了した順に結果を受け取り、セグメント順に返せるものから返す
+            for future in as_completed(futures):
+                i = futures[future]
+                try:
+                    results[i] = future.result()
+                except Exception as e:
+                    errors[i] = e
+                    print(f"セグメント {i+1}/{len(segments)} の処理に失敗しました: {str(e)}")
+                    if job_state is not None:
+                        job_state.mark_failed(i, e)
+                    emit(on_event, events.SegmentFailed(i, len(segments), str(e)))
+                    assembler.add(i, error=e)
+                else:
+                    if job_state is not None:
+                        job_state.mark_done(i, results[i])
+                    
+                    # セグメント処理完了のログ
+                    print(f"セグメント {i+1}/{len(segments)} の処理が完了しました。完了済み: {len(results)}/{len(segments)}")
+                    emit(on_event, events.SegmentFinished(i, len(segments), len(results), len(results[i])))
+                    assembler.add(i, results[i])
+                
+                yield from to_original(assembler.ready())
+        finally:
+            # 反復が途中でやめられた場合は、まだ開始していないセグメントを取り消す
+            executor.shutdown(wait=True, cancel_futures=True)
+            uploads.cleanup()
+        
+        # レート制限による待機時間（各ワーカーの待機時間の合計）を報告
+        limiter_stats = limiter.snapshot()
+        throttled_seconds = limiter_stats["throttled_seconds"] - limiter_stats_before["throttled_seconds"]
+        rate_limited = limiter_stats["rate_limited"] - limiter_stats_before["rate_limited"]
+        if rate_limited or throttled_seconds >= 0.1:
+            print(f"レート制限による待機時間: 合計{throttled_seconds:.1f}秒（クォータ超過: {rate_limited}回）")
+    
+    if job_state is not None:
+        job_state.set_status("failed" if errors else "transcribed")
+
+def join_segment_transcripts(chunks, on_event=None):
+    """iter_transcribe_audio が返した SegmentTranscript をセグメント順に連結します
+
+    Raises:
+        セグメントが1つだけで失敗した場合はその例外
+        SegmentTranscriptionError: 複数のセグメントのうち一部が失敗した場合（完了分の結果を保持）
+    """
+    results = {chunk.index: chunk.text for chunk in chunks if chunk.error is None}
+    errors = {chunk.index: chunk.error for chunk in chunks if chunk.error is not None}
+    
+    if len(chunks) == 1 and errors:
+        emit(on_event, events.TranscriptionFinished(0, 1))
+        raise chunks[0].error
+    
+    transcription = "\n\n".join(chunk.output for chunk in chunks)
+    emit(on_event, events.TranscriptionFinished(len(transcription), len(errors)))
+    
+    if errors:
+        failed_list = ", ".join(str(i + 1) for i in sorted(errors))
+        raise SegmentTranscriptionError(
+            f"{len(errors)}個のセグメント（{failed_list}）の文字起こしに失敗しました。"
+            f"完了した{len(results)}個のセグメントの結果は保持されています。",
+            transcription, results, errors
+        )
+    
+    if len(chunks) > 1:
+        print(f"全セグメントの処理が完了しました。最終的な文字起こし結果の長さ: {len(transcription)}文字")
+    return transcription
+
+def transcribe_audio(audio_data, model_name="gemini-2.0-flash", language="japanese", with_timestamps=False, generate_minutes_flag=False, max_workers=DEFAULT_MAX_WORKERS, backend=None, upload_format=DEFAULT_UPLOAD_PROFILE, cache=None, job_state=None, align_to_silence=True, overlap_seconds=0, on_event=None, preprocess=None, skip_silence_seconds=0, spill_bytes=DEFAULT_SPILL_BYTES):
     """Gemini APIを使用して音声を文字起こしします
-    長い音声の場合は自動的に分割して処理します
+    長い音声の場合は自動的に分割し、セグメントを並列に処理します
+    （完了したセグメントの結果から順に受け取る場合は iter_transcribe_audio を使用してください）
     
     Args:
-        audio_data: 音声データ（AudioSegmentオブジェクト）
+        audio_data: 音声データ（AudioSegment または StreamingAudioSource）
         model_name: 使用するGeminiモデル名
         language: 文字起こしする言語（"japanese"または"english"）
         with_timestamps: タイムスタンプを付けるかどうか
         generate_minutes_flag: 議事録も生成するかどうか
+        max_workers: 同時に文字起こしするセグメント数の上限
+        backend: API呼び出しに使用するバックエンド（省略時はデフォルトのバックエンド）
+        upload_format: アップロード時のエンコード形式（UPLOAD_PROFILES のキー）
+        cache: セグメントの文字起こし結果と議事録のキャッシュ（ResultCache、Noneで使用しない）
+        job_state: セグメントごとの進捗を記録する JobState。記録済みの分割計画があれば
+            それに従い、完了済みのセグメントは再処理しません（ジョブの再開）
+        align_to_silence: 長い音声を分割する際に分割位置を無音部分に合わせるかどうか
+        overlap_seconds: 隣り合うセグメントを重ねる秒数（重複して書き起こされた部分は結合時に除去）
+        on_event: 進捗を events のイベント（SegmentStarted など）として受け取る関数。
+            ワーカースレッドから呼び出されます
+        preprocess: 送信前の前処理の設定（PreprocessOptions、Noneで前処理しない）。メモリ上の音声は
+            分割前に全体を一度だけ、ストリーミングモードではセグメントごとに処理します
+        skip_silence_seconds: この秒数以上続く無音を送信前に取り除く（0で取り除かない）。
+            タイムスタンプとセグメントの時間範囲は元の音声の時刻に戻して返します
+        spill_bytes: アップロード用にエンコードした音声をメモリ上に保持する上限（バイト）。
+            超えたセグメントは一時ファイルに書き出します（0で常に一時ファイルを使用）
     
     Returns:
         文字起こし結果のテキスト、または(文字起こし結果, 議事録)のタプル
+    
+    Raises:
+        SegmentTranscriptionError: 一部のセグメントが失敗した場合（完了分の結果を保持）
     """
-    # APIキーが設定されているか確認
-    if not os.getenv("GOOGLE_API_KEY"):
-        raise ValueError("GOOGLE_API_KEY が設定されていません。")
+    # 議事録も生成する場合は、完了したセグメントから順に要点の抽出を始める
+    minutes_pipeline = None
+    if generate_minutes_flag:
+        minutes_pipeline = MinutesPipeline("gemini-2.0-flash", backend, cache, max_workers, on_event)
     
-    # APIキーを設定
-    current_api_key = os.getenv("GOOGLE_API_KEY")
-    genai.configure(api_key=current_api_key)
+    try:
+        chunks = []
+        for chunk in iter_transcribe_audio(
+            audio_data, model_name, language, with_timestamps, max_workers, backend, upload_format,
+            cache, job_state, align_to_silence, overlap_seconds, on_event, preprocess, skip_silence_seconds, spill_bytes
+        ):
+            chunks.append(chunk)
+            if minutes_pipeline is not None:
+                minutes_pipeline.add(chunk)
+        transcription = join_segment_transcripts(chunks, on_event)
+        
+        # 議事録を生成するかどうか
+        if minutes_pipeline is not None:
+            minutes = minutes_pipeline.finish(transcription)
+            return transcription, minutes
+    finally:
+        if minutes_pipeline is not None:
+            minutes_pipeline.close()
     
-    duration_minutes = get_audio_segment_duration_minutes(audio_data)
+    return transcription
+
+def transcribe_file(audio_path, output_path=None, minutes_output_path=None, resume=False, streaming=False, generate_minutes_flag=False, output_format="text", **options):
+    """音声ファイルを読み込んで文字起こしし、結果をファイルに保存します
+
+    output_format が text の場合、文字起こし結果はセグメントが完了するたびに output_path に追記します。
+    srt / vtt / json の場合はタイムスタンプごとの区間に分けた結果を最後にまとめて書き込みます。
+    ジョブの状態ファイル（出力ファイル名.job.json）にセグメントごとの進捗を記録し、
+    すべて完了したら削除します。
+    
+    Args:
+        audio_path: 音声ファイルのパス
+        output_path: 文字起こし結果の保存先（Noneで保存しない）
+        minutes_output_path: 議事録の保存先（Noneで保存しない）
+        resume: 状態ファイルから前回失敗したジョブを再開するかどうか
+        streaming: 音声全体を読み込まず、必要な範囲だけをデコードするかどうか
+        generate_minutes_flag: 議事録も生成するかどうか
+        output_format: output_path の形式（OUTPUT_FORMATS のいずれか）
+        **options: iter_transcribe_audio に渡すその他の引数
     
-    # 音声の長さがMAX_AUDIO_DURATION_MINUTESより短い場合は分割せずに処理
-    if duration_minutes <= MAX_AUDIO_DURATION_MINUTES:
-        transcription = transcribe_audio_segment(audio_data, 0, model_name, language, with_timestamps)
+    Returns:
+        (文字起こし結果, 議事録（生成しない場合はNone）, 音声の長さ（ミリ秒）)
+    
+    Raises:
+        SegmentTranscriptionError: 一部のセグメントが失敗した場合（途中までの結果は output_path に保存済み）
+    """
+    # 音声ファイルを読み込み
+    print(f"音声ファイル '{audio_path}' を読み込んでいます...")
+    audio_data, _ = load_audio_file(audio_path, streaming=streaming, on_event=options.get("on_event"))
+    
+    # 読み込めなかったファイルの状態ファイルが残らないよう、読み込みが成功してから作成する
+    job_state_path = get_job_state_path(output_path, audio_path)
+    if resume:
+        job_state = JobState.load(job_state_path)
     else:
-        # 長い音声の場合は分割して処理
-        print(f"音声の長さが{duration_minutes:.1f}分のため、{MAX_AUDIO_DURATION_MINUTES}分ごとに分割して処理します")
-        segments = split_audio_segments(audio_data, MAX_AUDIO_DURATION_MINUTES)
+        job_state = JobState.create(job_state_path, audio_path, {
+            "model_name": options.get("model_name", "gemini-2.0-flash"),
+            "language": options.get("language", "japanese"),
+            "with_timestamps": options.get("with_timestamps", False),
+            "skip_silence_seconds": options.get("skip_silence_seconds", 0),
+        })
+    
+    # セグメントが完了するたびに出力ファイルに追記する（長い音声でも途中経過を確認できるように）
+    # 議事録も生成する場合は、完了したセグメントから順に要点の抽出を始める
+    minutes_pipeline = None
+    if generate_minutes_flag:
+        minutes_pipeline = MinutesPipeline("gemini-2.0-flash", options.get("backend"), options.get("cache"),
+                                           options.get("max_workers", DEFAULT_MAX_WORKERS), options.get("on_event"))
+    
+    try:
+        chunks = []
+        output_file = open(output_path, "w", encoding="utf-8") if output_path and output_format == "text" else None
+        try:
+            for chunk in iter_transcribe_audio(audio_data, job_state=job_state, **options):
+                if output_file is not None:
+                    if chunks:
+                        output_file.write("\n\n")
+                    output_file.write(chunk.output)
+                    output_file.flush()
+                chunks.append(chunk)
+                if minutes_pipeline is not None:
+                    minutes_pipeline.add(chunk)
+        finally:
+            if output_file is not None:
+                output_file.close()
         
-        full_transcription = ""
+        if output_path and output_format != "text":
+            # 失敗したセグメントがあっても、完了したセグメントの区間は書き込む
+            with open(output_path, "w", encoding="utf-8") as f:
+                f.write(format_transcript(build_timed_segments(chunks), output_format))
         
-        for i, (segment, start_ms, end_ms) in enumerate(segments):
-            print(f"セグメント {i+1}/{len(segments)} を処理中 ({format_timestamp(start_ms)} - {format_timestamp(end_ms)})")
-            
-            # セグメントごとに文字起こし
-            segment_transcription = transcribe_audio_segment(
-                segment, start_ms, model_name, language, with_timestamps
-            )
-            
-            # 結果を連結
-            if i > 0:
-                full_transcription += "\n\n"
-            
-            # セグメント情報を追加（タイムスタンプありの場合は先頭にセグメント情報を追加）
-            if with_timestamps:
-                segment_header = f"[{format_timestamp(start_ms)}] セグメント {i+1}/{len(segments)} の文字起こし結果:\n"
-                full_transcription += segment_header
-            
-            full_transcription += segment_transcription
-            
-            # セグメント処理完了のログ
-            print(f"セグメント {i+1}/{len(segments)} の処理が完了しました。現在の文字起こし結果の長さ: {len(full_transcription)}文字")
+        try:
+            transcription = join_segment_transcripts(chunks, options.get("on_event"))
+        except SegmentTranscriptionError as e:
+            # 完了したセグメントの結果は出力ファイルに保存済み
+            print(f"エラー: {str(e)}")
+            if output_path:
+                print(f"途中までの文字起こし結果を '{output_path}' に保存しました")
+            print(f"完了したセグメントは '{job_state_path}' に記録されています。--resume オプションで未完了のセグメントだけを再処理できます")
+            raise
+        
+        if output_path:
+            print(f"文字起こし結果を '{output_path}' に保存しました")
         
-        print(f"全セグメントの処理が完了しました。最終的な文字起こし結果の長さ: {len(full_transcription)}文字")
-        transcription = full_transcription
+        minutes = None
+        if minutes_pipeline is not None:
+            minutes = minutes_pipeline.finish(transcription)
+    finally:
+        if minutes_pipeline is not None:
+            minutes_pipeline.close()
     
-    # 議事録を生成するかどうか
-    if generate_minutes_flag:
-        minutes = generate_minutes(transcription, model_name="gemini-2.0-flash")
-        return transcription, minutes
+    # 議事録の出力
+    if minutes is not None and minutes_output_path:
+        with open(minutes_output_path, "w", encoding="utf-8") as f:
+            f.write(minutes)
+        print(f"議事録を '{minutes_output_path}' に保存しました")
     
-    return transcription
+    # すべて完了したので状態ファイルは不要
+    job_state.delete()
+    
+    return transcription, minutes, len(audio_data)
+
+def make_progress_printer(label=None):
+    """CLI用の進捗イベントの受け取り先を返します（進捗の要約を標準エラー出力に表示）"""
+    prefix = f"[{label}] " if label else ""
+    
+    def on_event(event):
+        if isinstance(event, events.SegmentsPlanned):
+            message = f"進捗: {event.total - event.pending}/{event.total} セグメント完了"
+        elif isinstance(event, events.UploadFinished) and not event.reused:
+            rate = event.size_bytes / event.elapsed_seconds / (1024 * 1024) if event.elapsed_seconds > 0 else 0
+            message = f"アップロード完了: {format_timestamp(event.start_ms)} {event.size_bytes / (1024 * 1024):.1f}MB（{event.elapsed_seconds:.1f}秒、{rate:.1f}MB/s）"
+        elif isinstance(event, events.GenerateFinished):
+            message = f"生成完了: {format_timestamp(event.start_ms)} {event.chars}文字（{event.elapsed_seconds:.1f}秒、試行{event.attempt}回目）"
+        elif isinstance(event, events.SegmentFinished):
+            message = f"進捗: {event.completed}/{event.total} セグメント完了（{event.completed / event.total * 100:.1f}%）"
+        elif isinstance(event, events.SegmentFailed):
+            message = f"進捗: セグメント {event.index + 1}/{event.total} が失敗しました"
+        elif isinstance(event, events.MinutesStarted):
+            message = "進捗: 議事録を生成中"
+        elif isinstance(event, events.MinutesPartialFinished):
+            message = f"進捗: 議事録の要点抽出 {event.index + 1}/{event.total} 完了（{event.elapsed_seconds:.1f}秒）"
+        else:
+            return
+        print(prefix + message, file=sys.stderr, flush=True)
+    
+    return on_event
 
 def main():
     parser = argparse.ArgumentParser(description="音声ファイルをGemini APIで文字起こしします")
-    parser.add_argument("audio_file", help="文字起こしする音声ファイルのパス")
+    parser.add_argument("audio_file", nargs="+",
+                      help="文字起こしする音声ファイルのパス。ディレクトリ・globパターン・ファイル一覧（.txt、1行に1ファイル）や"
+                           "複数のファイルを指定するとバッチモードで処理する")
     parser.add_argument("-o", "--output", help="出力テキストファイル（指定しない場合は標準出力）")
+    parser.add_argument("--output-dir",
+                      help="バッチモードの出力先ディレクトリ（指定しない場合は音声ファイルの隣に「ファイル名.txt」（--format に応じた拡張子）と「ファイル名_minutes.md」を保存）")
+    parser.add_argument("--batch-workers", type=int, default=DEFAULT_BATCH_WORKERS,
+                      help=f"バッチモードで同時に処理するファイル数（デフォルト: {DEFAULT_BATCH_WORKERS}）")
+    parser.add_argument("--batch-log",
+                      help="バッチモードの進捗・結果を記録するJSONLログ（デフォルト: 出力先ディレクトリまたはカレントディレクトリの transcribe_batch.jsonl）")
+    parser.add_argument("--force", action="store_true",
+                      help="バッチモードで出力が音声ファイルより新しい場合も処理し直す")
+    parser.add_argument("--recursive", action="store_true",
+                      help="バッチモードでディレクトリを再帰的に探す")
     parser.add_argument("-m", "--model", default="gemini-2.0-flash", help="使用するGeminiモデル")
     parser.add_argument("-l", "--language", default="japanese", choices=["japanese", "english"], 
                       help="文字起こしする言語（japanese/english）")
     parser.add_argument("-t", "--timestamps", action="store_true", 
                       help="タイムスタンプを付けて出力する")
+    parser.add_argument("--format", default="text", choices=OUTPUT_FORMATS,
+                      help="文字起こし結果の出力形式（srt/vtt/json はタイムスタンプごとの区間に分けて出力し、"
+                           "タイムスタンプは自動的に有効になる。デフォルト: text）")
     parser.add_argument("--minutes", action="store_true",
                       help="議事録も生成する")
     parser.add_argument("--minutes-output", help="議事録の出力ファイル")
     parser.add_argument("--api-key", help="Google API キー（指定しない場合は環境変数から読み込み）")
+    parser.add_argument("-j", "--workers", type=int, default=DEFAULT_MAX_WORKERS,
+                      help=f"同時に文字起こしするセグメント数（デフォルト: {DEFAULT_MAX_WORKERS}）")
+    parser.add_argument("--stream", action="store_true",
+                      help="音声全体を読み込まず、セグメントごとに必要な範囲だけをデコードする（省メモリ）")
+    parser.add_argument("--upload-format", default=DEFAULT_UPLOAD_PROFILE, choices=list(UPLOAD_PROFILES),
+                      help=f"アップロード時のエンコード形式（wav: 従来の16-bit PCM、flac/opus: モノラル16kHz、デフォルト: {DEFAULT_UPLOAD_PROFILE}）")
+    parser.add_argument("--upload-spill-mb", type=float, default=DEFAULT_SPILL_BYTES / (1024 * 1024), metavar="MB",
+                      help="アップロード用にエンコードした音声をメモリ上に保持する上限（MB）。超えたセグメントは一時ファイルに書き出す"
+                           f"（0で常に一時ファイルを使用、デフォルト: {DEFAULT_SPILL_BYTES // (1024 * 1024)}）")
+    parser.add_argument("--preprocess", metavar="STEPS",
+                      help=f"送信前に音声を前処理する（カンマ区切りで {', '.join(PREPROCESS_STEPS)} または all。"
+                           "downmix: モノラル化、resample: サンプルレートの変換、normalize: 音量の正規化）")
+    parser.add_argument("--sample-rate", type=int, default=DEFAULT_SAMPLE_RATE,
+                      help=f"--preprocess resample の変換先のサンプルレート（デフォルト: {DEFAULT_SAMPLE_RATE}）")
+    parser.add_argument("--target-dbfs", type=float, default=DEFAULT_TARGET_DBFS,
+                      help=f"--preprocess normalize の目標の音量（dBFS、デフォルト: {DEFAULT_TARGET_DBFS}）")
+    parser.add_argument("--skip-silence", type=float, default=0, metavar="SECONDS",
+                      help="この秒数以上続く無音（休憩・開始待ちなど）を送信前に取り除く。タイムスタンプは元の音声の時刻で出力"
+                           f"（0で取り除かない、デフォルト: 0。GUIでは{DEFAULT_SKIP_SILENCE_SECONDS}秒）")
+    parser.add_argument("--split-mode", default="silence", choices=["silence", "fixed"],
+                      help="長い音声の分割方法（silence: 無音の位置で分割、fixed: 従来どおり一定間隔で分割）")
+    parser.add_argument("--overlap", type=float, default=0,
+                      help="隣り合うセグメントを重ねる秒数（境界の単語の欠落を防ぐ。重複部分は結合時に除去、デフォルト: 0）")
+    parser.add_argument("--no-cache", action="store_true",
+                      help="キャッシュを使わずに必ず文字起こし・議事録生成を実行する")
+    parser.add_argument("--cache-path", default=DEFAULT_CACHE_PATH,
+                      help=f"キャッシュファイルのパス（デフォルト: {DEFAULT_CACHE_PATH}）")
+    parser.add_argument("--cache-max-mb", type=int, default=DEFAULT_CACHE_MAX_BYTES // (1024 * 1024),
+                      help="キャッシュの合計サイズの上限（MB）。超えた場合は古いものから削除")
+    parser.add_argument("--resume", action="store_true",
+                      help="前回失敗したジョブを状態ファイル（出力ファイル名.job.json）から再開し、未完了のセグメントだけを処理する")
+    parser.add_argument("--rpm", type=int, default=0,
+                      help="1分あたりのAPIリクエスト数の上限（文字起こし・アップロード・議事録生成の合計、0で無制限）")
+    parser.add_argument("--max-concurrent-requests", type=int, default=0,
+                      help="同時に送るAPIリクエスト数の上限（0で無制限）")
+    parser.add_argument("--backend", default="gemini", choices=list(BACKENDS),
+                      help="API呼び出しに使用するバックエンド（stub: stub_server.py のローカルスタブ）")
+    parser.add_argument("--stub-url", default=DEFAULT_STUB_URL,
+                      help=f"スタブサーバーのURL（--backend stub 使用時、デフォルト: {DEFAULT_STUB_URL}）")
+    parser.add_argument("--profile", action="store_true",
+                      help="段階ごと（読み込み・分割・エンコード・アップロード・生成・議事録）の所要時間とデータ量を最後に表示する")
+    parser.add_argument("--metrics-out",
+                      help="段階ごと・セグメントごとの所要時間・データ量・再試行回数をJSONで保存するファイル")
+    parser.add_argument("--metrics-prom",
+                      help="同じ計測値を Prometheus のテキスト形式で保存するファイル（node_exporter の textfile collector 用）")
     
     args = parser.parse_args()
     
-    # APIキーの設定
+    # .envファイルの環境変数を読み込む
+    load_environment()
+    
+    # APIキーの設定（スタブサーバー使用時は不要）
     if args.api_key:
         os.environ["GOOGLE_API_KEY"] = args.api_key
-        genai.configure(api_key=args.api_key)
-    elif not os.getenv("GOOGLE_API_KEY"):
+    elif args.backend == "gemini" and not os.getenv("GOOGLE_API_KEY"):
         print("エラー: GOOGLE_API_KEY が設定されていません。--api-key オプションで指定するか、環境変数を設定してください。")
         sys.exit(1)
     
+    if args.workers < 1:
+        print("エラー: --workers には1以上の値を指定してください。")
+        sys.exit(1)
+    
+    if args.skip_silence < 0:
+        print("エラー: --skip-silence には0以上の値を指定してください。")
+        sys.exit(1)
+    
+    if args.upload_spill_mb < 0:
+        print("エラー: --upload-spill-mb には0以上の値を指定してください。")
+        sys.exit(1)
+    
+    if args.rpm < 0 or args.max_concurrent_requests < 0:
+        print("エラー: --rpm と --max-concurrent-requests には0以上の値を指定してください。")
+        sys.exit(1)
+    
+    if args.format != "text":
+        if not args.output and not args.output_dir and len(args.audio_file) == 1 and not is_batch_spec(args.audio_file[0]):
+            print(f"エラー: --format {args.format} では -o で出力ファイルを指定してください。")
+            sys.exit(1)
+        if not args.timestamps:
+            print(f"--format {args.format} のためタイムスタンプを有効にします")
+            args.timestamps = True
+    
+    preprocess = None
+    if args.preprocess:
+        if args.sample_rate < 1000:
+            print("エラー: --sample-rate には1000以上の値を指定してください。")
+            sys.exit(1)
+        try:
+            preprocess = parse_preprocess_steps(args.preprocess, args.sample_rate, args.target_dbfs)
+        except ValueError as e:
+            print(f"エラー: {str(e)}")
+            sys.exit(1)
+    
+    # API呼び出しのレート制限（プロセス全体で共有）
+    configure_rate_limiter(args.rpm, args.max_concurrent_requests)
+    
+    # バックエンドの作成
+    if args.backend == "stub":
+        backend = create_backend("stub", base_url=args.stub_url)
+    else:
+        backend = create_backend(args.backend)
+    
+    # キャッシュの準備
+    cache = None
+    if not args.no_cache:
+        cache = ResultCache(args.cache_path, args.cache_max_mb * 1024 * 1024)
+    
+    # 段階ごとの所要時間などの計測（進捗イベントから集計する）
+    metrics = None
+    if args.profile or args.metrics_out or args.metrics_prom:
+        metrics = MetricsCollector()
+    
+    options = {
+        "model_name": args.model,
+        "language": args.language,
+        "with_timestamps": args.timestamps,
+        "generate_minutes_flag": args.minutes,
+        "max_workers": args.workers,
+        "backend": backend,
+        "upload_format": args.upload_format,
+        "cache": cache,
+        "streaming": args.stream,
+        "align_to_silence": (args.split_mode == "silence"),
+        "overlap_seconds": args.overlap,
+        "output_format": args.format,
+        "preprocess": preprocess,
+        "skip_silence_seconds": args.skip_silence,
+        "spill_bytes": int(args.upload_spill_mb * 1024 * 1024),
+        "on_event": make_progress_printer(),
+    }
+    
+    # ディレクトリ・globパターン・ファイル一覧、または複数のファイルが指定された場合はバッチモード
+    if args.output_dir or len(args.audio_file) > 1 or is_batch_spec(args.audio_file[0]):
+        try:
+            exit_code = run_batch_mode(args, options, metrics)
+        finally:
+            report_metrics(metrics, args)
+        sys.exit(exit_code)
+    
+    audio_file = args.audio_file[0]
+    if metrics is not None:
+        options["on_event"] = metrics.handler(os.path.basename(audio_file), forward=options["on_event"])
+    
     try:
-        # 音声ファイルを読み込み
-        print(f"音声ファイル '{args.audio_file}' を読み込んでいます...")
-        audio_data, _ = load_audio_file(args.audio_file)
-        
-        # 文字起こし実行
         if args.minutes:
             print(f"文字起こしと議事録生成を開始します（モデル: {args.model}, 言語: {args.language}）...")
-            transcription, minutes = transcribe_audio(
-                audio_data, 
-                model_name=args.model,
-                language=args.language,
-                with_timestamps=args.timestamps,
-                generate_minutes_flag=True
-            )
         else:
             print(f"文字起こしを開始します（モデル: {args.model}, 言語: {args.language}）...")
-            transcription = transcribe_audio(
-                audio_data, 
-                model_name=args.model,
-                language=args.language,
-                with_timestamps=args.timestamps
-            )
+        transcription, minutes, _ = transcribe_file(
+            audio_file, args.output, args.minutes_output, resume=args.resume, **options
+        )
         
-        # 結果の出力
-        if args.output:
-            with open(args.output, "w", encoding="utf-8") as f:
-                f.write(transcription)
-            print(f"文字起こし結果を '{args.output}' に保存しました")
-        else:
+        # 出力ファイルを指定しない場合は標準出力に表示
+        if not args.output:
             print("\n=== 文字起こし結果 ===\n")
             print(transcription)
+        if args.minutes and not args.minutes_output:
+            print("\n=== 議事録 ===\n")
+            print(minutes)
         
-        # 議事録の出力
-        if args.minutes:
-            if args.minutes_output:
-                with open(args.minutes_output, "w", encoding="utf-8") as f:
-                    f.write(minutes)
-                print(f"議事録を '{args.minutes_output}' に保存しました")
-            else:
-                print("\n=== 議事録 ===\n")
-                print(minutes)
-        
+    except SegmentTranscriptionError as e:
+        # 完了したセグメントの結果は transcribe_file で保存済み（出力ファイルが無い場合は表示）
+        if not args.output:
+            print("\n=== 途中までの文字起こし結果 ===\n")
+            print(e.partial_transcription)
+        sys.exit(1)
     except Exception as e:
         print(f"エラー: {str(e)}")
         sys.exit(1)
+    finally:
+        if cache is not None:
+            cache.close()
+        report_metrics(metrics, args)
+
+def report_metrics(metrics, args):
+    """--profile・--metrics-out・--metrics-prom の指定に従って計測結果を表示・保存します"""
+    if metrics is None:
+        return
+    if args.profile:
+        print("\n=== 処理時間の内訳 ===", file=sys.stderr)
+        for line in metrics.summary_lines():
+            print(line, file=sys.stderr)
+    try:
+        if args.metrics_out:
+            metrics.write_json(args.metrics_out)
+            print(f"計測結果を '{args.metrics_out}' に保存しました")
+        if args.metrics_prom:
+            metrics.write_prometheus(args.metrics_prom)
+            print(f"計測結果（Prometheus形式）を '{args.metrics_prom}' に保存しました")
+    except OSError as e:
+        print(f"警告: 計測結果を保存できませんでした: {str(e)}")
+
+def run_batch_mode(args, options, metrics=None):
+    """バッチモードで複数の音声ファイルを処理し、終了コードを返します
+
+    metrics（MetricsCollector）を指定した場合は、セグメントごとの計測値をファイルごとに記録します。
+    """
+    if args.output or args.minutes_output:
+        print("エラー: バッチモードでは -o/--minutes-output の代わりに --output-dir を指定してください。")
+        return 1
+    if args.batch_workers < 1:
+        print("エラー: --batch-workers には1以上の値を指定してください。")
+        return 1
+    
+    inputs, unmatched = collect_inputs(args.audio_file, recursive=args.recursive)
+    for spec in unmatched:
+        print(f"警告: '{spec}' に一致する音声ファイルが見つかりません")
+    if not inputs:
+        print("エラー: 処理する音声ファイルがありません。")
+        return 1
+    
+    def process_file(audio_path, output_path, minutes_path):
+        # 途中で失敗したジョブの状態ファイルがあれば、--resume 指定時は未完了のセグメントだけを処理する
+        resume = args.resume and JobState.exists(get_job_state_path(output_path, audio_path))
+        on_event = make_progress_printer(os.path.basename(audio_path))
+        if metrics is not None:
+            on_event = metrics.handler(audio_path, forward=on_event)
+        file_options = dict(options, on_event=on_event)
+        transcription, minutes, audio_length_ms = transcribe_file(
+            audio_path, output_path, minutes_path, resume=resume, **file_options
+        )
+        info = {"audio_seconds": round(audio_length_ms / 1000, 3), "chars": len(transcription)}
+        if minutes is not None:
+            info["minutes_chars"] = len(minutes)
+        return info
+    
+    try:
+        summary = run_batch(
+            inputs, process_file,
+            output_dir=args.output_dir,
+            with_minutes=args.minutes,
+            max_workers=args.batch_workers,
+            log_path=args.batch_log,
+            force=args.force,
+            output_extension=OUTPUT_EXTENSIONS[args.format],
+        )
+    finally:
+        if options["cache"] is not None:
+            options["cache"].close()
+    return 1 if summary["failed"] else 0
 
 if __name__ == "__main__":
     exit(main()) 
\ No newline at end of file
@@ -8,7 +8,16 @@ import threading
 import json
 
 # 既存のtranscribe.pyから関数をインポート
-from transcribe import load_audio_file, transcribe_audio
+from transcribe import (
+    load_audio_file, iter_transcribe_audio, join_segment_transcripts, DEFAULT_MAX_WORKERS,
+    SegmentTranscriptionError, UPLOAD_PROFILES, DEFAULT_UPLOAD_PROFILE, load_environment, MinutesPipeline
+)
+from cache import ResultCache
+from metrics import MetricsCollector
+from preprocess import PreprocessOptions
+from silence import DEFAULT_SKIP_SILENCE_SECONDS
+import events
+from job_state import JobState, get_job_state_path
 
 # 環境変数をロード
 # load_dotenv() # コメントアウト
@@ -16,6 +25,12 @@ from transcribe import load_audio_file, transcribe_audio
 # 設定ファイルのパス
 CONFIG_FILE = "config.json"
 
+# 処理中の画面更新（進捗・完了したセグメントの追加）をまとめて反映する間隔（ミリ秒）
+UI_REFRESH_MS = 100
+
+# 大きなテキストを表示するときに1回で挿入する文字数（残りは少しずつ挿入して画面を固まらせない）
+TEXT_INSERT_CHUNK_CHARS = 20000
+
 def get_resource_path(relative_path):
     """リソースファイルの絶対パスを取得する"""
     try:
@@ -221,6 +236,115 @@ class TranscribeApp:
         )
         self.minutes_check.grid(row=2, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
         
+        # 同時処理数（並列に文字起こしするセグメント数）
+        self.workers_label = tk.Label(
+            self.options_frame, 
+            text="同時処理数:", 
+            font=self.font_default
+        )
+        self.workers_label.grid(row=2, column=2, sticky=tk.W, padx=(20, 5), pady=5)
+        
+        self.workers_var = tk.IntVar(value=self.config.get("max_workers", DEFAULT_MAX_WORKERS))
+        self.workers_spin = tk.Spinbox(
+            self.options_frame,
+            from_=1,
+            to=8,
+            textvariable=self.workers_var,
+            font=self.font_default,
+            state="readonly",
+            width=5
+        )
+        self.workers_spin.grid(row=2, column=3, sticky=tk.W, padx=5, pady=5)
+        
+        # 省メモリ（ストリーミング）モード
+        self.streaming_var = tk.BooleanVar(value=self.config.get("streaming", False))
+        self.streaming_check = tk.Checkbutton(
+            self.options_frame, 
+            text="省メモリモード（必要な範囲だけ読み込む）", 
+            variable=self.streaming_var,
+            font=self.font_default
+        )
+        self.streaming_check.grid(row=3, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        # アップロード時のエンコード形式
+        self.upload_format_label = tk.Label(
+            self.options_frame, 
+            text="アップロード形式:", 
+            font=self.font_default
+        )
+        self.upload_format_label.grid(row=3, column=2, sticky=tk.W, padx=(20, 5), pady=5)
+        
+        self.upload_format_var = tk.StringVar(value=self.config.get("upload_format", DEFAULT_UPLOAD_PROFILE))
+        self.upload_format_combo = ttk.Combobox(
+            self.options_frame, 
+            textvariable=self.upload_format_var, 
+            font=self.font_default,
+            values=list(UPLOAD_PROFILES),
+            state="readonly",
+            width=10
+        )
+        self.upload_format_combo.grid(row=3, column=3, sticky=tk.W, padx=5, pady=5)
+        
+        # キャッシュオプション
+        self.cache_var = tk.BooleanVar(value=self.config.get("use_cache", True))
+        self.cache_check = tk.Checkbutton(
+            self.options_frame, 
+            text="前回の結果を再利用する（キャッシュ）", 
+            variable=self.cache_var,
+            font=self.font_default
+        )
+        self.cache_check.grid(row=4, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
+        # 無音位置での分割オプション
+        self.align_silence_var = tk.BooleanVar(value=self.config.get("align_to_silence", True))
+        self.align_silence_check = tk.Checkbutton(
+            self.options_frame, 
+            text="長い音声を無音の位置で分割する", 
+            variable=self.align_silence_var,
+            font=self.font_default
+        )
+        self.align_silence_check.grid(row=4, column=2, columnspan=2, sticky=tk.W, padx=(20, 5), pady=5)
+        
+        # セグメントの重なり（境界の重複は結合時に取り除く）
+        self.overlap_label = tk.Label(
+            self.options_frame, 
+            text="セグメントの重なり（秒）:", 
+            font=self.font_default
+        )
+        self.overlap_label.grid(row=5, column=0, sticky=tk.W, padx=5, pady=5)
+        
+        self.overlap_var = tk.IntVar(value=self.config.get("overlap_seconds", 0))
+        self.overlap_spin = tk.Spinbox(
+            self.options_frame,
+            from_=0,
+            to=30,
+            textvariable=self.overlap_var,
+            font=self.font_default,
+            state="readonly",
+            width=5
+        )
+        self.overlap_spin.grid(row=5, column=1, sticky=tk.W, padx=5, pady=5)
+        
+        # 送信前の前処理（モノラル化・16kHzへの変換・音量の正規化）
+        self.preprocess_var = tk.BooleanVar(value=self.config.get("preprocess", False))
+        self.preprocess_check = tk.Checkbutton(
+            self.options_frame, 
+            text="モノラル16kHzに変換し音量をそろえて送信する", 
+            variable=self.preprocess_var,
+            font=self.font_default
+        )
+        self.preprocess_check.grid(row=5, column=2, columnspan=2, sticky=tk.W, padx=(20, 5), pady=5)
+        
+        # 長い無音のスキップ（タイムスタンプは元の音声の時刻で表示）
+        self.skip_silence_var = tk.BooleanVar(value=self.config.get("skip_silence", False))
+        self.skip_silence_check = tk.Checkbutton(
+            self.options_frame, 
+            text=f"{DEFAULT_SKIP_SILENCE_SECONDS}秒以上の無音を送信しない", 
+            variable=self.skip_silence_var,
+            font=self.font_default
+        )
+        self.skip_silence_check.grid(row=6, column=0, columnspan=2, sticky=tk.W, padx=5, pady=5)
+        
         # ステータス表示
         self.status_var = tk.StringVar(value="準備完了")
         self.status_label = tk.Label(
@@ -242,7 +366,16 @@ class TranscribeApp:
             command=self.execute_transcription,
             height=2
         )
-        self.execute_button.pack(fill=tk.X, pady=10)
+        self.execute_button.pack(fill=tk.X, pady=(10, 5))
+        
+        # 中断したジョブの再開ボタン（状態ファイルから未完了のセグメントだけを処理）
+        self.resume_button = tk.Button(
+            self.main_frame, 
+            text="中断したジョブを再開", 
+            font=self.font_default,
+            command=lambda: self.execute_transcription(resume=True)
+        )
+        self.resume_button.pack(fill=tk.X, pady=(0, 10))
         
         # 進捗バー
         self.progress_var = tk.DoubleVar()
@@ -282,10 +415,28 @@ class TranscribeApp:
         self.save_minutes_button.pack(side=tk.LEFT)
         
         # PanedWindowの高さを制限して、ボタンが見えるようにする
-        results_frame = tk.Frame(self.main_frame)
-        results_frame.pack(fill=tk.BOTH, expand=True, pady=(10, 5))
+        self.results_frame = tk.Frame(self.main_frame)
+        self.results_frame.pack(fill=tk.BOTH, expand=True, pady=(10, 5))
         
-        self.results_paned = ttk.PanedWindow(results_frame, orient=tk.VERTICAL)
+        # 処理時間の内訳（処理の完了後に段階ごとの所要時間とデータ量を表示）
+        self.metrics_frame = tk.LabelFrame(
+            self.main_frame,
+            text="処理時間の内訳",
+            font=self.font_heading,
+            padx=10,
+            pady=5
+        )
+        self.metrics_var = tk.StringVar()
+        self.metrics_label = tk.Label(
+            self.metrics_frame,
+            textvariable=self.metrics_var,
+            font=self.font_default,
+            justify=tk.LEFT,
+            anchor=tk.W
+        )
+        self.metrics_label.pack(fill=tk.X)
+        
+        self.results_paned = ttk.PanedWindow(self.results_frame, orient=tk.VERTICAL)
         self.results_paned.pack(fill=tk.BOTH, expand=True)
         
         # 文字起こし結果フレーム
@@ -338,6 +489,23 @@ class TranscribeApp:
         self.current_result = ""
         self.current_minutes = ""
         
+        # ワーカースレッドからの画面更新の待ち行列（UI_REFRESH_MS ごとにまとめて反映する）
+        self.ui_lock = threading.Lock()
+        self.pending_ui_items = []  # ("event", イベント) または ("append", 追加するテキスト)
+        self.pending_status = None
+        self.ui_flush_scheduled = False
+        
+        # 処理中の表示（ヘッダー・進捗の行・完了したセグメントの結果）の状態
+        self.progress_view_active = False
+        self.progress_message = ""
+        self.shown_progress_message = ""
+        self.partial_count = 0
+        self.minutes_requested = False
+        self.segments_completed = 0
+        
+        # 少しずつ挿入しているテキストの世代（新しい表示に置き換えられたら古い挿入を中止する）
+        self.text_generations = {}
+        
         # APIキーのチェック
         if not os.getenv("GOOGLE_API_KEY"):
             messagebox.showerror(
@@ -406,8 +574,8 @@ class TranscribeApp:
             print(error_msg)
             messagebox.showerror("エラー", error_msg)
     
-    def execute_transcription(self):
-        """文字起こし処理を実行する"""
+    def execute_transcription(self, resume=False):
+        """文字起こし処理を実行する（resume=True の場合は中断したジョブを再開する）"""
         filepath = self.path_var.get().strip()
         
         if not filepath:
@@ -424,6 +592,10 @@ class TranscribeApp:
         if self.processing:
             return
         
+        if resume and not JobState.exists(get_job_state_path(None, filepath)):
+            messagebox.showerror("エラー", f"このファイルには再開できるジョブがありません: {filepath}")
+            return
+        
         # APIキーが入力されているか確認
         api_key = self.api_var.get().strip()
         if not api_key:
@@ -433,26 +605,46 @@ class TranscribeApp:
         # 環境変数にAPIキーを設定
         os.environ["GOOGLE_API_KEY"] = api_key
         
+        # 同時処理数などは次回起動時にも使えるよう設定ファイルに保存
+        settings = {
+            "max_workers": self.workers_var.get(),
+            "streaming": self.streaming_var.get(),
+            "upload_format": self.upload_format_var.get(),
+            "use_cache": self.cache_var.get(),
+            "align_to_silence": self.align_silence_var.get(),
+            "overlap_seconds": self.overlap_var.get(),
+            "preprocess": self.preprocess_var.get(),
+            "skip_silence": self.skip_silence_var.get(),
+        }
+        if any(self.config.get(key) != value for key, value in settings.items()):
+            self.config.update(settings)
+            self.save_config()
+        
         # UIを処理中状態に更新
         self.processing = True
         self.execute_button.config(state=tk.DISABLED, text="処理中...")
+        self.resume_button.config(state=tk.DISABLED)
         self.progress_bar.pack(fill=tk.X, pady=(0, 10))
         self.progress_bar.start(10)
-        self.result_text.delete(1.0, tk.END)
-        self.result_text.insert(tk.END, "文字起こし処理中です。しばらくお待ちください...")
-        self.minutes_text.delete(1.0, tk.END)
-        if self.minutes_var.get():
-            self.minutes_text.insert(tk.END, "議事録を生成中です。しばらくお待ちください...")
+        self.update_result("文字起こし処理中です。しばらくお待ちください...")
+        self.update_minutes("議事録を生成中です。しばらくお待ちください..." if self.minutes_var.get() else "")
         self.save_button.config(state=tk.DISABLED)
         self.save_minutes_button.config(state=tk.DISABLED)
+        self.metrics_frame.pack_forget()
         
         # バックグラウンドスレッドで文字起こし処理を実行
-        thread = threading.Thread(target=self.process_transcription, args=(filepath,))
+        thread = threading.Thread(target=self.process_transcription, args=(filepath, resume))
         thread.daemon = True
         thread.start()
     
-    def process_transcription(self, filepath):
+    def process_transcription(self, filepath, resume=False):
         """バックグラウンドで文字起こし処理を実行する"""
+        # 段階ごとの所要時間とデータ量を進捗イベントから集計し、処理の完了後に表示する
+        metrics = MetricsCollector()
+        
+        # 進捗イベントは待ち行列に入れ、メインスレッドでまとめて画面に反映する
+        on_event = metrics.handler(forward=lambda event: self.queue_ui_update(event=event))
+        
         try:
             print("\n=== 文字起こし処理開始 ===")
             print(f"1. 初期情報:")
@@ -483,7 +675,7 @@ class TranscribeApp:
                 print(f"\n4. APIキーエラー:")
                 print(f"- {error_msg}")
                 self.update_status("エラー: APIキーが設定されていません")
-                self.update_result("エラー: APIキーが設定されていません。API設定セクションでAPIキーを入力してください。", is_error=True)
+                self.root.after(0, self.update_result, "エラー: APIキーが設定されていません。API設定セクションでAPIキーを入力してください。", True)
                 self.finish_processing()
                 return
             
@@ -495,18 +687,34 @@ class TranscribeApp:
             language = self.language_var.get()
             with_timestamps = self.timestamp_var.get()
             generate_minutes = self.minutes_var.get()
+            max_workers = self.workers_var.get()
+            streaming = self.streaming_var.get()
+            upload_format = self.upload_format_var.get()
+            use_cache = self.cache_var.get()
+            align_to_silence = self.align_silence_var.get()
+            overlap_seconds = self.overlap_var.get()
+            preprocess = self.preprocess_var.get()
+            skip_silence_seconds = DEFAULT_SKIP_SILENCE_SECONDS if self.skip_silence_var.get() else 0
             
             print(f"\n5. 処理設定:")
             print(f"- モデル: {model}")
             print(f"- 言語: {language}")
             print(f"- タイムスタンプ: {'あり' if with_timestamps else 'なし'}")
             print(f"- 議事録生成: {'あり' if generate_minutes else 'なし'}")
+            print(f"- 同時処理数: {max_workers}")
+            print(f"- 省メモリモード: {'あり' if streaming else 'なし'}")
+            print(f"- アップロード形式: {upload_format}")
+            print(f"- キャッシュ: {'使用する' if use_cache else '使用しない'}")
+            print(f"- 無音位置での分割: {'あり' if align_to_silence else 'なし'}")
+            print(f"- セグメントの重なり: {overlap_seconds}秒")
+            print(f"- 前処理: {'あり' if preprocess else 'なし'}")
+            print(f"- 無音のスキップ: {f'{skip_silence_seconds}秒以上' if skip_silence_seconds else 'なし'}")
             
             # ステータス更新
             self.update_status("音声ファイルを読み込み中...")
-            self.update_result("音声ファイルを読み込み中です。しばらくお待ちください...")
+            self.root.after(0, self.update_result, "音声ファイルを読み込み中です。しばらくお待ちください...")
             if generate_minutes:
-                self.update_minutes("議事録を準備中です...")
+                self.root.after(0, self.update_minutes, "議事録を準備中です...")
             
             # 音声ファイルを読み込む
             try:
@@ -518,12 +726,12 @@ class TranscribeApp:
                     error_msg += f"親ディレクトリの内容: {os.listdir(os.path.dirname(filepath)) if os.path.exists(os.path.dirname(filepath)) else 'N/A'}"
                     print(f"\n6. ファイル存在エラー:")
                     print(error_msg)
-                    self.update_result(error_msg, True)
+                    self.root.after(0, self.update_result, error_msg, True)
                     self.finish_processing()
                     return
                 
                 print(f"\n6. 音声ファイル読み込み開始")
-                audio, format_name = load_audio_file(filepath)
+                audio, format_name = load_audio_file(filepath, streaming=streaming, on_event=on_event)
                 print(f"音声ファイルの読み込みに成功しました")
             except Exception as e:
                 error_msg = f"音声ファイルの読み込みに失敗しました:\n"
@@ -537,7 +745,7 @@ class TranscribeApp:
                 error_msg += f"- 文字コード: {sys.getfilesystemencoding()}"
                 print(f"\n6. 音声ファイル読み込みエラー:")
                 print(error_msg)
-                self.update_result(error_msg, True)
+                self.root.after(0, self.update_result, error_msg, True)
                 self.finish_processing()
                 return
             
@@ -559,111 +767,72 @@ class TranscribeApp:
                           f"モデル: {model}\n\n"
                           f"処理を開始します...\n")
             
-            self.update_result(result_info)
+            self.minutes_requested = generate_minutes
+            self.root.after(0, self.begin_progress_view, result_info)
             
             if generate_minutes:
-                self.update_minutes("文字起こし完了後に議事録を生成します...\n" + result_info)
+                self.root.after(0, self.update_minutes, "文字起こし完了後に議事録を生成します...\n" + result_info)
             
-            # 独自のコールバック関数を定義して、リアルタイムで進捗を更新
-            segment_results = []
-            current_segment = [0, 0]  # [処理中のセグメント番号, 合計セグメント数]
+            # ジョブの状態ファイル（音声ファイルの隣に保存し、中断時の再開に使う）
+            job_state_path = get_job_state_path(None, filepath)
+            if resume:
+                job_state = JobState.load(job_state_path)
+            else:
+                job_state = JobState.create(job_state_path, filepath, {
+                    "model_name": model, "language": language, "with_timestamps": with_timestamps,
+                    "skip_silence_seconds": skip_silence_seconds
+                })
             
-            def progress_callback(message):
-                # メッセージに基づいて進捗状況を更新
-                if "セグメント" in message and "処理中" in message:
-                    # セグメント処理開始のメッセージからセグメント番号と合計を抽出
-                    import re
-                    match = re.search(r"セグメント (\d+)/(\d+)", message)
-                    if match:
-                        current_segment[0] = int(match.group(1))
-                        current_segment[1] = int(match.group(2))
-                        
-                        # 進捗状況の更新
-                        progress_message = f"セグメント {current_segment[0]}/{current_segment[1]} を処理中... ({(current_segment[0]-1)/current_segment[1]*100:.1f}% 完了)"
-                        self.update_status(progress_message)
-                        
-                        # 最新の状態を結果エリアに追加
-                        current_text = self.result_text.get(1.0, tk.END)
-                        if "セグメント" in current_text and "処理中" in current_text:
-                            lines = current_text.split("\n")
-                            new_lines = []
-                            updated = False
-                            for line in lines:
-                                if "セグメント" in line and "処理中" in line and not updated:
-                                    new_lines.append(progress_message)
-                                    updated = True
-                                else:
-                                    new_lines.append(line)
-                            
-                            if not updated:
-                                new_lines.append(progress_message)
-                            
-                            self.update_result("\n".join(new_lines))
-                        else:
-                            self.update_result(current_text + "\n" + progress_message)
-                
-                # セグメント完了メッセージの処理
-                elif "セグメント" in message and "完了しました" in message:
-                    # 結果を保存
-                    segment_results.append(message)
-                    
-                    # 進捗状況の更新
-                    progress_percent = current_segment[0] / current_segment[1] * 100 if current_segment[1] > 0 else 0
-                    self.update_status(f"セグメント {current_segment[0]}/{current_segment[1]} が完了しました。({progress_percent:.1f}% 完了)")
-                
-                # 議事録生成中のメッセージ
-                elif "議事録を生成中" in message:
-                    self.update_status("議事録を生成中...")
-                    if generate_minutes:
-                        self.update_minutes("議事録を生成中です。しばらくお待ちください...")
-            
-            # 元の標準出力を保存
-            original_print = print
+            # キャッシュの準備
+            cache = ResultCache() if use_cache else None
             
-            # printをオーバーライドして進捗を追跡
-            def custom_print(*args, **kwargs):
-                message = " ".join(map(str, args))
-                # 元のprintで出力
-                original_print(*args, **kwargs)
-                # コールバックを呼び出して進捗を更新
-                self.root.after(0, progress_callback, message)
-            
-            # Pythonのprint関数を置き換え
-            import builtins
-            builtins.print = custom_print
+            # 議事録も生成する場合は、完了したセグメントから順に要点の抽出を始める
+            minutes_pipeline = None
+            if generate_minutes:
+                minutes_pipeline = MinutesPipeline(cache=cache, max_workers=max_workers, on_event=on_event)
             
             try:
-                # 文字起こしを実行（議事録生成オプション付き）
-                if generate_minutes:
-                    transcription, minutes = transcribe_audio(
-                        audio, 
-                        model_name=model, 
-                        language=language, 
-                        with_timestamps=with_timestamps,
-                        generate_minutes_flag=True
-                    )
+                # 文字起こしを実行し、完了したセグメントから順に画面に表示する
+                chunks = []
+                for chunk in iter_transcribe_audio(
+                    audio, 
+                    model_name=model, 
+                    language=language, 
+                    with_timestamps=with_timestamps,
+                    max_workers=max_workers,
+                    upload_format=upload_format,
+                    cache=cache,
+                    job_state=job_state,
+                    align_to_silence=align_to_silence,
+                    overlap_seconds=overlap_seconds,
+                    on_event=on_event,
+                    preprocess=PreprocessOptions() if preprocess else None,
+                    skip_silence_seconds=skip_silence_seconds
+                ):
+                    chunks.append(chunk)
+                    self.queue_ui_update(append=chunk.output)
+                    if minutes_pipeline is not None:
+                        minutes_pipeline.add(chunk)
+                transcription = join_segment_transcripts(chunks, on_event)
+                
+                # 議事録を生成（抽出済みのセグメントごとの要点を統合する）
+                if minutes_pipeline is not None:
+                    minutes = minutes_pipeline.finish(transcription)
                     # 議事録を保存
                     self.current_minutes = minutes
                     
                     # 議事録を表示
                     self.root.after(0, self.update_minutes, minutes)
-                else:
-                    transcription = transcribe_audio(
-                        audio, 
-                        model_name=model, 
-                        language=language, 
-                        with_timestamps=with_timestamps
-                    )
                 
                 # 自動保存の処理
+                saved_message = ""
                 if self.autosave_var.get():
                     # 文字起こし結果の自動保存
                     output_filepath = Path(filepath).with_suffix('.txt')
                     with open(output_filepath, "w", encoding="utf-8") as f:
                         f.write(transcription)
                     
-                    output_message = f"\n\n[文字起こし結果をファイルに保存しました: {output_filepath}]"
-                    transcription += output_message
+                    saved_message = f"\n\n[文字起こし結果をファイルに保存しました: {output_filepath}]"
                     
                     # 議事録も自動保存
                     if generate_minutes:
@@ -676,17 +845,32 @@ class TranscribeApp:
                         self.current_minutes += minutes_message
                         self.root.after(0, self.update_minutes, self.current_minutes)
                 
+                # すべて完了したので状態ファイルは不要
+                job_state.delete()
+                
                 # 文字起こし結果を保存
-                self.current_result = transcription
+                self.current_result = transcription + saved_message
                 
-                # UIを更新
-                self.root.after(0, self.update_result, transcription)
+                # UIを更新（表示済みの結果はそのまま残し、ヘッダーと進捗の行だけを取り除く）
+                self.root.after(0, self.finish_progress_view, transcription, saved_message)
                 self.update_status("処理完了")
                 
             finally:
-                # 元のprint関数を復元
-                builtins.print = original_print
+                if minutes_pipeline is not None:
+                    minutes_pipeline.close()
+                if cache is not None:
+                    cache.close()
         
+        except SegmentTranscriptionError as e:
+            # 完了したセグメントの結果は保存できるように残す
+            self.current_result = e.partial_transcription
+            error_message = (f"エラーが発生しました: {str(e)}\n"
+                             f"「中断したジョブを再開」で未完了のセグメントだけを再処理できます。\n\n"
+                             f"{e.partial_transcription}")
+            self.root.after(0, self.update_result, error_message, True)
+            if self.minutes_var.get():
+                self.root.after(0, self.update_minutes, "一部のセグメントが失敗したため、議事録は生成されませんでした。", True)
+            self.update_status("一部のセグメントでエラーが発生しました")
         except Exception as e:
             error_message = f"エラーが発生しました: {str(e)}"
             self.root.after(0, self.update_result, error_message, True)
@@ -695,34 +879,186 @@ class TranscribeApp:
             self.update_status("エラーが発生しました")
         finally:
             # 処理完了後にUIを元に戻す
+            self.root.after(0, self.show_metrics_summary, metrics.summary_lines())
             self.root.after(0, self.finish_processing)
     
+    def queue_ui_update(self, event=None, append=None, status=None):
+        """画面の更新を待ち行列に入れる（スレッドセーフ）
+        
+        UI_REFRESH_MS ごとに flush_ui_updates でまとめて反映するため、
+        イベントや結果が短い間隔で届いても画面の再描画は一定の頻度に抑えられる。
+        """
+        with self.ui_lock:
+            if event is not None:
+                self.pending_ui_items.append(("event", event))
+            if append is not None:
+                self.pending_ui_items.append(("append", append))
+            if status is not None:
+                self.pending_status = status
+            if self.ui_flush_scheduled:
+                return
+            self.ui_flush_scheduled = True
+        self.root.after(UI_REFRESH_MS, self.flush_ui_updates)
+    
+    def flush_ui_updates(self):
+        """待ち行列の画面更新をまとめて反映する（メインスレッドで呼び出す）"""
+        with self.ui_lock:
+            items = self.pending_ui_items
+            self.pending_ui_items = []
+            self.ui_flush_scheduled = False
+        
+        appended = []
+        for kind, value in items:
+            if kind == "event":
+                self.handle_progress_event(value)
+            else:
+                appended.append(value)
+        
+        if self.progress_view_active:
+            # 進捗の行は変わったときだけその場で書き換える
+            if self.progress_message != self.shown_progress_message:
+                self.replace_progress_line(self.progress_message)
+            # 完了したセグメントの結果は末尾に追加するだけにする（既存の表示は作り直さない）
+            if appended:
+                text = "\n\n".join(appended)
+                if self.partial_count:
+                    text = "\n\n" + text
+                self.result_text.insert(tk.END, text)
+                self.partial_count += len(appended)
+        
+        with self.ui_lock:
+            status = self.pending_status
+            self.pending_status = None
+        if status is not None:
+            self.status_var.set(status)
+    
+    def handle_progress_event(self, event):
+        """文字起こしの進捗イベントに応じて表示の状態を更新する（メインスレッドで呼び出す）"""
+        if isinstance(event, events.SegmentsPlanned):
+            self.segments_completed = event.total - event.pending
+        
+        elif isinstance(event, events.SegmentStarted):
+            progress_percent = self.segments_completed / event.total * 100
+            progress_message = f"セグメント {event.index + 1}/{event.total} を処理中... ({progress_percent:.1f}% 完了)"
+            self.update_status(progress_message)
+            self.progress_message = progress_message
+        
+        elif isinstance(event, events.SegmentFinished):
+            self.segments_completed = event.completed
+            progress_percent = event.completed / event.total * 100
+            progress_message = f"セグメント {event.index + 1}/{event.total} が完了しました。({progress_percent:.1f}% 完了)"
+            self.update_status(progress_message)
+            self.progress_message = progress_message
+        
+        elif isinstance(event, events.SegmentFailed):
+            progress_percent = self.segments_completed / event.total * 100
+            progress_message = f"セグメント {event.index + 1}/{event.total} の処理に失敗しました ({progress_percent:.1f}% 完了)"
+            self.update_status(progress_message)
+            self.progress_message = progress_message
+        
+        elif isinstance(event, events.MinutesStarted):
+            self.update_status("議事録を生成中...")
+            if self.minutes_requested:
+                self.update_minutes("議事録を生成中です。しばらくお待ちください...")
+        
+        elif isinstance(event, events.MinutesPartialFinished):
+            self.update_status(f"議事録の要点を抽出しました（{event.index + 1}/{event.total}）")
+    
+    def begin_progress_view(self, header):
+        """処理中の表示（ヘッダー・進捗の行・完了したセグメントの結果）を始める（メインスレッドで呼び出す）
+        
+        進捗の行はマーク progress_start とタグ progress_line で位置を覚えておき、その場で書き換える。
+        完了したセグメントの結果はマーク body_start 以降に追加していく。
+        """
+        self.flush_ui_updates()
+        self.cancel_text_insert(self.result_text)
+        self.result_text.delete("1.0", tk.END)
+        self.result_text.insert(tk.END, header + "\n")
+        self.result_text.mark_set("progress_start", "end-1c")
+        self.result_text.mark_gravity("progress_start", tk.LEFT)
+        self.result_text.insert(tk.END, "\n\n")
+        self.result_text.mark_set("body_start", "end-1c")
+        self.result_text.mark_gravity("body_start", tk.LEFT)
+        
+        self.progress_view_active = True
+        self.progress_message = ""
+        self.shown_progress_message = ""
+        self.partial_count = 0
+        self.segments_completed = 0
+    
+    def replace_progress_line(self, message):
+        """進捗の行だけを書き換える"""
+        ranges = self.result_text.tag_ranges("progress_line")
+        if ranges:
+            self.result_text.delete(ranges[0], ranges[1])
+        self.result_text.insert("progress_start", message, "progress_line")
+        self.shown_progress_message = message
+    
+    def finish_progress_view(self, transcription, saved_message=""):
+        """処理中の表示を最終結果の表示に切り替える（メインスレッドで呼び出す）
+        
+        表示済みのセグメントの結果が最終結果と一致すれば、ヘッダーと進捗の行を取り除くだけにする。
+        """
+        self.flush_ui_updates()
+        if self.progress_view_active and self.result_text.get("body_start", "end-1c") == transcription:
+            self.progress_view_active = False
+            self.result_text.delete("1.0", "body_start")
+            self.result_text.insert(tk.END, saved_message)
+        else:
+            self.update_result(transcription + saved_message)
+    
     def update_status(self, message):
         """ステータスメッセージを更新する（スレッドセーフ）"""
-        self.root.after(0, lambda: self.status_var.set(message))
+        self.queue_ui_update(status=message)
     
     def update_result(self, text, is_error=False):
         """UIスレッドで文字起こし結果表示を更新する"""
-        self.result_text.delete(1.0, tk.END)
-        self.result_text.insert(tk.END, text)
-        
-        if is_error:
-            self.result_text.tag_configure("error", foreground="red")
-            self.result_text.tag_add("error", "1.0", tk.END)
+        # 待ち行列に残っている処理中の更新を反映してから置き換える
+        self.flush_ui_updates()
+        self.progress_view_active = False
+        self.set_text_in_chunks(self.result_text, text, "error" if is_error else None)
     
     def update_minutes(self, text, is_error=False):
         """UIスレッドで議事録表示を更新する"""
-        self.minutes_text.delete(1.0, tk.END)
-        self.minutes_text.insert(tk.END, text)
+        self.flush_ui_updates()
+        self.set_text_in_chunks(self.minutes_text, text, "error" if is_error else None)
+    
+    def cancel_text_insert(self, widget):
+        """テキストエリアに少しずつ挿入している途中のテキストがあれば挿入を中止する"""
+        key = str(widget)
+        self.text_generations[key] = self.text_generations.get(key, 0) + 1
+        return self.text_generations[key]
+    
+    def set_text_in_chunks(self, widget, text, tag=None):
+        """テキストエリアの内容を置き換える
         
-        if is_error:
-            self.minutes_text.tag_configure("error", foreground="red")
-            self.minutes_text.tag_add("error", "1.0", tk.END)
+        大きなテキストは TEXT_INSERT_CHUNK_CHARS 文字ずつ挿入し、挿入の合間にイベントループへ
+        制御を返すことで、長時間の音声の結果でも画面が固まらないようにする。
+        """
+        generation = self.cancel_text_insert(widget)
+        widget.delete("1.0", tk.END)
+        if tag == "error":
+            widget.tag_configure("error", foreground="red")
+        self.insert_text_chunk(widget, text, 0, generation, tag)
+    
+    def insert_text_chunk(self, widget, text, start, generation, tag):
+        if self.text_generations.get(str(widget)) != generation:
+            return
+        end = start + TEXT_INSERT_CHUNK_CHARS
+        widget.insert(tk.END, text[start:end], *((tag,) if tag else ()))
+        if end < len(text):
+            self.root.after(1, self.insert_text_chunk, widget, text, end, generation, tag)
+    
+    def show_metrics_summary(self, lines):
+        """処理時間の内訳を表示する（メインスレッドで呼び出す）"""
+        self.metrics_var.set("\n".join(lines))
+        self.metrics_frame.pack(fill=tk.X, pady=(0, 5), before=self.results_frame)
     
     def finish_processing(self):
         """処理完了後にUIを元に戻す"""
         self.processing = False
         self.execute_button.config(state=tk.NORMAL, text="文字起こしを実行")
+        self.resume_button.config(state=tk.NORMAL)
         self.progress_bar.stop()
         self.progress_bar.pack_forget()
         
@@ -817,6 +1153,8 @@ class TranscribeApp:
             messagebox.showerror("エラー", f"設定の保存に失敗しました: {e}")
 
 def main():
+    # .envファイルの環境変数を読み込む（pydub・numpy・Gemini APIのライブラリは最初の文字起こしまで読み込まない）
+    load_environment()
     root = tk.Tk()
     app = TranscribeApp(root)
     root.mainloop()
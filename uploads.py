@@ -0,0 +1,276 @@
+"""アップロード済みファイルの管理
+
+同じ内容のファイルを何度もアップロードしないよう、内容のハッシュごとに
+アップロード済みのハンドルを保持して再利用します。ジョブの終了時には
+アップロードしたファイルをまとめてリモートから削除します。
+アップロードするデータは UploadBuffer に書き込み、一定のサイズまではディスクを使わずに送信します。
+"""
+import io
+import os
+import time
+import bisect
+import hashlib
+import tempfile
+import threading
+
+from ratelimit import get_rate_limiter
+
+# アップロードしたファイルがリモートに保持される期間（秒）。ハンドルから分からない場合に使用
+DEFAULT_FILE_TTL_SECONDS = 48 * 60 * 60
+
+# 有効期限がこの秒数以内に迫ったハンドルは再利用せずにアップロードし直す
+EXPIRY_MARGIN_SECONDS = 10 * 60
+
+# UploadBuffer がメモリ上に保持するデータの上限（バイト）。超えた場合は一時ファイルに書き出す
+DEFAULT_SPILL_BYTES = 64 * 1024 * 1024
+
+def _stream_sha256(f, chunk_size):
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: f.read(chunk_size), b""):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def file_sha256(path, chunk_size=1024 * 1024):
+    """ファイルの内容のSHA-256を返します（ファイル全体をメモリに読み込まない）"""
+    with open(path, "rb") as f:
+        return _stream_sha256(f, chunk_size)
+
+class _ChunkReader(io.RawIOBase):
+    """メモリ上のデータの断片のリストを1つのファイルとして読み込む（コピーせずに読み出す）"""
+
+    def __init__(self, chunks):
+        super().__init__()
+        self.chunks = chunks
+        self.offsets = [0]
+        for chunk in chunks:
+            self.offsets.append(self.offsets[-1] + len(chunk))
+        self.position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self.position
+        elif whence == io.SEEK_END:
+            offset += self.offsets[-1]
+        if offset < 0:
+            raise ValueError("負の位置には移動できません")
+        self.position = offset
+        return self.position
+
+    def readinto(self, buffer):
+        with memoryview(buffer) as view, view.cast("B") as target:
+            written = 0
+            index = bisect.bisect_right(self.offsets, self.position) - 1
+            while written < len(target) and index < len(self.chunks):
+                chunk_offset = self.position - self.offsets[index]
+                size = min(len(target) - written, len(self.chunks[index]) - chunk_offset)
+                target[written:written + size] = memoryview(self.chunks[index])[chunk_offset:chunk_offset + size]
+                written += size
+                self.position += size
+                index += 1
+            return written
+
+class UploadBuffer:
+    """アップロードするデータを書き込むバッファ
+
+    書き込んだデータが spill_bytes を超えるまではメモリ上に保持し、超えた時点で
+    一時ファイル（閉じると自動的に削除される）に移して以降はそこに書き込みます。
+    spill_bytes が0以下の場合は最初から一時ファイルを使います。
+    メモリ上では書き込まれた bytes をコピーせずに参照で保持します（WAVのPCMなど）。
+    バックエンドの upload_file にはファイルのパスの代わりにこのバッファを渡せます。
+    """
+
+    def __init__(self, name, mime_type=None, spill_bytes=DEFAULT_SPILL_BYTES):
+        self.name = name  # アップロード時のファイル名（拡張子で形式が分かるように付ける）
+        self.mime_type = mime_type
+        self.spill_bytes = spill_bytes
+        self.size = 0
+        self.chunks = []  # メモリ上のデータの断片
+        self.file = None  # 一時ファイルに書き出した後のファイルオブジェクト
+        if spill_bytes <= 0:
+            self._spill()
+
+    @property
+    def spilled(self):
+        return self.file is not None
+
+    def write(self, data):
+        size = memoryview(data).nbytes
+        if not self.spilled and self.size + size > self.spill_bytes:
+            self._spill()
+        if self.spilled:
+            # 読み込みで位置が変わっていても末尾に書き込む
+            self.file.seek(self.size)
+            self.file.write(data)
+        elif isinstance(data, bytes) or (isinstance(data, memoryview) and data.readonly):
+            # bytes と読み取り専用の memoryview（AudioSegmentView の生データなど）はコピーせずに参照で保持する
+            self.chunks.append(data if isinstance(data, bytes) else data.cast("B"))
+        else:
+            # 書き込み後に変更されうるデータ（bytearray など）はコピーする
+            self.chunks.append(bytes(data))
+        self.size += size
+        return size
+
+    def _spill(self):
+        self.file = tempfile.TemporaryFile(suffix=os.path.splitext(self.name)[1])
+        for chunk in self.chunks:
+            self.file.write(chunk)
+        self.chunks = []
+
+    def tell(self):
+        return self.size
+
+    def flush(self):
+        if self.spilled:
+            self.file.flush()
+
+    def read_at(self, offset, size):
+        """書き込み済みの位置 offset から size バイトを読み込みます"""
+        reader = self.open()
+        reader.seek(offset)
+        return reader.read(min(size, max(0, self.size - offset)))
+
+    def patch(self, offset, data):
+        """書き込み済みの位置 offset のデータを data で上書きします（ヘッダーの書き換え用）"""
+        if offset + len(data) > self.size:
+            raise ValueError("書き込み済みの範囲を超えて上書きすることはできません")
+        if self.spilled:
+            self.file.seek(offset)
+            self.file.write(data)
+            return
+        chunk_start = 0
+        for index, chunk in enumerate(self.chunks):
+            chunk_end = chunk_start + len(chunk)
+            if chunk_end > offset and chunk_start < offset + len(data):
+                patched = bytearray(chunk)
+                begin = max(offset, chunk_start)
+                end = min(offset + len(data), chunk_end)
+                patched[begin - chunk_start:end - chunk_start] = data[begin - offset:end - offset]
+                self.chunks[index] = bytes(patched)
+            chunk_start = chunk_end
+
+    def open(self):
+        """先頭から読み込める状態のファイルオブジェクト（io.IOBase）を返します"""
+        if not self.spilled:
+            return _ChunkReader(self.chunks)
+        self.file.seek(0)
+        # Windows の TemporaryFile はラッパーのため、ファイルオブジェクト本体を返す
+        return getattr(self.file, "file", self.file)
+
+    def sha256(self):
+        """書き込んだデータのSHA-256を返します"""
+        if not self.spilled:
+            digest = hashlib.sha256()
+            for chunk in self.chunks:
+                digest.update(chunk)
+            return digest.hexdigest()
+        return _stream_sha256(self.open(), 1024 * 1024)
+
+    def close(self):
+        """メモリ・一時ファイルを解放します"""
+        self.chunks = []
+        if self.file is not None:
+            self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def get_expiration(handle, uploaded_at):
+    """ハンドルの有効期限（UNIX時刻）を返します"""
+    expires_at = getattr(handle, "expires_at", None)
+    if expires_at is not None:
+        return float(expires_at)
+    # google.generativeai のファイルは expiration_time（datetime）を持つ
+    expiration_time = getattr(handle, "expiration_time", None)
+    if expiration_time is not None and hasattr(expiration_time, "timestamp"):
+        try:
+            return expiration_time.timestamp()
+        except (OverflowError, OSError, ValueError):
+            pass
+    return uploaded_at + DEFAULT_FILE_TTL_SECONDS
+
+def is_missing_file_error(error):
+    """アップロード済みファイルが期限切れ・削除済みで使えないことを表すエラーかを判定します"""
+    if type(error).__name__ in ("NotFound", "PermissionDenied"):
+        return True
+    status = getattr(error, "status", None)
+    return status in (400, 403, 404) and "file" in str(error).lower()
+
+class UploadManager:
+    """内容のハッシュごとにアップロード済みのハンドルを保持するマネージャー（スレッドセーフ）"""
+
+    def __init__(self, backend, limiter=None):
+        self.backend = backend
+        self.limiter = limiter or get_rate_limiter()
+        self.lock = threading.Lock()
+        self.handles = {}  # 内容のハッシュ -> (ハンドル, 有効期限)
+        self.uploaded = []  # このマネージャーがアップロードしたハンドル（削除用）
+        self.stats = {"uploads": 0, "reused": 0, "deleted": 0}
+
+    def has_handle(self, content_hash):
+        """content_hash に対応する有効期限内のハンドルがあればTrueを返します"""
+        with self.lock:
+            entry = self.handles.get(content_hash)
+            return entry is not None and entry[1] - EXPIRY_MARGIN_SECONDS > time.time()
+
+    def upload(self, source, mime_type=None, content_hash=None):
+        """ファイル（パスまたは UploadBuffer）をアップロードしてハンドルを返します
+
+        content_hash が同じで有効期限内のハンドルがあれば、アップロードせずにそれを返します。
+        """
+        if content_hash is not None:
+            with self.lock:
+                entry = self.handles.get(content_hash)
+                if entry is not None and entry[1] - EXPIRY_MARGIN_SECONDS > time.time():
+                    self.stats["reused"] += 1
+                    print(f"アップロード済みのファイルを再利用します: {getattr(entry[0], 'name', entry[0])}")
+                    return entry[0]
+
+        uploaded_at = time.time()
+        handle = self.limiter.call(self.backend.upload_file, source, mime_type=mime_type)
+        with self.lock:
+            self.uploaded.append(handle)
+            self.stats["uploads"] += 1
+            if content_hash is not None:
+                self.handles[content_hash] = (handle, get_expiration(handle, uploaded_at))
+        return handle
+
+    def invalidate(self, content_hash):
+        """ハンドルを再利用の対象から外します（リモートで使えなくなった場合など）"""
+        with self.lock:
+            self.handles.pop(content_hash, None)
+
+    def cleanup(self):
+        """このマネージャーがアップロードしたファイルをリモートから削除します
+
+        削除に失敗しても処理は続けます（ファイルは有効期限が過ぎるとリモートで削除されます）。
+        """
+        with self.lock:
+            handles = self.uploaded
+            self.uploaded = []
+            self.handles.clear()
+
+        deleted = 0
+        for handle in handles:
+            try:
+                self.limiter.call(self.backend.delete_file, handle)
+                deleted += 1
+            except Exception as e:
+                print(f"警告: アップロードしたファイルを削除できませんでした ({getattr(handle, 'name', handle)}): {str(e)}")
+
+        with self.lock:
+            self.stats["deleted"] += deleted
+        if handles:
+            print(f"アップロードしたファイルを削除しました: {deleted}/{len(handles)}件")
+        return deleted